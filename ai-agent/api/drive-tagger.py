@@ -1,39 +1,82 @@
 #!/usr/bin python
 # -*- coding: utf-8 -*-
 
-import io
-from typing import List, Dict, Tuple, Set, Any, Union, Optional, Literal
-
-import google.auth
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload
-from google.api_core.exceptions import (
-    GoogleAPIError,
-)  # Used to catch Gemini rate limit errors
+from __future__ import annotations  # So the GUI's type hints don't need tkinter at runtime
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
+from typing import List, Dict, Tuple, Set, Any, Union, Optional, Literal, Callable, Iterable, Iterator, Mapping
+from typing import Generator, TypeVar
+from typing import TYPE_CHECKING
+from types import MappingProxyType
+import importlib
+import importlib.util
 
 # Other misc. libraries
-# from PIL import Image
-from google import genai
+import io
+import re
+import csv
+import zipfile  # .docx, .xlsx and .pptx files are zip files of XML, which is enough to read their text
 import tempfile
-import mimetypes
-from datetime import datetime
-import tkinter as tk  # used for the GUI
+import json
+import sqlite3  # Local database for caches that must survive restarts
+import random  # Used to add jitter to retry delays
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import argparse  # Command line options for running without the GUI
+import sys
 import time  # Used if minute rate limit exceeded
 
 import os
 from dotenv import load_dotenv
 
-load_dotenv({load_dotenv: "../.env"})
-
 # So the program doesn't look like it froze,
 # have a thread dedicated to the tagging/sorting process
 import threading
-import queue  # Since the tagging thread can't directly update labels in the GUI, use a queue
+import queue  # Hands files from one stage of the tagging pipeline to the next
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor  # Runs the PreClassifier's text matching
+from concurrent.futures import ThreadPoolExecutor  # Sends organizeFiles()' copies and moves
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from googleapiclient.http import MediaIoBaseDownload
+
+
+class LazyModule:
+    """
+    Stands in for a module that is only imported the first time one of its attributes is used,
+    e.g. LazyModule("google.genai").Client imports google.genai right then.
+    """
+
+    def __init__(self, moduleName: str) -> None:
+        self.moduleName: str = moduleName
+
+    def __getattr__(self, attributeName: str) -> Any:
+        # Only called for attributes this object doesn't have itself, i.e. the module's
+        return getattr(importlib.import_module(self.moduleName), attributeName)
+
+
+# Google's libraries take most of a second to import, which every launch of the command line would pay
+# even for commands that never use them, so each is imported the first time it is actually used.
+# tests/test_startup.py checks that loading this module doesn't import them.
+googleDiscovery = LazyModule("googleapiclient.discovery")  # build_from_document()
+googleApiErrors = LazyModule("googleapiclient.errors")  # HttpError
+googleApiHttp = LazyModule("googleapiclient.http")  # MediaIoBaseDownload, build_http()
+googleApiCoreExceptions = LazyModule("google.api_core.exceptions")  # GoogleAPIError, used to catch Gemini rate limit errors
+googleAuthRequests = LazyModule("google.auth.transport.requests")  # Request, used to refresh credentials
+googleCredentials = LazyModule("google.oauth2.credentials")  # Credentials
+googleAuthHttplib2 = LazyModule("google_auth_httplib2")  # AuthorizedHttp, signs each Drive request with the credentials
+googleOAuthFlow = LazyModule("google_auth_oauthlib.flow")  # InstalledAppFlow
+genai = LazyModule("google.genai")
+geminiTypes = LazyModule("google.genai.types")  # Used to send small files inline with a request
+geminiErrors = LazyModule("google.genai.errors")  # APIError, raised by genai.Client, e.g. on rate limits
+httpx = LazyModule("httpx")  # genai.Client's HTTP library, used to size its connection pool
+# used for the GUI, which the command line doesn't need (e.g. on a headless server)
+tk: Optional[LazyModule] = LazyModule("tkinter") if importlib.util.find_spec("_tkinter") else None
+# Reads the date a photo was taken, for the PreClassifier. Without Pillow, images are simply left to Gemini.
+Image: Optional[LazyModule] = LazyModule("PIL.Image") if importlib.util.find_spec("PIL") else None
+
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env"))
 
 # import google.generativeai as genai
 # client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
@@ -51,46 +94,187 @@ validTags: List[str] = [
     "Historic Image",
     "Non Historic Image",
 ]
-# removed .webp because mimetypes doesn't recognize it
-# geminiCompatibleFileTypes = ['.png', '.jpg', '.jpeg', '.pdf', '.doc', '.docx', '.txt'] # TODO UPDATE THIS LIST AS NEEDED
-geminiCompatibleFileTypes: List[str] = [
-    ".c",
-    ".cpp",
-    ".py",
-    ".java",
-    ".php",
-    ".sql",
-    ".html",
-    ".doc",
-    ".docx",
-    ".pdf",
-    ".rtf",
-    ".dot",
-    ".dotx",
-    ".hwp",
-    ".hwpx",
-    ".png",
-    ".jpg",
-    ".jpeg",
-    ".webp",
-    ".heif",
-    ".heic",
-    ".txt",
-    ".pptx",
-    ".xls",
-    ".xlsx",
-    ".csv",
-    ".tsv",
-    ".mp4",
-    ".mpeg",
-    ".mov",
-    ".avi",
-    ".flv",
-    ".mpg",
-    ".webm",
-    ".wmv",
-    ".3gpp",
-]
+# The file types Gemini can read, with the MIME types Drive reports for them.
+# Listed explicitly because the mimetypes module doesn't know some of them (e.g. .webp on some systems) or maps them oddly.
+geminiCompatibleFileTypes: Dict[str, Tuple[str, ...]] = {
+    ".c": ("text/x-c", "text/x-csrc"),
+    ".cpp": ("text/x-c++src", "text/x-c++"),
+    ".py": ("text/x-python", "text/x-python-script"),
+    ".java": ("text/x-java", "text/x-java-source"),
+    ".php": ("application/x-php", "text/x-php", "application/x-httpd-php"),
+    ".sql": ("application/sql", "text/x-sql"),
+    ".html": ("text/html",),
+    ".doc": ("application/msword",),  # Drive reports .dot files like this too
+    ".docx": ("application/vnd.openxmlformats-officedocument.wordprocessingml.document",),
+    ".pdf": ("application/pdf",),
+    ".rtf": ("application/rtf", "text/rtf"),
+    ".dotx": ("application/vnd.openxmlformats-officedocument.wordprocessingml.template",),
+    ".hwp": ("application/x-hwp", "application/haansofthwp"),
+    ".hwpx": ("application/vnd.hancom.hwpx", "application/haansofthwpx"),
+    ".png": ("image/png",),
+    ".jpg": ("image/jpeg", "image/jpg", "image/pjpeg"),
+    ".webp": ("image/webp",),
+    ".heif": ("image/heif",),
+    ".heic": ("image/heic",),
+    ".txt": ("text/plain",),
+    ".pptx": ("application/vnd.openxmlformats-officedocument.presentationml.presentation",),
+    ".xls": ("application/vnd.ms-excel",),
+    ".xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",),
+    ".csv": ("text/csv",),
+    ".tsv": ("text/tab-separated-values",),
+    ".mp4": ("video/mp4",),
+    ".mpeg": ("video/mpeg",),
+    ".mov": ("video/quicktime",),
+    ".avi": ("video/x-msvideo", "video/avi"),
+    ".flv": ("video/x-flv",),
+    ".webm": ("video/webm",),
+    ".wmv": ("video/x-ms-wmv",),
+    ".3gpp": ("video/3gpp",),
+}
+
+# Every value tagEachFile() can write into the 'tag' property
+assignableTags: List[str] = validTags + ["Uncategorized"]
+
+# What the DriveCatalog keeps of each file, requested from the full listing and the change log
+catalogFileFields: str = "id, name, mimeType, md5Checksum, size, createdTime, modifiedTime, parents, properties, trashed"
+
+# Local SQLite database for everything this program remembers between runs (e.g. the TagCache)
+localDatabaseFile: str = "drive-tagger.db"
+
+# Drive downloads are streamed to disk this many bytes at a time.
+# All downloads together never hold more than maxDownloadMemory bytes in memory.
+downloadChunkSize: int = 8 * 1024 * 1024
+maxDownloadMemory: int = 64 * 1024 * 1024
+
+# Google Docs, Sheets and Slides have no file to download, so Drive exports them to a regular format first.
+# Text is used where possible, since it is small and the PreClassifier can read it too.
+googleExportFormats: Dict[str, str] = {
+    "application/vnd.google-apps.document": "text/plain",
+    "application/vnd.google-apps.spreadsheet": "text/csv",  # Only the first sheet is exported
+    "application/vnd.google-apps.presentation": "application/pdf",
+    "application/vnd.google-apps.drawing": "image/png",
+}
+googleExportMaxBytes: int = 10 * 1024 * 1024  # Drive refuses to export more than this
+# Other Google-native types have nothing Gemini could read
+googleUnreadableTypes: Tuple[str, ...] = (
+    "application/vnd.google-apps.folder",
+    "application/vnd.google-apps.shortcut",
+    "application/vnd.google-apps.form",
+    "application/vnd.google-apps.site",
+    "application/vnd.google-apps.map",
+    "application/vnd.google-apps.jam",
+    "application/vnd.google-apps.script",
+    "application/vnd.google-apps.fusiontable",
+)
+
+# The model used to classify files, and the request limits of each model as
+# (requests per minute, requests per day). Update these when switching tiers or models.
+geminiModel: str = "gemini-2.0-flash-lite"
+geminiModelLimits: Dict[str, Tuple[int, int]] = {
+    "gemini-2.0-flash-lite": (30, 200),
+    "gemini-2.0-flash": (15, 200),
+    "gemini-2.5-flash-lite": (15, 1000),
+    "gemini-2.5-flash": (10, 250),
+}
+# Keeps count of today's Gemini requests, so restarting the program doesn't forget them
+geminiUsageFile: str = "gemini-usage.json"
+# Small files are classified several at a time, in a single Gemini request, so each request
+# of the daily budget tags more files. geminiBatchSize = 1 classifies every file on its own.
+geminiBatchSize: int = 8
+geminiBatchFileBytes: int = 512 * 1024  # Only files up to this size are put in a batch
+# Files up to this size are sent to Gemini inline with the request, straight from memory.
+# Bigger ones are uploaded with files.upload(), which Gemini keeps for 48 hours.
+geminiInlineFileBytes: int = 1024 * 1024
+# The most --inline-bytes can raise that to: Gemini refuses requests over 20 MB, and each inline file
+# holds its size of the download memory budget (see maxDownloadMemory) until it was classified
+geminiInlineMaxFileBytes: int = 16 * 1024 * 1024
+geminiUploadLifetime: timedelta = timedelta(hours=47)  # A little less than Gemini's 48 hours, to be safe
+
+# How many threads work on each stage of tagging a file, and how many files may wait between two stages.
+# The free Gemini tier only allows 30 requests per minute, so only raise 'classify' on the paid tier.
+taggingWorkerCounts: Dict[str, int] = {
+    "download": 4,
+    "preclassify": 2,
+    "upload": 4,
+    "classify": 1,
+    "write": 1,
+}
+taggingQueueSize: int = 8
+
+# organizeFiles() sends copies and moves in batches of organizeChunkSize files, from up to organizeWorkerCount threads.
+# Fewer threads send at once while Drive reports that we're over its per-user rate limit (see AdaptiveConcurrencyLimit).
+organizeWorkerCount: int = 8
+organizeChunkSize: int = 20
+# crawlFiles() lists the Drive folder by folder instead of following a single chain of pages: up to crawlWorkerCount
+# listings run at once (fewer while Drive rate limits us), each for the files in up to crawlFoldersPerQuery folders.
+crawlWorkerCount: int = 8
+crawlFoldersPerQuery: int = 50  # Keeps the query well below the length Drive accepts
+# Pages of the Drive change log (changes.list) read ahead of the caller, see prefetchPages() and listChangePages().
+# Full listings go through crawlFiles(), whose threads already list ahead of the caller.
+listPrefetchPages: int = 2
+progressReportSeconds: float = 5.0  # How often long runs report their throughput
+
+# Every thread that talks to Drive gets its own service (with its own keep-alive connection) from a DriveServicePool.
+# A thread keeps it until it ends, then the next new thread reuses it, connection and all, instead of opening another.
+# All threads share one genai.Client, which keeps up to geminiConnectionCount connections open for geminiKeepAliveSeconds.
+geminiConnectionCount: int = 8
+geminiKeepAliveSeconds: float = 60.0
+
+# Stages whose time per file (per page for "list", per batch for "organize") is kept in a histogram, see RunMetrics
+metricStages: Tuple[str, ...] = ("list", "download", "preclassify", "upload", "classify", "write", "organize")
+latencyBuckets: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # Upper bounds, in seconds
+guiRefreshMilliseconds: int = 250  # The GUI redraws its progress at most this often, however many events come in
+
+# Words that give away a file's category without asking Gemini, looked for in the file's name,
+# the names of the folders it's in and (for files with readable text) its text.
+# A trailing * matches any ending (e.g. "invoice*" also matches "invoices"), so short words whose stem starts other words
+# ("camp" in "campaign", "tour" in "tournament") list their forms instead. See preClassifyFile() for how they are weighed.
+preClassifierKeywords: Dict[str, Tuple[str, ...]] = {
+    "Accounting": (
+        "accounting", "finance*", "budget*", "invoice*", "receipt*", "expense*", "payroll", "ledger*", "tax", "taxes", "1099", "w-9",
+        "audit", "audits", "audited", "auditor", "auditors", "balance sheet*", "profit and loss", "p&l", "reimbursement*", "purchase order*",
+        "bank statement*", "fy",
+    ),
+    "Curation": (
+        "curation", "curator*", "collection*", "artifact*", "accession*", "catalog*", "conservation", "provenance", "deed of gift",
+        "object record*", "loan agreement*", "condition report*", "exhibit*",
+    ),
+    "Development (contributed revenue generation)": (
+        "development", "donor*", "donation*", "grant", "grants", "grantee*", "fundrais*", "sponsor*", "gala", "pledge*", "appeal*",
+        "gift acknowledg*", "annual fund", "capital campaign",
+    ),
+    "Employee resources (HR)": (
+        "hr", "human resources", "employee*", "handbook*", "onboarding", "timesheet*", "job description*", "benefits", "pto",
+        "hiring", "resume*", "performance review*", "i-9", "w-4", "personnel", "volunteer application*",
+    ),
+    "Board of Directors": (
+        "board", "board minutes", "board meeting*", "board of directors", "bylaws", "trustee*", "board packet*",
+        "minutes", "resolution*", "committee*",
+    ),
+    "Marketing": (
+        "marketing", "flyer*", "press release*", "newsletter*", "social media", "brochure*", "logo", "logos", "advertis*",
+        "poster*", "media kit*", "instagram", "facebook", "rack card*",
+    ),
+    "Operations": (
+        "operations", "maintenance", "facilit*", "inventory", "vendor*", "insurance", "repair*", "hvac", "security",
+        "work order*", "lease*", "utilities", "cleaning", "safety",
+    ),
+    "Programming": (
+        "programming", "programs", "tour", "tours", "touring", "tour guide*", "workshop*", "lesson plan*", "field trip*",
+        "curriculum", "camp", "camps", "summer camp*", "lecture*", "docent*", "event", "events", "class schedule*",
+    ),
+    "Research (historic info)": (
+        "research", "history", "historic*", "genealog*", "census", "archive*", "victorian", "obituar*",
+        "newspaper clipping*", "oral histor*", "biograph*",
+    ),
+}
+preClassifierNameWeight: float = 3.0  # Each word of a keyword in the file's name
+preClassifierFolderWeight: float = 2.0  # Each word of a keyword in the name of a folder the file is in
+preClassifierTextWeight: float = 1.0  # Each word of a (different) keyword in the file's text
+# Files whose best category scores at least this confidence are tagged without Gemini
+preClassifierMinConfidence: float = 0.8
+preClassifierTextBytes: int = 256 * 1024  # Only the start of a file's text is looked at
+historicImageYear: int = 1950  # Photos taken before this year are historic
 
 # Drive stores months as numbers, so use this dict when creating the respective month folder
 numberToMonth: Dict[int, str] = {
@@ -134,6 +318,12 @@ Historic Image
 Non Historic Image
 """
 
+# Used instead of documentAnalyzerPrompt when several files are classified in one request
+batchedDocumentAnalyzerPrompt: str = """You will be given {fileCount} files, each one introduced by its number ("File 1:", "File 2:", ...). Categorize every file on its own, following the instructions below as if it was the only attached file.
+Instead of a single category name, return a JSON object that maps each file number to its category name, for example {{"1": "Accounting", "2": "Uncategorized"}}, with no additional text.
+
+""" + documentAnalyzerPrompt
+
 
 """
     --- GEMINI SUPPORTS THE FOLLOWING FILE TYPES:---
@@ -165,624 +355,3277 @@ FileMetadata = Dict[str, Any]
 FileProperties = Dict[str, str]
 GeminiResponse = str
 ValidationResult = Literal["DAILY_LIMIT_EXCEEDED", "Uncategorized"] | TagValue
+FolderPath = Tuple[str, str, str]  # (year, month, tag) below Organized-Drive-Files
+# How a file is given to Gemini:
+# - "inline": sent along with the request if small enough (see geminiInlineFileBytes), uploaded otherwise
+# - "upload": always uploaded (videos, which are rarely small)
+# - "export": a Google Docs/Sheets/Slides/Drawings file, exported first (see googleExportFormats)
+# - "skip": Gemini can't read it, so it is tagged 'Uncategorized' straight away
+FileStrategy = Literal["inline", "upload", "export", "skip"]
 
+# What organizeFiles() does with a tagged file (see planOrganization()):
+# - "place": copy or move it to its Year/Month/Tag folder
+# - "done-before": an earlier run already put it in that folder
+# - "name-taken": a file with the same name is already in (or headed for) that folder
+OrganizeStepStatus = Literal["place", "done-before", "name-taken"]
 
-class TaggerMenu:
-    def __init__(self, rootWindow: tk.Tk) -> None:
-        self.moveFiles: bool = False  # Used to determine if files should be MOVED or COPIED
+folderMimeType: MimeType = "application/vnd.google-apps.folder"
 
-        self.root: tk.Tk = rootWindow
-        self.root.title("Google Drive Tagger")
-        self.root.geometry("750x450")
 
-        self.service: Optional[Any] = None  # Used to make calls to Drive API
-        self.geminiKey: Optional[str] = None
-        self.geminiClient: Optional[genai.Client] = None  # Used to make calls to Gemini API
+def buildFileStrategies() -> Tuple[Mapping[MimeType, FileStrategy], Mapping[MimeType, str]]:
+    """
+    Builds the (read-only) lookup tables of MIME type -> FileStrategy and MIME type -> file extension.
+    MIME types that aren't in the first table should be skipped.
+    """
+    strategies: Dict[MimeType, FileStrategy] = {}
+    extensions: Dict[MimeType, str] = {}
+    for extension, mimeTypes in geminiCompatibleFileTypes.items():
+        for mimeType in mimeTypes:
+            strategies[mimeType] = "upload" if mimeType.startswith("video/") else "inline"
+            extensions.setdefault(mimeType, extension)
+    for mimeType in googleExportFormats:
+        strategies[mimeType] = "export"
+    for mimeType in googleUnreadableTypes:
+        strategies[mimeType] = "skip"
+    return MappingProxyType(strategies), MappingProxyType(extensions)
 
-        self.debugMessageQueue: queue.Queue[str] = (
-            queue.Queue()
-        )  # Used to update the debug label in the GUI from the tagging thread
 
-        # ------- The widgets for the GUI -------
-        # self.debugLabel = tk.Label(self.root, justify=tk.LEFT, bg = "gray75") # Used to print what is happening as the program runs
-        # self.debugLabelName = tk.Label(self.root, justify=tk.LEFT, text="Debug Output: ", bg = "gray80") # Label for the debug label
-        self.debugFrame: tk.Frame = tk.Frame(self.root, bg="gray80")
-        self.debugLabelName: tk.Label = tk.Label(
-            self.debugFrame,
-            justify=tk.LEFT,
-            text="Debug Output: ",
-            bg="gray80",
-            wraplength=700,  # Wrap text at 700 pixels to prevent excessive width
-        )
+# Built once, looked up for every listed file
+fileStrategies, fileExtensions = buildFileStrategies()
 
-        self.geminiKeyLabel: tk.Label = tk.Label(
-            self.root, text="Enter your Gemini API Key:", justify=tk.LEFT
-        )  # Label for Gemini API key textbox
-        self.geminiApiEntry: tk.Entry = tk.Entry(self.root)  # Textbox for entering Gemini API key
+# Process-wide cache of (parentFolderId, folderName) -> folderId, so that the
+# year/month/tag folders are only looked up (or created) once per run instead of once per file.
+# Emptied at the start of each run (see clearFolderIdCache()), folders may have been renamed or deleted since the last.
+folderIdCache: Dict[Tuple[Optional[FolderId], str], FolderId] = {}
+# Folders whose sub-folders are ALL in folderIdCache.
+# A cache miss below one of these means the folder doesn't exist on Drive either.
+fullyCachedFolderIds: Set[FolderId] = set()
+folderIdCacheLock: threading.Lock = threading.Lock()
+# In a dry run, folders that would have to be created get a made up ID starting with this
+dryRunFolderPrefix: str = "(new folder) "
 
-        self.tagButton: tk.Button = tk.Button(
-            self.root, text="Perform file tagging", command=self.tagButtonClicked
-        )  # Runs method to analyze each file w/ Gemini and add tag accordingly
-        self.copySortButton: tk.Button = tk.Button(
-            self.root,
-            text="COPY tagged files into organized folder",
-            command=self.copySortButtonClicked,
-            state=tk.DISABLED,
-        )  # Runs method to organize files based on tag and creation date
-        self.moveSortButton: tk.Button = tk.Button(
-            self.root,
-            text="MOVE tagged files into organized folder",
-            command=self.moveSortButtonClicked,
-            state=tk.DISABLED,
-        )  # Runs method to organize files based on tag and creation date
 
-        instructionString: str = "Please ensure credentials.json is in the same folder as this program.\n\nYou will need to click 'Perform file tagging' before files can be sorted.\n\nThe free tier of Google Gemini can only process 400 messages per day.\n\nIf you have more than 400 files then you will need to run this across multiple days."
+def clearFolderIdCache() -> None:
+    """Forgets every cached folder ID, so the next lookups ask Drive (or the catalog) again."""
+    with folderIdCacheLock:
+        folderIdCache.clear()
+        fullyCachedFolderIds.clear()
 
-        self.instructionLabel: tk.Label = tk.Label(
-            self.root,
-            text=instructionString,
-            justify=tk.LEFT,
-            font=("Verdana", 10),
-            bg="gray75",
-        )
 
-        self.drawMainMenu()
-        self.checkQueue()
+# Called once per batched request with (response, error), exactly one of which is None
+BatchCallback = Callable[[Optional[ApiResponse], Optional[Exception]], None]
 
-    def authenticateDriveAPI(self) -> Optional[Any]:
-        if self.verifyJsonPresent():
-            # The following is copied from the Drive API documentation quickstart guide
-            creds: Optional[Credentials] = None
-            flow: Optional[InstalledAppFlow] = None
 
-            try:
-                if os.path.exists("token.json"):
-                    creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-                # If there are no (valid) credentials available, let the user log in.
-                if not creds or not creds.valid:
-                    if creds and creds.expired and creds.refresh_token:
-                        creds.refresh(Request())
-                    else:
-                        flow = InstalledAppFlow.from_client_secrets_file(
-                            "credentials.json", SCOPES
-                        )
-                        creds = flow.run_local_server(port=0)
-                    # Save the credentials for the next run
-                    with open("token.json", "w") as token:
-                        token.write(creds.to_json())
+def isRateLimitError(error: Exception) -> bool:
+    """True if Drive rejected a request for going over a (per-user) rate limit."""
+    if not isinstance(error, googleApiErrors.HttpError):
+        return False
+    status: int = getattr(error.resp, "status", 0)
+    return status == 429 or (
+        status == 403 and "ratelimitexceeded" in str(error.content).lower()
+    )
 
-                return build("drive", "v3", credentials=creds)
-            except Exception as e:
-                self.updateDebugMessageQueue(
-                    f"An error occurred during Drive authentication"
-                )
-                return None
 
-    """
-  Checks if folder exists, returns True if it does.
-  Othwerise, creates the folder then returns True. 
-  Optionally, you can provide the parent folder ID to have nested folders.
-  This method WILL NOT copy a file if there is a file with the same name in the destination folder.
-  The idea is that if there already is a file with the same name, then this method has been run before on said file. 
-"""
+def backoffDelay(attempt: int, baseSeconds: float = 2.0, maxSeconds: float = 60.0) -> float:
+    """Seconds to wait before retry number `attempt` (exponential backoff with full jitter)."""
+    return random.uniform(0, min(maxSeconds, baseSeconds * (2 ** attempt)))
 
-    def checkIfFolderExists(self, folderName: str, parentFolderId: Optional[FolderId] = None) -> Optional[FolderId]:
 
-        try:
-            # Note that the Drive API treats folders as a file with the MIME type of "application/vnd.google-apps.folder"
-            query: str = f"name='{folderName}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-            if parentFolderId:
-                query += f" and '{parentFolderId}' in parents"
-
-            # Check if folder already exists:
-            results: ApiResponse = (
-                self.service.files()
-                .list(q=query, spaces="drive", fields="files(id, name)")
-                .execute()
-            )
-            items: List[FileMetadata] = results.get("files", [])
+def isFileChange(change: ApiResponse) -> bool:
+    """True for an entry of the Drive change log about a file, rather than about a shared drive."""
+    return change.get("changeType", "file") == "file" and bool(change.get("fileId"))
 
-            if items:  # Folder exists
-                return items[0].get("id")
-            else:
-                # Folder doesn't exist, so construct it
 
-                # Define metadata for the new folder
-                fileMetadata: FileMetadata = {
-                    "name": folderName,
-                    "mimeType": "application/vnd.google-apps.folder",
-                }
+def escapeQueryValue(value: str) -> str:
+    """Escapes a string so it can be put between single quotes in a Drive query."""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
 
-                # If parentFolderId is provided, set it as the parent in the metadata
-                if parentFolderId:
-                    fileMetadata["parents"] = [parentFolderId]
 
-                # Create the folder
-                file: ApiResponse = (
-                    self.service.files()
-                    .create(body=fileMetadata, fields="id")
-                    .execute()
-                )
-                folderId: Optional[FolderId] = file.get("id")
+class PageQueue:
+    """
+    Hands pages of a listing from reading threads to the thread working on them, as ("page", page), ("error", error)
+    or ("done", None) once a reader is finished. Bounded, so the readers wait for the caller instead of piling up
+    pages in memory, and they give up once the caller stopped reading (see stop()).
+    """
 
-                if folderId:
-                    return folderId
-                else:
-                    self.updateDebugMessageQueue(
-                        "Problem with creating the folder (no ID returned)"
-                    )
-                    return None
+    def __init__(self, maxSize: int) -> None:
+        self.items: queue.Queue[Tuple[str, Any]] = queue.Queue(maxsize=maxSize)
+        self.stopped: threading.Event = threading.Event()
 
-        except HttpError as error:
-            self.updateDebugMessageQueue("Http error when checking or creating folder")
-        except Exception as e:
-            self.updateDebugMessageQueue(
-                "Error occurred when checking or creating folder"
-            )
-            return None
+    def put(self, kind: str, payload: Any) -> bool:
+        """Waits while the queue is full. Returns False if the caller stopped reading, so the reader can end."""
+        while not self.stopped.is_set():
+            try:
+                self.items.put((kind, payload), timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
 
-    """
-  Moves a file from its current location to a specified destination folder in Google Drive.
+    def get(self) -> Tuple[str, Any]:
+        return self.items.get()
 
-  Returns the ID of the moved file if successful, None otherwise.
-  """
+    def stop(self) -> None:
+        self.stopped.set()
 
-    def moveFileToFolder(self, fileId: FileId, destinationFolderId: FolderId) -> Optional[FileId]:
-        try:
-            # Step 1: Get the original file's metadata, specifically its current parents.
-            # We need 'parents' to know which folder(s) to remove it from.
-            originalFileMetadata: ApiResponse = (
-                self.service.files()
-                .get(
-                    fileId=fileId,
-                    fields="parents, name",  # Also get name for logging/checking
-                )
-                .execute()
-            )
+    def isStopped(self) -> bool:
+        return self.stopped.is_set()
 
-            currentParents: List[FolderId] = originalFileMetadata.get("parents", [])
-            originalFileName: str = originalFileMetadata.get("name", "")
 
-            # Step 1.5: Make sure there isn't already a file with the same name in the destination folder.
-            query: str = f"name = '{originalFileName}' and '{destinationFolderId}' in parents and trashed = false"
-            results: ApiResponse = (
-                self.service.files().list(q=query, fields="files(id, name)").execute()
-            )
+def takeFolderQuery(pendingFolderIds: deque[FolderId], freeWorkerCount: int) -> str:
+    """
+    Takes the next folders to list off pendingFolderIds and returns the Drive query for their files,
+    spreading the waiting folders over the free threads, crawlFoldersPerQuery at most per listing.
+    """
+    groupSize: int = min(crawlFoldersPerQuery, -(-len(pendingFolderIds) // max(1, freeWorkerCount)))
+    folderIds: List[FolderId] = [pendingFolderIds.popleft() for _ in range(groupSize)]
+    return (
+        "(" + " or ".join(f"'{escapeQueryValue(folderId)}' in parents" for folderId in folderIds)
+        + ") and trashed = false"
+    )
 
-            existingFiles: List[FileMetadata] = results.get("files", [])
 
-            if existingFiles:
-                # A file with the same name already exists in the destination folder.
-                self.updateDebugMessageQueue(
-                    f"File '{originalFileName}' already exists in folder {destinationFolderId}. Skipping move to avoid duplicate names."
-                )
-                return None  # Indicate that no move was performed
-
-            # Step 2: Prepare the metadata for the update operation.
-
-            # We need to specify the file ID in the update call, but no body is strictly
-            # necessary if only parents are changing via addParents/removeParents.
-            # However, for consistency and future expansion, an empty body is often used.
-            file_body: Dict[str, Any] = {}
-
-            # Step 3: Execute the update operation to move the file.
-            # pylint: disable=maybe-no-member
-            movedFile: ApiResponse = (
-                self.service.files()
-                .update(
-                    fileId=fileId,
-                    body=file_body,  # Can be empty if only changing parents
-                    addParents=destinationFolderId,
-                    removeParents=",".join(
-                        currentParents
-                    ),  # Comma-separated list of parent IDs to remove
-                    fields="id, name, parents",  # Request parents back to confirm
-                )
-                .execute()
-            )
+def takeNewFiles(
+    fileItems: List[FileMetadata], seenFileIds: Set[FileId], pendingFolderIds: deque[FolderId]
+) -> List[FileMetadata]:
+    """The files of a crawled page not seen before, which are added to seenFileIds (and their folders to pendingFolderIds)."""
+    newItems: List[FileMetadata] = [item for item in fileItems if item["id"] not in seenFileIds]
+    for item in newItems:
+        seenFileIds.add(item["id"])
+        if item.get("mimeType") == folderMimeType:
+            pendingFolderIds.append(item["id"])
+    return newItems
 
-            movedFileId: Optional[FileId] = movedFile.get("id")
-            if movedFileId:
-                self.updateDebugMessageQueue(
-                    f"Moved file {fileId} (name: '{originalFileName}') to folder {destinationFolderId}."
-                )
-                return movedFileId
-            else:
-                self.updateDebugMessageQueue(
-                    "Problem with moving the file (no ID returned)"
-                )
-                return None
 
-        except HttpError as error:
-            self.updateDebugMessageQueue(f"HTTP Error: Could not move file: {error}")
-            return None
-        except Exception as e:
-            self.updateDebugMessageQueue(f"Error: Could not move file: {e}")
-            return None
+PageItem = TypeVar("PageItem")
 
-    def copyFileToFolder(self, fileId: FileId, destinationFolderId: FolderId) -> Optional[FileId]:
-        try:
-            # Step 1: Get the original file's metadata, including its name and properties.
-            # We need 'name' to give the copied file the same name, and 'properties'
-            # to transfer the custom 'tag'.
-            originalFileMetadata: ApiResponse = (
-                self.service.files()
-                .get(fileId=fileId, fields="name, properties")
-                .execute()
-            )
 
-            originalFileName: str = originalFileMetadata.get("name", "")
-            originalProperties: FileProperties = originalFileMetadata.get("properties", {})
+def prefetchPages(pages: Iterator[PageItem], lookAhead: Optional[int] = None) -> Generator[PageItem, None, None]:
+    """
+    Yields what pages yields, reading it on a background thread up to lookAhead (default: listPrefetchPages)
+    pages ahead, so the request for the next page is already under way while the caller works on this one.
+    Errors from pages are raised to the caller. Once the caller closes the generator (or stops iterating it
+    with yield from), no more pages are read after the one being read.
+    """
+    lookAhead = listPrefetchPages if lookAhead is None else lookAhead
+    if lookAhead < 1:
+        yield from pages
+        return
 
-            # Extract the 'tag' value if it exists
-            tagValue: Optional[str] = originalProperties.get("tag")
+    readPages: PageQueue = PageQueue(lookAhead)
 
-            # Step 1.5 Ensure that there isn't already a file with the same name in
-            # the destination folder. (If there is, don't copy file to it because this means the copy method has already been called for this file)
+    def readAhead() -> None:
+        try:
+            for page in pages:
+                if not readPages.put("page", page):
+                    return
+            readPages.put("done", None)
+        except Exception as error:
+            readPages.put("error", error)
+        finally:
+            # pages was started on this thread, so it has to be closed here too
+            if hasattr(pages, "close"):
+                pages.close()
+
+    readingThread: threading.Thread = threading.Thread(target=readAhead, name="prefetchPages", daemon=True)
+    readingThread.start()
+    try:
+        while True:
+            kind, payload = readPages.get()
+            if kind == "error":
+                raise payload
+            if kind == "done":
+                return
+            yield payload
+    finally:
+        readPages.stop()
+        readingThread.join()
 
-            query: str = f"name = '{originalFileName}' and '{destinationFolderId}' in parents and trashed = false"
 
-            # Execute the search query
-            results: ApiResponse = (
-                self.service.files()
-                .list(
-                    q=query,
-                    fields="files(id, name)",  # We only need id and name for the check
-                )
-                .execute()
-            )
+def parseCreatedMonth(createdTime: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Returns the (year, month) of a file's createdTime, or None if it can't be read."""
+    if not createdTime:
+        return None
 
-            existingFiles: List[FileMetadata] = results.get("files", [])
+    # This part is a bit ugly because createdTime is a RFC 3339 formatted string
+    if createdTime.endswith("Z"):
+        createdTime = createdTime[:-1]
+    if "." in createdTime:
+        createdTime = createdTime.split(".")[0]
 
-            if existingFiles:
-                # A file with the same name already exists in the destination folder
-                self.updateDebugMessageQueue(
-                    f"File '{originalFileName}' already exists in folder {destinationFolderId}. Skipping copy."
-                )
-                return None  # Indicate that no copy was performed
+    try:
+        createdDate: datetime = datetime.fromisoformat(createdTime)
+    except ValueError:
+        return None
+    return createdDate.year, createdDate.month
 
-            # Step 2: Prepare the metadata for the copied file.
-            # This includes the name, the parent folder, and the properties.
-            copiedFileMetadata: FileMetadata = {
-                "name": originalFileName,
-                "parents": [destinationFolderId],
-            }
 
-            # If the original file had a 'tag', include it in the new file's properties.
-            # We create a new dictionary for properties to ensure it's clean.
-            if tagValue:
-                copiedFileMetadata["properties"] = {"tag": tagValue}
-            else:
-                # If no tag, ensure properties are not explicitly set or are empty
-                # to avoid transferring other unwanted properties if they existed.
-                copiedFileMetadata["properties"] = {}
-
-            # Step 3: Execute the copy operation.
-            # pylint: disable=maybe-no-member
-            copiedFile: ApiResponse = (
-                self.service.files()
-                .copy(
-                    fileId=fileId,
-                    body=copiedFileMetadata,
-                    fields="id, name, parents, properties",  # Request properties back to confirm
-                )
-                .execute()
-            )
+driveDiscoveryDocument: Optional[Dict[str, Any]] = None  # See loadDriveDiscoveryDocument()
+driveDiscoveryLock: threading.Lock = threading.Lock()
 
-            copiedFileId: Optional[FileId] = copiedFile.get("id")
-            if copiedFileId:
-                self.updateDebugMessageQueue(f"Copied {fileId} to {copiedFileId}")
-                return copiedFileId
-            else:
-                self.updateDebugMessageQueue(
-                    "Problem with copying the file (no ID returned)"
-                )
-                return None
 
-        except HttpError as error:
-            self.updateDebugMessageQueue(f"An API error occurred during file copy")
-            return None
-        except Exception as e:
-            self.updateDebugMessageQueue(
-                f"An unexpected error occurred during file copy"
-            )
-            return None
+def loadDriveDiscoveryDocument() -> Dict[str, Any]:
+    """
+    The description of the Drive v3 API that googleapiclient builds services from.
+    It is read from the copy that ships with googleapiclient (no request to Google) and parsed only once,
+    instead of by build() for every thread's service.
+    """
+    global driveDiscoveryDocument
+    with driveDiscoveryLock:
+        if driveDiscoveryDocument is None:
+            documentText: Optional[str] = importlib.import_module("googleapiclient.discovery_cache").get_static_doc("drive", "v3")
+            driveDiscoveryDocument = json.loads(documentText)
+        return driveDiscoveryDocument
 
-    def updateTagMetadata(self, fileId: FileId, tagValue: TagValue) -> bool:
 
-        new_properties: FileProperties = {"tag": tagValue}
+def saveDriveToken(credentials: Credentials) -> None:
+    """Saves the Drive credentials to token.json, so the next run doesn't have to sign in again."""
+    with open("token.json", "w") as token:
+        token.write(credentials.to_json())
 
-        file_metadata: FileMetadata = {"properties": new_properties}
 
-        try:
-            updatedFile: ApiResponse = (
-                self.service.files()
-                .update(
-                    fileId=fileId,
-                    body=file_metadata,
-                    # Specify 'properties' in fields to get them back in the response
-                    fields="id,name,properties",
-                )
-                .execute()
-            )
+class PooledAuthorizedHttp:
+    """
+    An AuthorizedHttp (which signs each request with the credentials) that lets its DriveServicePool
+    refresh the shared credentials, instead of each thread on its own.
+    """
 
-            self.updateDebugMessageQueue(
-                f"Successfully tagged file '{updatedFile.get('name')}'."
-            )
-            return True
-        except HttpError as error:
-            self.updateDebugMessageQueue(
-                f"An error occurred while updating file metadata"
-            )
-            return False
+    def __init__(self, pool: "DriveServicePool", http: Any) -> None:
+        self.pool: DriveServicePool = pool
+        self.authorizedHttp: Any = googleAuthHttplib2.AuthorizedHttp(pool.credentials, http=http)
 
-    # 1) Downloads a file from Google Drive
-    # 2) Calls promptGemini() to analyze it
-    # 3) Updates metadata with the tag (or 'Uncategorized' if there is an issue)
-    def downloadFileAndUpdateMetadata(self, fileId: FileId, mimeType: MimeType) -> Optional[ValidationResult]:
-        temp_file_path: Optional[str] = None
+    def request(self, *args: Any, **kwargs: Any) -> Any:
+        self.pool.refreshCredentials()
+        return self.authorizedHttp.request(*args, **kwargs)
 
-        try:
-            # First, check if the file type is compatible with Gemini
-            # If it isn't, set the tag is 'Uncategorized'
-            fileType: Optional[str] = mimetypes.guess_extension(
-                mimeType, strict=False
-            )  # use the mimetypes library to extract file type
-
-            if (
-              (fileType is None) or \
-              (fileType not in geminiCompatibleFileTypes)
-            ):
-                self.updateDebugMessageQueue(
-                    "Setting incompatible file as 'Uncategorized'"
-                )
-                self.updateTagMetadata(fileId, "Uncategorized")
-                return None
+    def __getattr__(self, attributeName: str) -> Any:
+        # Everything else (e.g. credentials, timeout, close()) is the AuthorizedHttp's
+        return getattr(self.authorizedHttp, attributeName)
 
-            request: Any = self.service.files().get_media(fileId=fileId)
-            file: io.BytesIO = io.BytesIO()
-            downloader: MediaIoBaseDownload = MediaIoBaseDownload(file, request)
-            done: bool = False
-            while done is False:
-                status, done = downloader.next_chunk()
-                self.updateDebugMessageQueue(
-                    f"Downloaded to memory: {int(status.progress() * 100)}."
-                )
 
-            # Reset the file pointer to the beginning of the stream
-            file.seek(0)
+class DriveServicePool:
+    """
+    Hands each thread its own Drive service (googleapiclient services aren't thread-safe).
+    Each service keeps its HTTPS connection to Drive open between requests, so only the first
+    request pays for the TLS handshake. Services of threads that have ended are handed to
+    new threads, so later runs (with new worker threads) reuse the connections of earlier ones.
+    The credentials are refreshed in one place, by the first thread to find them expired.
+    """
 
-            # Convert the byte stream to a temporary file so that Gemini can actually use it
-            with tempfile.NamedTemporaryFile(
-                delete=False, suffix=fileType
-            ) as temp_file:  #
-                temp_file.write(file.getvalue())
-                temp_file_path = temp_file.name
+    def __init__(self, credentials: Optional[Credentials], onRefresh: Optional[Callable[[Credentials], None]] = None) -> None:
+        self.credentials: Optional[Credentials] = credentials
+        self.onRefresh: Optional[Callable[[Credentials], None]] = onRefresh  # e.g. saves the new token
+        self.refreshLock: threading.Lock = threading.Lock()
+        self.refreshRequest: Any = googleAuthRequests.Request()  # Keeps its own connection to Google's token endpoint
+        self.leaseLock: threading.Lock = threading.Lock()
+        self.leasedServices: Dict[threading.Thread, Any] = {}  # Thread -> the service it is using
+        self.idleServices: List[Any] = []  # Services of threads that have ended
+        self.builtCount: int = 0
+
+    def refreshCredentials(self) -> bool:
+        """Refreshes the credentials if they have expired, returns True if they were."""
+        if self.credentials is None or self.credentials.valid:
+            return False
+        with self.refreshLock:
+            if self.credentials.valid:
+                return False  # Another thread refreshed them while this one was waiting
+            self.credentials.refresh(self.refreshRequest)
+        if self.onRefresh:
+            self.onRefresh(self.credentials)
+        return True
+
+    def buildService(self) -> Any:
+        if self.credentials is None:
+            # Uses the application default credentials
+            return googleDiscovery.build_from_document(loadDriveDiscoveryDocument())
+        # build_http() sets the same timeout and redirect handling build() would
+        return googleDiscovery.build_from_document(
+            loadDriveDiscoveryDocument(), http=PooledAuthorizedHttp(self, googleApiHttp.build_http())
+        )
 
-            if temp_file_path:
-                # All the conditions are met to send the file to Gemini
-                tagValue: ValidationResult = self.promptGemini(temp_file_path, documentAnalyzerPrompt)
-            else:
-                self.updateDebugMessageQueue(
-                    f"Error creating temporary file for {fileId}"
-                )
-                tagValue = "Uncategorized"
+    def lease(self) -> Any:
+        """Returns the calling thread's service, taking an idle one or building one the first time."""
+        thread: threading.Thread = threading.current_thread()
+        with self.leaseLock:
+            service: Optional[Any] = self.leasedServices.get(thread)
+            if service is not None:
+                return service
+            for ownerThread in [ownerThread for ownerThread in self.leasedServices if not ownerThread.is_alive()]:
+                self.idleServices.append(self.leasedServices.pop(ownerThread))
+            service = self.idleServices.pop() if self.idleServices else None
+            if service is None:
+                self.builtCount += 1
 
-            if tagValue == "DAILY_LIMIT_EXCEEDED":
-                return tagValue
+        if service is None:
+            service = self.buildService()
+        with self.leaseLock:
+            self.leasedServices[thread] = service
+        return service
 
-            self.updateTagMetadata(fileId, tagValue)
-            return None
 
-        except Exception as error:
-            self.updateDebugMessageQueue(f"An error occurred: {error}")
-            file = None
-            return None
-        finally:
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.remove(temp_file_path)  # Clean up the temporary file
-                    self.updateDebugMessageQueue(
-                        f"Temporary file {temp_file_path} deleted successfully."
-                    )
-                except Exception as e:
-                    self.updateDebugMessageQueue(f"Error deleting temporary file: {e}")
+def requestEndpoint(request: Any) -> str:
+    """The name of the API method a googleapiclient request calls, e.g. 'drive.files.list'."""
+    return getattr(request, "methodId", None) or f"drive.{type(request).__name__}"
 
-    def promptGemini(self, tempFilePath: str, promptMessage: str) -> ValidationResult:
-        """
-        gemini-2.0-flash-lite rate limits:
-        - 30 requests per minute
-        - 200 requests per day
-        """
 
-        # Attempt a finite number of times incase rate limit is exceeded
-        for _ in range(5):
+def responseSize(response: Any) -> int:
+    """Roughly how many bytes a JSON response from Drive took."""
+    return len(json.dumps(response)) if isinstance(response, dict) else 0
 
-            try:
-                self.updateDebugMessageQueue(
-                    f"Attempting to upload file to Gemini: {tempFilePath}"
-                )
-                myfile: Any = self.geminiClient.files.upload(file=tempFilePath)
-                self.updateDebugMessageQueue(
-                    f"Successfully uploaded file to Gemini: {myfile.name}"
-                )
 
-                response: Any = self.geminiClient.models.generate_content(
-                    model="gemini-2.0-flash-lite", contents=[promptMessage, myfile]
-                )
+# Called for each API call with (endpoint, seconds, bytes, error or None, ID of the file it was about or None)
+ApiCallRecorder = Callable[[str, float, int, Optional[Exception], Optional[FileId]], None]
+# A request waiting in a DriveRequestBatcher: (request, callback, attempt number, ID of the file the request is about)
+BatchedRequest = Tuple[Any, BatchCallback, int, Optional[FileId]]
+# What onApiCall hears about a batched request: (endpoint, bytes, error, fileId)
+BatchedApiCall = Tuple[str, int, Optional[Exception], Optional[FileId]]
 
-                cleanedResponse: str = response.text.strip()
 
-                if cleanedResponse in validTags:
-                    self.updateDebugMessageQueue(
-                        f"Gemini returned valid tag: {cleanedResponse}"
-                    )
-                    return cleanedResponse
-                else:
-                    self.updateDebugMessageQueue(
-                        "Invalid Gemini response. Setting tag as 'Uncategorized'"
-                    )
-                    return "Uncategorized"
+class DriveRequestBatcher:
+    """
+    Collects Drive API requests and sends them as multipart batch requests,
+    up to maxBatchSize at a time, instead of one HTTP request each.
+    Every request's callback is called with (response, error) once its batch has run.
+    Requests rejected for rate limiting are retried in a later batch.
+    Each request is passed to onApiCall (if given) with an equal share of its batch's time.
+    """
 
-            except GoogleAPIError as error:
-                if error.code == 429:
-                    self.updateDebugMessageQueue(
-                        "Daily Gemini rate limit exceeded. Please try again in 24 hours."
-                    )
-                    return "DAILY_LIMIT_EXCEEDED"
-                else:
-                    self.updateDebugMessageQueue(
-                        f"An unexpected error occurred: {error}"
-                    )
-            except Exception as e:
-                return "Uncategorized"  # If there is an error, it is likely because of an invalid file type, so return 'Uncategorized'
+    maxBatchSize: int = 100  # The most requests Drive accepts in one batch
+
+    def __init__(self, service: Any, maxRetries: int = 3, onApiCall: Optional[ApiCallRecorder] = None) -> None:
+        self.service: Any = service
+        self.maxRetries: int = maxRetries
+        self.onApiCall: Optional[ApiCallRecorder] = onApiCall
+        self.pendingRequests: List[BatchedRequest] = []
+        self.pendingLock: threading.Lock = threading.Lock()
+        self.sendLock: threading.Lock = threading.Lock()  # Only one batch in flight at a time
+        self.rateLimitedCount: int = 0  # Requests Drive rejected for rate limiting so far
+
+    def add(self, request: Any, callback: BatchCallback, fileId: Optional[FileId] = None) -> None:
+        with self.pendingLock:
+            self.pendingRequests.append((request, callback, 0, fileId))
+            batchIsFull: bool = len(self.pendingRequests) >= self.maxBatchSize
+
+        if batchIsFull:
+            self.sendBatch()
+
+    def flush(self) -> None:
+        """Sends everything that is still queued (including retries)."""
+        while self.pendingRequests:
+            self.sendBatch()
+
+    def sendBatch(self) -> None:
+        with self.sendLock:
+            with self.pendingLock:
+                requestsToSend: List[BatchedRequest] = self.pendingRequests[: self.maxBatchSize]
+                del self.pendingRequests[: self.maxBatchSize]
+
+            if not requestsToSend:
+                return
 
-    def verifyGeminiKey(self) -> bool:
-        self.geminiKey = (
-            self.geminiApiEntry.get().strip()
-        )  # Get the key from the entry box
+            rateLimitedRequests: List[BatchedRequest] = self.executeBatch(requestsToSend)
+            if rateLimitedRequests:
+                # Back off before the retries go out with the next batch
+                time.sleep(backoffDelay(max(attempt for _, _, attempt, _ in rateLimitedRequests)))
+                with self.pendingLock:
+                    self.pendingRequests[0:0] = rateLimitedRequests
+
+    def executeBatch(self, requestsToSend: List[BatchedRequest]) -> List[BatchedRequest]:
+        """Sends requestsToSend as one batch and runs their callbacks. Returns the rate limited ones to retry."""
+        rateLimitedRequests: List[BatchedRequest] = []
+        # Each request's call, passed to onApiCall once the batch's time is known
+        apiCalls: List[BatchedApiCall] = []
+        # Positions in requestsToSend of the requests Drive already answered, even if the batch fails afterwards
+        answeredIndexes: Set[int] = set()
+
+        def makeBatchCallback(index: int, request: Any, callback: BatchCallback, attempt: int, fileId: Optional[FileId]) -> Callable[[str, Any, Optional[Exception]], None]:
+            def batchCallback(requestId: str, response: Any, error: Optional[Exception]) -> None:
+                answeredIndexes.add(index)
+                apiCalls.append((requestEndpoint(request), responseSize(response), error, fileId))
+                if self.isRetryable(error, attempt):
+                    rateLimitedRequests.append((request, callback, attempt + 1, fileId))
+                    return
+                self.runCallback(callback, None if error else response, error)
 
-        if not self.geminiKey or self.geminiKey == "":
-            self.updateDebugMessageQueue("Please enter a valid Gemini API key.")
-            return False
+            return batchCallback
 
-        # Verify that the Gemini API key is valid by making a simple request
+        startTime: float = time.monotonic()
         try:
-            self.geminiClient = genai.Client(api_key=self.geminiKey)
-            response: Any = (
-                self.geminiClient.models.list()
-            )  # This will raise an error if the key is invalid
-            self.updateDebugMessageQueue(f"Gemini API key is valid.")
-            return True
-        except Exception as e:
-            self.updateDebugMessageQueue(f"Invalid Gemini API key")
-            return False
+            batch: Any = self.service.new_batch_http_request()
+            for index, (request, callback, attempt, fileId) in enumerate(requestsToSend):
+                batch.add(request, callback=makeBatchCallback(index, request, callback, attempt, fileId))
 
-    # Checks if the Json file from the Google Cloud project is present.
-    def verifyJsonPresent(self) -> bool:
-        filename: str = "credentials.json"
-        if os.path.exists(filename):
-            self.updateDebugMessageQueue(f"'{filename}' found successfully")
-            return True
-        else:
-            self.updateDebugMessageQueue(
-                f"'{filename}' not present in the current directory"
-            )
-            return False
+            batch.execute()
+        except Exception as error:
+            self.failUnansweredRequests(requestsToSend, answeredIndexes, apiCalls, error)
+        finally:
+            self.recordApiCalls(apiCalls, time.monotonic() - startTime)
+        return rateLimitedRequests
 
-    def updateDebugMessageQueue(self, message: str) -> None:
-        self.debugMessageQueue.put(message)
+    def isRetryable(self, error: Optional[Exception], attempt: int) -> bool:
+        """Whether a request that failed with error was rate limited (which is counted) and has retries left."""
+        if not error or not isRateLimitError(error):
+            return False
+        self.rateLimitedCount += 1
+        return attempt < self.maxRetries
+
+    def failUnansweredRequests(
+        self, requestsToSend: List[BatchedRequest], answeredIndexes: Set[int], apiCalls: List[BatchedApiCall],
+        error: Exception,
+    ) -> None:
+        """The batch as a whole failed, so every request Drive hadn't answered yet failed with error."""
+        for index, (request, callback, _, fileId) in enumerate(requestsToSend):
+            if index not in answeredIndexes:
+                apiCalls.append((requestEndpoint(request), 0, error, fileId))
+                self.runCallback(callback, None, error)
+
+    def recordApiCalls(self, apiCalls: List[BatchedApiCall], batchSeconds: float) -> None:
+        """Passes each call of a batch to onApiCall, with an equal share of the batch's time."""
+        if not self.onApiCall or not apiCalls:
+            return
+        secondsEach: float = batchSeconds / len(apiCalls)
+        for endpoint, byteCount, error, fileId in apiCalls:
+            self.onApiCall(endpoint, secondsEach, byteCount, error, fileId)
 
-    def checkQueue(self) -> None:
-        """Checks the queue for new messages and updates the debug label."""
+    @staticmethod
+    def runCallback(callback: BatchCallback, response: Optional[ApiResponse], error: Optional[Exception]) -> None:
+        # A failing callback shouldn't stop the callbacks of the other requests in the batch
         try:
-            while True:
-                message: str = self.debugMessageQueue.get_nowait()
-                self.debugLabelName.config(text=f"Debug Output: {message}")
-                self.root.update_idletasks()  # Force GUI update
-        except queue.Empty:
-            pass  # No messages in the queue
+            callback(response, error)
+        except Exception:
+            pass
+
 
-        # Schedule this method to run again after a short delay (e.g., 100 ms)
-        self.after_id: str = self.root.after(100, self.checkQueue)
+class FileTooLargeError(Exception):
+    """Raised when a download goes over its size limit (e.g. googleExportMaxBytes)."""
 
+
+class ByteBudget:
+    """
+    A fixed number of bytes that threads reserve part of before using them,
+    waiting while not enough of the budget is free.
     """
-    Crawls through the user's Google Drive and analyzes each file compatible with Gemini.
-    Designed to look at all files in the Drive (ignoring ones that already have a tag),
-    so that it can be run again if it previously crashed or failed. 
-  """
 
-    def tagEachFile(self) -> None:
-        pageToken: Optional[str] = (
-            None  # Used to request the next step of 1000 files from the Drive API
-        )
-        pageSize: int = (
-            20  # The number of files to retrieve (max allowed per request is 1000)
-        )
+    def __init__(self, totalBytes: int) -> None:
+        self.totalBytes: int = totalBytes
+        self.usedBytes: int = 0
+        self.waitingCount: int = 0  # Threads waiting in reserve()
+        self.condition: threading.Condition = threading.Condition()
+
+    def reserve(self, numBytes: int) -> None:
+        numBytes = min(numBytes, self.totalBytes)  # A bigger reservation could never be granted
+        with self.condition:
+            if self.usedBytes + numBytes > self.totalBytes:
+                self.waitingCount += 1
+                try:
+                    self.condition.wait_for(lambda: self.usedBytes + numBytes <= self.totalBytes)
+                finally:
+                    self.waitingCount -= 1
+            self.usedBytes += numBytes
 
-        try:
-            while True:
-                nextFilesBatch: List[Tuple[FileId, MimeType]] = []  # The next batch of files to perform tagging on
+    def isExhausted(self) -> bool:
+        """Whether a thread is waiting for part of the budget to be released."""
+        with self.condition:
+            return self.waitingCount > 0
 
-                # Get the json file containing the list of files from the Drive API
-                retrievedFilesJson: ApiResponse = (
-                    self.service.files()
-                    .list(
-                        pageSize=pageSize,
-                        fields="nextPageToken, files(id, name, mimeType)",
-                        pageToken=pageToken,
+    def release(self, numBytes: int) -> None:
+        numBytes = min(numBytes, self.totalBytes)
+        with self.condition:
+            self.usedBytes -= numBytes
+            self.condition.notify_all()
+
+
+# Shared by every download thread, see maxDownloadMemory
+downloadMemoryBudget: ByteBudget = ByteBudget(maxDownloadMemory)
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    Lets up to `limit` threads work at once, where limit adapts to what Drive can take:
+    it is halved each time a thread was rate limited, and grows by one after about `limit`
+    successes in a row, up to maxLimit.
+    """
+
+    def __init__(self, maxLimit: int) -> None:
+        self.maxLimit: int = max(1, maxLimit)
+        self.limit: float = max(1.0, self.maxLimit / 2)  # Start at half speed, success ramps it up
+        self.activeCount: int = 0
+        self.condition: threading.Condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self.condition:
+            self.condition.wait_for(lambda: self.activeCount < int(self.limit))
+            self.activeCount += 1
+
+    def release(self, rateLimited: bool) -> None:
+        with self.condition:
+            self.activeCount -= 1
+            if rateLimited:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.maxLimit), self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class ThroughputCounter:
+    """Counts finished items from several threads, and how many that is per second."""
+
+    def __init__(self) -> None:
+        self.startTime: float = time.monotonic()
+        self.lastReportTime: float = self.startTime
+        self.count: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+    def add(self, count: int = 1) -> bool:
+        """Counts count more items. Returns True if progressReportSeconds passed since the last time it did."""
+        with self.lock:
+            self.count += count
+            now: float = time.monotonic()
+            if now - self.lastReportTime < progressReportSeconds:
+                return False
+            self.lastReportTime = now
+            return True
+
+    def perSecond(self) -> float:
+        return self.count / max(time.monotonic() - self.startTime, 1e-9)
+
+
+# What a MetricsEvent is about:
+# - "status": a progress message (message)
+# - "result": a file is done with (action and status, see DriveTagger.reportResult())
+# - "latency": a stage took seconds for one file, page of a listing or batch of copies/moves (stage and seconds)
+# - "bytes": count bytes were downloaded
+# - "quota": count Gemini requests are left for today
+# - "apiCall": one call to endpoint (e.g. "drive.files.list") took seconds and moved count bytes, status is "ok" or "failed",
+#   for Gemini's generate_content tokenCounts has the prompt, candidates and total tokens it used
+MetricsEventKind = Literal["status", "result", "latency", "bytes", "quota", "apiCall"]
+
+# The tokens counted from a Gemini response's usage_metadata, see DriveTagger.requestGemini()
+geminiTokenKinds: List[str] = ["prompt", "candidates", "total"]
+costlyFileCount: int = 10  # Files listed by RunMetrics.costSummary() when traceFiles is on
+
+
+class MetricsEvent:
+    """Something that happened during a run, see DriveTagger.emitEvent()."""
+
+    def __init__(
+        self,
+        kind: MetricsEventKind,
+        message: Optional[str] = None,
+        action: Optional[str] = None,
+        status: Optional[str] = None,
+        stage: Optional[str] = None,
+        seconds: Optional[float] = None,
+        count: Optional[int] = None,
+        endpoint: Optional[str] = None,
+        fileId: Optional[FileId] = None,
+        tokenCounts: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.kind: MetricsEventKind = kind
+        self.message: Optional[str] = message
+        self.action: Optional[str] = action
+        self.status: Optional[str] = status
+        self.stage: Optional[str] = stage
+        self.seconds: Optional[float] = seconds
+        self.count: Optional[int] = count
+        self.endpoint: Optional[str] = endpoint
+        self.fileId: Optional[FileId] = fileId  # The file a latency or apiCall event is about, if any
+        self.tokenCounts: Optional[Dict[str, int]] = tokenCounts
+
+    def toDict(self) -> Dict[str, Any]:
+        """The fields that are set, as something json.dumps() can write."""
+        return {name: value for name, value in vars(self).items() if value is not None}
+
+
+class RunMetrics:
+    """
+    Running totals of a run, built from MetricsEvents by any number of threads:
+    files per action and status, a latency histogram per stage, files per minute,
+    bytes downloaded, the Gemini requests left today, and the calls (with their time,
+    bytes and Gemini tokens) made to each API endpoint.
+    With traceFiles on, the calls and time spent are also added up per file, to find the costly ones.
+    Read with snapshot(), summary() (for the GUI), costSummary() (at the end of a run) or prometheusText().
+    """
+
+    def __init__(self, traceFiles: bool = False) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.startTime: float = time.monotonic()
+        self.fileCounts: Dict[Tuple[str, str], int] = {}  # (action, status) -> files
+        # stage -> files per bucket of latencyBuckets (the last one is for anything slower)
+        self.latencyCounts: Dict[str, List[int]] = {stage: [0] * (len(latencyBuckets) + 1) for stage in metricStages}
+        self.latencySeconds: Dict[str, float] = {stage: 0.0 for stage in metricStages}
+        self.bytesDownloaded: int = 0
+        self.geminiRequestsLeft: Optional[int] = None
+        self.lastStatus: str = ""
+        # endpoint -> {"calls", "failed", "seconds", "bytes"}
+        self.apiCalls: Dict[str, Dict[str, float]] = {}
+        self.geminiTokens: Dict[str, int] = {kind: 0 for kind in geminiTokenKinds}
+        self.traceFiles: bool = traceFiles
+        # fileId -> {"calls", "seconds", "bytes", "tokens"}, only kept with traceFiles on
+        self.fileCosts: Dict[FileId, Dict[str, float]] = {}
+
+    def handleEvent(self, event: MetricsEvent) -> None:
+        with self.lock:
+            if event.kind == "status":
+                self.lastStatus = event.message or ""
+            elif event.kind == "result":
+                countKey: Tuple[str, str] = (event.action or "", event.status or "")
+                self.fileCounts[countKey] = self.fileCounts.get(countKey, 0) + 1
+            elif event.kind == "latency" and event.stage in self.latencyCounts:
+                bucketIndex: int = next(
+                    (index for index, bound in enumerate(latencyBuckets) if event.seconds <= bound), len(latencyBuckets)
+                )
+                self.latencyCounts[event.stage][bucketIndex] += 1
+                self.latencySeconds[event.stage] += event.seconds
+                if self.traceFiles and event.fileId:
+                    self.addFileCost(event.fileId, "seconds", event.seconds)
+            elif event.kind == "bytes":
+                self.bytesDownloaded += event.count or 0
+            elif event.kind == "quota":
+                self.geminiRequestsLeft = event.count
+            elif event.kind == "apiCall":
+                endpointCounts: Dict[str, float] = self.apiCalls.setdefault(
+                    event.endpoint or "unknown", {"calls": 0, "failed": 0, "seconds": 0.0, "bytes": 0}
+                )
+                endpointCounts["calls"] += 1
+                endpointCounts["failed"] += event.status == "failed"
+                endpointCounts["seconds"] += event.seconds or 0.0
+                endpointCounts["bytes"] += event.count or 0
+                for tokenKind, tokenCount in (event.tokenCounts or {}).items():
+                    self.geminiTokens[tokenKind] = self.geminiTokens.get(tokenKind, 0) + tokenCount
+                if self.traceFiles and event.fileId:
+                    self.addFileCost(event.fileId, "calls", 1)
+                    self.addFileCost(event.fileId, "bytes", event.count or 0)
+                    self.addFileCost(event.fileId, "tokens", (event.tokenCounts or {}).get("total", 0))
+
+    def addFileCost(self, fileId: FileId, costName: str, amount: float) -> None:
+        """Adds to one of a file's costs, the lock must be held."""
+        fileCost: Dict[str, float] = self.fileCosts.setdefault(fileId, {"calls": 0, "seconds": 0.0, "bytes": 0, "tokens": 0})
+        fileCost[costName] += amount
+
+    def filesPerMinute(self) -> float:
+        with self.lock:
+            fileCount: int = sum(self.fileCounts.values())
+        return fileCount * 60 / max(time.monotonic() - self.startTime, 1e-9)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Everything counted so far, as something json.dumps() can write."""
+        filesPerMinute: float = self.filesPerMinute()
+        with self.lock:
+            return {
+                "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "elapsedSeconds": round(time.monotonic() - self.startTime, 3),
+                "files": {f"{action}.{status}": count for (action, status), count in sorted(self.fileCounts.items())},
+                "filesPerMinute": round(filesPerMinute, 2),
+                "bytesDownloaded": self.bytesDownloaded,
+                "geminiRequestsLeft": self.geminiRequestsLeft,
+                "stages": {
+                    stage: {
+                        "count": sum(counts),
+                        "seconds": round(self.latencySeconds[stage], 3),
+                        "buckets": dict(zip([str(bound) for bound in latencyBuckets] + ["+Inf"], counts)),
+                    }
+                    for stage, counts in self.latencyCounts.items() if sum(counts)
+                },
+                "apiCalls": {
+                    endpoint: {name: round(value, 3) for name, value in endpointCounts.items()}
+                    for endpoint, endpointCounts in sorted(self.apiCalls.items())
+                },
+                "geminiTokens": dict(self.geminiTokens),
+            }
+
+    def summary(self) -> str:
+        """One line for the GUI, e.g. '120 files done, 3 failed | 42.0 files/min | 12.3 MB downloaded'."""
+        filesPerMinute: float = self.filesPerMinute()
+        with self.lock:
+            doneCount: int = sum(count for (_, status), count in self.fileCounts.items() if status != "failed")
+            failedCount: int = sum(count for (_, status), count in self.fileCounts.items() if status == "failed")
+            parts: List[str] = [
+                f"{doneCount} files done, {failedCount} failed",
+                f"{filesPerMinute:.1f} files/min",
+                f"{self.bytesDownloaded / (1024 * 1024):.1f} MB downloaded",
+            ]
+            if self.geminiRequestsLeft is not None:
+                parts.append(f"{self.geminiRequestsLeft} Gemini requests left today")
+        return " | ".join(parts)
+
+    def costlyFiles(self, count: int = costlyFileCount) -> List[Tuple[FileId, Dict[str, float]]]:
+        """The count files that took the longest (only known with traceFiles on), slowest first."""
+        with self.lock:
+            fileCosts: List[Tuple[FileId, Dict[str, float]]] = [(fileId, dict(cost)) for fileId, cost in self.fileCosts.items()]
+        return sorted(fileCosts, key=lambda item: (item[1]["seconds"], item[1]["bytes"]), reverse=True)[:count]
+
+    def costSummary(self) -> List[str]:
+        """
+        What the run cost, one line per API endpoint, e.g.
+        'drive.files.list: 12 calls (0 failed), 3.4 s, 1.2 MB', then the Gemini tokens used
+        and (with traceFiles on) the costliest files.
+        """
+        with self.lock:
+            apiCalls: List[Tuple[str, Dict[str, float]]] = sorted(self.apiCalls.items())
+            geminiTokens: Dict[str, int] = dict(self.geminiTokens)
+
+        lines: List[str] = [f"API calls: {sum(int(counts['calls']) for _, counts in apiCalls)}"]
+        for endpoint, counts in apiCalls:
+            lines.append(
+                f"  {endpoint}: {int(counts['calls'])} calls ({int(counts['failed'])} failed), "
+                f"{counts['seconds']:.1f} s, {counts['bytes'] / (1024 * 1024):.1f} MB"
+            )
+        lines.append("Gemini tokens: " + ", ".join(f"{geminiTokens[kind]} {kind}" for kind in geminiTokenKinds))
+
+        costlyFiles: List[Tuple[FileId, Dict[str, float]]] = self.costlyFiles()
+        if costlyFiles:
+            lines.append(f"Costliest {len(costlyFiles)} files:")
+            for fileId, cost in costlyFiles:
+                lines.append(
+                    f"  {fileId}: {cost['seconds']:.1f} s, {int(cost['calls'])} calls, "
+                    f"{cost['bytes'] / (1024 * 1024):.1f} MB, {int(cost['tokens'])} tokens"
+                )
+        return lines
+
+    def prometheusText(self) -> str:
+        """Everything counted so far in the Prometheus text format (e.g. for node_exporter's textfile collector)."""
+        filesPerMinute: float = self.filesPerMinute()
+        lines: List[str] = []
+        with self.lock:
+            lines += [
+                "# HELP drive_tagger_files_total Files handled, by action and status.",
+                "# TYPE drive_tagger_files_total counter",
+            ]
+            for (action, status), count in sorted(self.fileCounts.items()):
+                lines.append(f'drive_tagger_files_total{{action="{action}",status="{status}"}} {count}')
+
+            lines += [
+                "# HELP drive_tagger_stage_seconds Time taken per file (per page for list, per batch for organize) by each stage.",
+                "# TYPE drive_tagger_stage_seconds histogram",
+            ]
+            for stage, counts in self.latencyCounts.items():
+                cumulativeCount: int = 0
+                for bound, count in zip([str(bound) for bound in latencyBuckets] + ["+Inf"], counts):
+                    cumulativeCount += count
+                    lines.append(f'drive_tagger_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulativeCount}')
+                lines.append(f'drive_tagger_stage_seconds_sum{{stage="{stage}"}} {self.latencySeconds[stage]:.6f}')
+                lines.append(f'drive_tagger_stage_seconds_count{{stage="{stage}"}} {cumulativeCount}')
+
+            lines += [
+                "# HELP drive_tagger_downloaded_bytes_total Bytes downloaded from Drive.",
+                "# TYPE drive_tagger_downloaded_bytes_total counter",
+                f"drive_tagger_downloaded_bytes_total {self.bytesDownloaded}",
+                "# HELP drive_tagger_files_per_minute Files handled per minute since the run started.",
+                "# TYPE drive_tagger_files_per_minute gauge",
+                f"drive_tagger_files_per_minute {filesPerMinute:.3f}",
+            ]
+            if self.geminiRequestsLeft is not None:
+                lines += [
+                    "# HELP drive_tagger_gemini_requests_left Gemini requests left for today.",
+                    "# TYPE drive_tagger_gemini_requests_left gauge",
+                    f"drive_tagger_gemini_requests_left {self.geminiRequestsLeft}",
+                ]
+
+            lines += [
+                "# HELP drive_tagger_api_calls_total Calls made to each API endpoint, by status.",
+                "# TYPE drive_tagger_api_calls_total counter",
+            ]
+            for endpoint, counts in sorted(self.apiCalls.items()):
+                lines.append(f'drive_tagger_api_calls_total{{endpoint="{endpoint}",status="ok"}} {int(counts["calls"] - counts["failed"])}')
+                lines.append(f'drive_tagger_api_calls_total{{endpoint="{endpoint}",status="failed"}} {int(counts["failed"])}')
+            lines += [
+                "# HELP drive_tagger_api_call_seconds_total Time spent on calls to each API endpoint.",
+                "# TYPE drive_tagger_api_call_seconds_total counter",
+            ]
+            for endpoint, counts in sorted(self.apiCalls.items()):
+                lines.append(f'drive_tagger_api_call_seconds_total{{endpoint="{endpoint}"}} {counts["seconds"]:.6f}')
+            lines += [
+                "# HELP drive_tagger_api_call_bytes_total Bytes received from each API endpoint.",
+                "# TYPE drive_tagger_api_call_bytes_total counter",
+            ]
+            for endpoint, counts in sorted(self.apiCalls.items()):
+                lines.append(f'drive_tagger_api_call_bytes_total{{endpoint="{endpoint}"}} {int(counts["bytes"])}')
+            lines += [
+                "# HELP drive_tagger_gemini_tokens_total Gemini tokens used, by kind.",
+                "# TYPE drive_tagger_gemini_tokens_total counter",
+            ]
+            for tokenKind, tokenCount in sorted(self.geminiTokens.items()):
+                lines.append(f'drive_tagger_gemini_tokens_total{{kind="{tokenKind}"}} {tokenCount}')
+        return "\n".join(lines) + "\n"
+
+
+def geminiTokenCounts(response: Any) -> Dict[str, int]:
+    """The prompt, candidates and total tokens a generate_content response says it used (missing ones are left out)."""
+    usageMetadata: Any = getattr(response, "usage_metadata", None)
+    tokenCounts: Dict[str, int] = {}
+    for tokenKind in geminiTokenKinds:
+        tokenCount: Optional[int] = getattr(usageMetadata, f"{tokenKind}_token_count", None)
+        if tokenCount is not None:
+            tokenCounts[tokenKind] = tokenCount
+    return tokenCounts
+
+
+def utcNow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def currentGeminiQuotaDay(now: Optional[datetime] = None) -> str:
+    """The date Gemini's daily quota is counted for at now (default: now), it resets at midnight Pacific time."""
+    now = now or utcNow()
+    try:
+        return now.astimezone(ZoneInfo("America/Los_Angeles")).date().isoformat()
+    except ZoneInfoNotFoundError:
+        # No time zone database (e.g. on Windows without tzdata), use a fixed UTC-8 offset instead
+        return now.astimezone(timezone(timedelta(hours=-8))).date().isoformat()
+
+
+class GeminiRateLimiter:
+    """
+    Keeps Gemini requests under a model's requests per minute (a token bucket that refills
+    continuously) and requests per day (a counter saved to usageFilePath, so it survives restarts).
+    clock returns the current time (time zone aware), it tells which day requests are counted for.
+    """
+
+    def __init__(self, model: str, requestsPerMinute: int, requestsPerDay: int, usageFilePath: str = geminiUsageFile,
+                 clock: Callable[[], datetime] = utcNow) -> None:
+        self.model: str = model
+        self.requestsPerMinute: int = requestsPerMinute
+        self.requestsPerDay: int = requestsPerDay
+        self.usageFilePath: str = usageFilePath
+        self.clock: Callable[[], datetime] = clock
+
+        self.lock: threading.Lock = threading.Lock()
+        self.minuteTokens: float = float(requestsPerMinute)
+        self.lastRefillTime: float = time.monotonic()
+
+        self.usageDay: str = currentGeminiQuotaDay(self.clock())
+        self.requestsToday: int = self.loadRequestsToday()
+
+    @classmethod
+    def forModel(cls, model: str, usageFilePath: str = geminiUsageFile) -> "GeminiRateLimiter":
+        requestsPerMinute, requestsPerDay = geminiModelLimits[model]
+        return cls(model, requestsPerMinute, requestsPerDay, usageFilePath)
+
+    def acquire(self) -> bool:
+        """
+        Waits until a request may be sent and counts it.
+        Returns False (without waiting) if today's requests are used up.
+        """
+        while True:
+            with self.lock:
+                self.startNewDayIfNeeded()
+                if self.requestsToday >= self.requestsPerDay:
+                    return False
+
+                self.refillMinuteTokens()
+                if self.minuteTokens >= 1:
+                    self.minuteTokens -= 1
+                    self.requestsToday += 1
+                    self.saveRequestsToday()
+                    return True
+
+                waitSeconds: float = (1 - self.minuteTokens) * 60 / self.requestsPerMinute
+
+            time.sleep(waitSeconds)
+
+    def remainingToday(self) -> int:
+        with self.lock:
+            self.startNewDayIfNeeded()
+            return max(0, self.requestsPerDay - self.requestsToday)
+
+    def minuteLimitReached(self) -> None:
+        """Gemini says the per-minute limit was hit, so empty the bucket to slow every worker down."""
+        with self.lock:
+            self.minuteTokens = 0.0
+            self.lastRefillTime = time.monotonic()
+
+    def dailyLimitReached(self) -> None:
+        """Gemini says today's requests are used up (e.g. the key was also used elsewhere)."""
+        with self.lock:
+            self.requestsToday = self.requestsPerDay
+            self.saveRequestsToday()
+
+    def refillMinuteTokens(self) -> None:
+        now: float = time.monotonic()
+        self.minuteTokens = min(
+            float(self.requestsPerMinute),
+            self.minuteTokens + (now - self.lastRefillTime) * self.requestsPerMinute / 60,
+        )
+        self.lastRefillTime = now
+
+    def startNewDayIfNeeded(self) -> None:
+        today: str = currentGeminiQuotaDay(self.clock())
+        if today != self.usageDay:
+            self.usageDay = today
+            self.requestsToday = 0
+
+    def loadUsageFile(self) -> Dict[str, Any]:
+        try:
+            with open(self.usageFilePath, "r") as usageFile:
+                return json.load(usageFile)
+        except (OSError, ValueError):
+            return {}
+
+    def loadRequestsToday(self) -> int:
+        modelUsage: Dict[str, Any] = self.loadUsageFile().get(self.model, {})
+        if modelUsage.get("day") == self.usageDay:
+            return int(modelUsage.get("requests", 0))
+        return 0
+
+    def saveRequestsToday(self) -> None:
+        usage: Dict[str, Any] = self.loadUsageFile()
+        usage[self.model] = {"day": self.usageDay, "requests": self.requestsToday}
+        try:
+            # Write to a temporary file first so a crash can't leave a half written file behind
+            with open(self.usageFilePath + ".tmp", "w") as usageFile:
+                json.dump(usage, usageFile)
+            os.replace(self.usageFilePath + ".tmp", self.usageFilePath)
+        except OSError:
+            pass  # Counting still works for this run, it just won't survive a restart
+
+
+class PipelineStage:
+    """
+    One step of a TaggingPipeline. handler is called with each item and returns the item
+    to hand to the next stage (or None to drop it, or a list to hand on several items).
+    onIdle is called by a worker when no item arrived for a second, and onWorkerExit when a worker stops.
+    Both may return items for the next stage the same way, e.g. ones that handler held back.
+    Stages with finishAfterStop keep processing queued items after the pipeline is stopped.
+    onDiscard is called with every item that is dropped because the pipeline was stopped.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Optional[Any]],
+        workerCount: int = 1,
+        onIdle: Optional[Callable[[], Optional[Any]]] = None,
+        onWorkerExit: Optional[Callable[[], Optional[Any]]] = None,
+        onDiscard: Optional[Callable[[Any], None]] = None,
+        finishAfterStop: bool = False,
+    ) -> None:
+        self.name: str = name
+        self.handler: Callable[[Any], Optional[Any]] = handler
+        self.workerCount: int = max(1, workerCount)
+        self.onIdle: Optional[Callable[[], Optional[Any]]] = onIdle
+        self.onWorkerExit: Optional[Callable[[], Optional[Any]]] = onWorkerExit
+        self.onDiscard: Optional[Callable[[Any], None]] = onDiscard
+        self.finishAfterStop: bool = finishAfterStop
+
+
+class TaggingPipeline:
+    """
+    Runs a list of PipelineStages, each on its own worker threads, connected by bounded queues.
+    Because the queues are bounded, a fast stage can only get a few items ahead of a slow one
+    (e.g. downloads can't fill the disk while Gemini is busy).
+    """
+
+    # Put in a stage's queue once per worker to tell it there is no more work
+    stageFinished: object = object()
+
+    def __init__(self, stages: List[PipelineStage], queueSize: int = 8) -> None:
+        self.stages: List[PipelineStage] = stages
+        # stageQueues[i] feeds stages[i]
+        self.stageQueues: List[queue.Queue[Any]] = [
+            queue.Queue(maxsize=max(1, queueSize)) for _ in stages
+        ]
+        self.remainingWorkers: List[int] = [stage.workerCount for stage in stages]
+        self.remainingWorkersLock: threading.Lock = threading.Lock()
+        self.stopEvent: threading.Event = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        for stageIndex, stage in enumerate(self.stages):
+            for workerNumber in range(stage.workerCount):
+                thread: threading.Thread = threading.Thread(
+                    target=self.runWorker,
+                    args=(stageIndex,),
+                    name=f"{stage.name}-{workerNumber}",
+                    daemon=True,
+                )
+                thread.start()
+                self.threads.append(thread)
+
+    def put(self, item: Any) -> bool:
+        """Hands an item to the first stage, waiting while its queue is full. Returns False once stopped."""
+        while not self.stopEvent.is_set():
+            try:
+                self.stageQueues[0].put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def stop(self) -> None:
+        """Stops feeding new work through the stages (stages with finishAfterStop still finish theirs)."""
+        self.stopEvent.set()
+
+    def isStopped(self) -> bool:
+        return self.stopEvent.is_set()
+
+    def finish(self) -> None:
+        """Waits until every item put so far has gone through all the stages."""
+        for _ in range(self.stages[0].workerCount):
+            self.stageQueues[0].put(self.stageFinished)
+        for thread in self.threads:
+            thread.join()
+
+    def runWorker(self, stageIndex: int) -> None:
+        stage: PipelineStage = self.stages[stageIndex]
+        inputQueue: queue.Queue[Any] = self.stageQueues[stageIndex]
+
+        while True:
+            try:
+                item: Any = inputQueue.get(timeout=1.0)
+            except queue.Empty:
+                if stage.onIdle:
+                    self.passOn(stageIndex, stage.onIdle())
+                continue
+
+            if item is self.stageFinished:
+                break
+            self.handleItem(stageIndex, item)
+
+        self.exitWorker(stageIndex)
+
+    def handleItem(self, stageIndex: int, item: Any) -> None:
+        stage: PipelineStage = self.stages[stageIndex]
+        if self.stopEvent.is_set() and not stage.finishAfterStop:
+            if stage.onDiscard:
+                stage.onDiscard(item)
+            return
+
+        try:
+            self.passOn(stageIndex, stage.handler(item))
+        except Exception:
+            pass  # Handlers report their own errors, this just keeps the worker alive
+
+    def exitWorker(self, stageIndex: int) -> None:
+        stage: PipelineStage = self.stages[stageIndex]
+        if stage.onWorkerExit:
+            try:
+                self.passOn(stageIndex, stage.onWorkerExit())
+            except Exception:
+                pass
+
+        # The last worker of a stage to exit tells the next stage that no more work is coming
+        with self.remainingWorkersLock:
+            self.remainingWorkers[stageIndex] -= 1
+            lastWorker: bool = self.remainingWorkers[stageIndex] == 0
+
+        if lastWorker and stageIndex + 1 < len(self.stages):
+            for _ in range(self.stages[stageIndex + 1].workerCount):
+                self.stageQueues[stageIndex + 1].put(self.stageFinished)
+
+    def passOn(self, stageIndex: int, result: Optional[Any]) -> None:
+        """Hands what stages[stageIndex] returned (None, an item or a list of items) to the next stage."""
+        if result is None or stageIndex + 1 == len(self.stages):
+            return
+        for nextItem in result if isinstance(result, list) else [result]:
+            self.stageQueues[stageIndex + 1].put(nextItem)
+
+
+# One regular expression per category, matching any of its keywords as whole words
+# (digits may follow, so "fy" matches "FY23"). The longest keywords come first, so a phrase
+# like "board of directors" is matched as a whole rather than as just "board".
+preClassifierPatterns: Dict[TagValue, re.Pattern[str]] = {
+    tag: re.compile(
+        r"(?<![a-z0-9])(?:"
+        + "|".join(
+            re.escape(keyword[:-1]) + "[a-z]*" if keyword.endswith("*") else re.escape(keyword)
+            for keyword in sorted(keywords, key=len, reverse=True)
+        )
+        + r")(?![a-z])"
+    )
+    for tag, keywords in preClassifierKeywords.items()
+}
+
+
+def extractFileText(mimeType: MimeType, fileBytes: Optional[bytes] = None, filePath: Optional[str] = None) -> str:
+    """
+    The (lowercase) text at the start of a file, for the formats that can be read without extra libraries:
+    plain text (including CSV and HTML) and Office documents. Returns "" for anything else.
+    """
+    try:
+        if fileBytes is None and filePath:
+            with open(filePath, "rb") as file:
+                fileBytes = file.read(preClassifierTextBytes) if mimeType.startswith("text/") else file.read()
+        if not fileBytes:
+            return ""
+
+        if mimeType.startswith("text/"):
+            return fileBytes[:preClassifierTextBytes].decode("utf-8", errors="ignore").lower()
+
+        if mimeType.startswith("application/vnd.openxmlformats-officedocument."):
+            textParts: List[str] = []
+            textLength: int = 0
+            with zipfile.ZipFile(io.BytesIO(fileBytes)) as officeFile:
+                for memberName in officeFile.namelist():
+                    # The document body, a spreadsheet's cell texts, or the slides
+                    if memberName == "word/document.xml" or memberName == "xl/sharedStrings.xml" or (
+                        memberName.startswith("ppt/slides/slide") and memberName.endswith(".xml")
+                    ):
+                        xmlText: str = officeFile.read(memberName)[:preClassifierTextBytes].decode("utf-8", errors="ignore")
+                        textParts.append(re.sub(r"<[^>]+>", " ", xmlText))
+                        textLength += len(textParts[-1])
+                        if textLength >= preClassifierTextBytes:
+                            break
+            return " ".join(textParts).lower()
+
+    except Exception:
+        pass  # Unreadable files are simply left to Gemini
+    return ""
+
+
+def getPhotoYear(fileBytes: Optional[bytes] = None, filePath: Optional[str] = None) -> Optional[int]:
+    """The year a photo was taken according to its EXIF data, or None if unknown (or Pillow isn't installed)."""
+    if Image is None or (fileBytes is None and not filePath):
+        return None
+    try:
+        with Image.open(io.BytesIO(fileBytes) if fileBytes is not None else filePath) as image:
+            exif: Any = image.getexif()
+            # DateTimeOriginal (in the Exif sub-directory), else the plain DateTime
+            dateTaken: Optional[str] = exif.get_ifd(0x8769).get(36867) or exif.get(306)
+        return int(str(dateTaken)[:4]) if dateTaken else None
+    except Exception:
+        return None
+
+
+def preClassifyFile(
+    fileName: str,
+    folderPath: str,
+    mimeType: MimeType,
+    fileBytes: Optional[bytes] = None,
+    filePath: Optional[str] = None,
+) -> Tuple[Optional[TagValue], float]:
+    """
+    Guesses a file's category from its name, the path of the folder it's in and, if its content
+    is given (as bytes or a path), its text or the date its photo was taken.
+    Returns the best category and a confidence between 0 and 1, or (None, 0.0) if nothing matched.
+    Kept at module level so it can run in a ProcessPoolExecutor.
+    """
+    if mimeType.startswith("image/"):
+        photoYear: Optional[int] = getPhotoYear(fileBytes, filePath)
+        if photoYear and photoYear < historicImageYear:
+            return "Historic Image", 0.95
+        return None, 0.0  # Nothing in an image's name says whether it is historic
+
+    fileText: str = extractFileText(mimeType, fileBytes, filePath) if fileBytes is not None or filePath else ""
+
+    # Phrases are more telling than single words, so a match counts once per word in it
+    def countWords(matches: Iterable[str]) -> int:
+        return sum(len(match.split()) for match in matches)
+
+    scores: Dict[TagValue, float] = {}
+    for tag, pattern in preClassifierPatterns.items():
+        score: float = (
+            preClassifierNameWeight * countWords(pattern.findall(fileName.lower()))
+            + preClassifierFolderWeight * countWords(pattern.findall(folderPath.lower()))
+            # Long texts mention lots of things, so only count each keyword once
+            + preClassifierTextWeight * countWords(set(pattern.findall(fileText)))
+        )
+        if score:
+            scores[tag] = score
+
+    if not scores:
+        return None, 0.0
+
+    bestTag: TagValue = max(scores, key=scores.get)
+    # A single weak match or a close second choice gives a low confidence
+    return bestTag, scores[bestTag] / (sum(scores.values()) + 1.0)
+
+
+def benchmarkPreClassifier(labelsPath: str, minConfidence: float = preClassifierMinConfidence,
+                           processCount: int = taggingWorkerCounts["preclassify"]) -> Dict[str, Any]:
+    """
+    Measures the keyword rules against a labeled sample, without Drive or Gemini.
+    labelsPath is a CSV file with the columns name, folder and tag, and optionally mimeType and text.
+    Returns how many files the rules would tag (coverage), how many of those are right (precision) and how fast it is.
+    """
+    with open(labelsPath, newline="", encoding="utf-8") as labelsFile:
+        samples: List[Dict[str, str]] = list(csv.DictReader(labelsFile))
+
+    startTime: float = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, processCount)) as pool:
+        guesses: List[Tuple[Optional[TagValue], float]] = list(
+            pool.map(
+                preClassifyFile,
+                [sample.get("name") or "" for sample in samples],
+                [sample.get("folder") or "" for sample in samples],
+                [sample.get("mimeType") or "text/plain" for sample in samples],
+                [(sample.get("text") or "").encode("utf-8") for sample in samples],
+            )
+        )
+    elapsedSeconds: float = time.perf_counter() - startTime
+
+    tagged: int = 0
+    correct: int = 0
+    mistakes: List[Dict[str, Any]] = []
+    for sample, (tagValue, confidence) in zip(samples, guesses):
+        if tagValue is None or confidence < minConfidence:
+            continue  # Would be left to Gemini
+        tagged += 1
+        if tagValue == sample.get("tag"):
+            correct += 1
+        else:
+            mistakes.append({"name": sample.get("name"), "expected": sample.get("tag"), "got": tagValue,
+                             "confidence": round(confidence, 2)})
+
+    return {
+        "files": len(samples),
+        "taggedByRules": tagged,
+        "coverage": round(tagged / len(samples), 3) if samples else 0.0,
+        "precision": round(correct / tagged, 3) if tagged else None,
+        "millisecondsPerFile": round(1000 * elapsedSeconds / len(samples), 3) if samples else 0.0,
+        "mistakes": mistakes,
+    }
+
+
+# Identifies a file's content: (md5Checksum, size, mimeType)
+ContentKey = Tuple[str, str, MimeType]
+
+
+def getContentKey(fileItem: FileMetadata) -> Optional[ContentKey]:
+    """The ContentKey of a file from files().list(), or None if Drive has no checksum for it (e.g. Google Docs)."""
+    checksum: Optional[str] = fileItem.get("md5Checksum")
+    if not checksum:
+        return None
+    return (checksum, str(fileItem.get("size", "")), fileItem.get("mimeType", ""))
+
+
+def getChangeMarker(fileItem: FileMetadata) -> Optional[str]:
+    """
+    What the tagChecksum property of a file holds: its md5Checksum, or its modifiedTime if Drive has no checksum
+    for it (e.g. Google Docs), so tagChangedFiles() can tell when the content of either changed.
+    """
+    return fileItem.get("md5Checksum") or fileItem.get("modifiedTime")
+
+
+class TagCache:
+    """
+    Remembers the tag Gemini gave each file content (see ContentKey), so copies of a file
+    that was already classified can be tagged without downloading it or asking Gemini again.
+    Stored in the local database so it survives restarts.
+    """
+
+    def __init__(self, databasePath: str = localDatabaseFile) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        # Shared by the pipeline's threads, self.lock makes sure only one uses it at a time
+        self.connection: sqlite3.Connection = sqlite3.connect(databasePath, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS tag_cache (
+                    md5_checksum TEXT NOT NULL,
+                    size TEXT NOT NULL,
+                    mime_type TEXT NOT NULL,
+                    tag TEXT NOT NULL,
+                    PRIMARY KEY (md5_checksum, size, mime_type)
+                )"""
+            )
+
+    def get(self, contentKey: Optional[ContentKey]) -> Optional[TagValue]:
+        if contentKey is None:
+            return None
+        with self.lock:
+            row: Optional[Tuple[str]] = self.connection.execute(
+                "SELECT tag FROM tag_cache WHERE md5_checksum = ? AND size = ? AND mime_type = ?",
+                contentKey,
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, contentKey: Optional[ContentKey], tagValue: TagValue) -> None:
+        if contentKey is None:
+            return
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO tag_cache (md5_checksum, size, mime_type, tag) VALUES (?, ?, ?, ?)",
+                (*contentKey, tagValue),
+            )
+
+
+class GeminiUploadCache:
+    """
+    Remembers the files uploaded to Gemini by ContentKey, so a file that couldn't be classified
+    (e.g. because the daily limit was reached) isn't downloaded and uploaded again on the next try.
+    Gemini deletes uploads after 48 hours, so older entries are ignored.
+    """
+
+    def __init__(self, databasePath: str = localDatabaseFile) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.connection: sqlite3.Connection = sqlite3.connect(databasePath, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS gemini_uploads (
+                    md5_checksum TEXT NOT NULL,
+                    size TEXT NOT NULL,
+                    mime_type TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    uri TEXT NOT NULL,
+                    uploaded_at REAL NOT NULL,
+                    PRIMARY KEY (md5_checksum, size, mime_type)
+                )"""
+            )
+
+    def get(self, contentKey: Optional[ContentKey]) -> Optional[Tuple[str, str]]:
+        """The (name, uri) of the upload of this content, if Gemini still has it."""
+        if contentKey is None:
+            return None
+        with self.lock:
+            row: Optional[Tuple[str, str]] = self.connection.execute(
+                """SELECT name, uri FROM gemini_uploads
+                   WHERE md5_checksum = ? AND size = ? AND mime_type = ? AND uploaded_at > ?""",
+                (*contentKey, time.time() - geminiUploadLifetime.total_seconds()),
+            ).fetchone()
+        return row
+
+    def put(self, contentKey: Optional[ContentKey], name: str, uri: str) -> None:
+        if contentKey is None:
+            return
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO gemini_uploads (md5_checksum, size, mime_type, name, uri, uploaded_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (*contentKey, name, uri, time.time()),
+            )
+            # Nothing can be done with expired entries anymore
+            self.connection.execute(
+                "DELETE FROM gemini_uploads WHERE uploaded_at <= ?",
+                (time.time() - geminiUploadLifetime.total_seconds(),),
+            )
+
+    def forget(self, name: str) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM gemini_uploads WHERE name = ?", (name,))
+
+
+class RunJournal:
+    """
+    Records what happened to each file in tagging and organizing runs ("tag", "copy" or "move"),
+    in the local database, so an interrupted run can resume without redoing the files it already
+    handled, and so the files that failed can be listed and retried on their own.
+    A file has at most one entry per action, holding its latest status ("done", "skipped" or "failed").
+    """
+
+    def __init__(self, databasePath: str = localDatabaseFile) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.connection: sqlite3.Connection = sqlite3.connect(databasePath, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS run_journal (
+                    action TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    name TEXT,
+                    destination_folder_id TEXT,
+                    reason TEXT,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (action, file_id)
+                )"""
+            )
+
+    def record(self, action: str, fileId: FileId, status: str, name: Optional[str] = None,
+               destinationFolderId: Optional[FolderId] = None, reason: Optional[str] = None) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                """INSERT OR REPLACE INTO run_journal
+                   (action, file_id, status, name, destination_folder_id, reason, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (action, fileId, status, name, destinationFolderId, reason,
+                 datetime.now(timezone.utc).isoformat(timespec="seconds")),
+            )
+
+    def handledFiles(self, action: str) -> Dict[FileId, Optional[FolderId]]:
+        """The files that were done (or skipped) for action, with the folder they were placed in."""
+        with self.lock:
+            rows: List[Tuple[FileId, Optional[FolderId]]] = self.connection.execute(
+                "SELECT file_id, destination_folder_id FROM run_journal WHERE action = ? AND status != 'failed'",
+                (action,),
+            ).fetchall()
+        return dict(rows)
+
+    def failures(self, action: Optional[str] = None) -> List[Dict[str, Any]]:
+        """The failure report: one entry per file whose last attempt at action (any action if None) failed."""
+        query: str = "SELECT action, file_id, name, reason, updated_at FROM run_journal WHERE status = 'failed'"
+        parameters: Tuple[str, ...] = ()
+        if action:
+            query += " AND action = ?"
+            parameters = (action,)
+        with self.lock:
+            rows: List[Tuple[Any, ...]] = self.connection.execute(
+                query + " ORDER BY action, updated_at", parameters
+            ).fetchall()
+        return [
+            {"action": rowAction, "fileId": fileId, "name": name, "reason": reason, "updatedAt": updatedAt}
+            for rowAction, fileId, name, reason, updatedAt in rows
+        ]
+
+    def forget(self, action: str, status: Optional[str] = None, fileId: Optional[FileId] = None) -> None:
+        """Removes the entries for action, optionally only those with this status or for this file."""
+        query: str = "DELETE FROM run_journal WHERE action = ?"
+        parameters: List[str] = [action]
+        if status:
+            query += " AND status = ?"
+            parameters.append(status)
+        if fileId:
+            query += " AND file_id = ?"
+            parameters.append(fileId)
+        with self.lock, self.connection:
+            self.connection.execute(query, parameters)
+
+
+class DriveCatalog:
+    """
+    A local copy of the metadata of every (not trashed) file in the Drive: id, name, mimeType, checksum,
+    size, created and modified time, parents, tag, and how organizeFiles() last placed it.
+    It is filled by one full listing, then kept up to date from the Drive change log (see DriveTagger.syncCatalog()),
+    so planning, duplicate name checks, reports and resuming are indexed local queries instead of Drive API calls.
+    Parents are kept in their own table, with the file's name, so "is this name taken in that folder" is one index lookup.
+    """
+
+    pageSize: int = 1000  # Files read from the database at a time by queryFiles()
+
+    def __init__(self, databasePath: str = localDatabaseFile) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.connection: sqlite3.Connection = sqlite3.connect(databasePath, check_same_thread=False)
+        # Tags and organize statuses are written one file at a time, so don't wait for the disk on every one.
+        # The catalog can always be listed again from Drive (see rebuildCatalog), so losing the last few is fine.
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        with self.lock, self.connection:
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS drive_files (
+                    file_id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    mime_type TEXT NOT NULL,
+                    md5_checksum TEXT,
+                    size TEXT,
+                    created_time TEXT,
+                    modified_time TEXT,
+                    tag TEXT,
+                    tag_checksum TEXT,
+                    organize_status TEXT,
+                    organized_folder_id TEXT
+                )"""
+            )
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS drive_file_parents (
+                    parent_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    PRIMARY KEY (parent_id, name, file_id)
+                )"""
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS drive_file_parents_file ON drive_file_parents (file_id)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS drive_files_tag ON drive_files (tag)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS drive_files_created_time ON drive_files (created_time)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS drive_files_checksum ON drive_files (md5_checksum, size)")
+            # Where in the Drive change log the catalog is up to date, see DriveTagger.syncCatalog()
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS drive_catalog_state (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+    def getPageToken(self) -> Optional[str]:
+        """The change log page token the catalog is up to date with, None until it was filled."""
+        with self.lock:
+            row: Optional[Tuple[str]] = self.connection.execute(
+                "SELECT value FROM drive_catalog_state WHERE name = 'changesPageToken'"
+            ).fetchone()
+        return row[0] if row else None
+
+    def setPageToken(self, pageToken: str) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO drive_catalog_state (name, value) VALUES ('changesPageToken', ?)", (pageToken,)
+            )
+
+    def clear(self) -> None:
+        """Forgets every file (and the page token), before filling the catalog from a new full listing."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM drive_files")
+            self.connection.execute("DELETE FROM drive_file_parents")
+            self.connection.execute("DELETE FROM drive_catalog_state")
+
+    def putFiles(self, fileItems: Iterable[FileMetadata]) -> None:
+        """Adds or updates files from a listing or the change log (trashed ones are removed), in one transaction."""
+        fileRows: List[Tuple[Any, ...]] = []
+        parentRows: List[Tuple[FolderId, str, FileId]] = []
+        trashedFileIds: List[Tuple[FileId]] = []
+        for item in fileItems:
+            if item.get("trashed"):
+                trashedFileIds.append((item["id"],))
+                continue
+            properties: FileProperties = item.get("properties") or {}
+            fileRows.append((
+                item["id"], item.get("name", ""), item.get("mimeType", ""), item.get("md5Checksum"), item.get("size"),
+                item.get("createdTime"), item.get("modifiedTime"), properties.get("tag"), properties.get("tagChecksum"),
+            ))
+            parentRows += [(parentId, item.get("name", ""), item["id"]) for parentId in item.get("parents", [])]
+
+        with self.lock, self.connection:
+            self.removeRows(trashedFileIds)
+            # Upsert, so the organize status of files that were already known is kept
+            self.connection.executemany(
+                """INSERT INTO drive_files
+                   (file_id, name, mime_type, md5_checksum, size, created_time, modified_time, tag, tag_checksum)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (file_id) DO UPDATE SET
+                   name = excluded.name, mime_type = excluded.mime_type, md5_checksum = excluded.md5_checksum,
+                   size = excluded.size, created_time = excluded.created_time, modified_time = excluded.modified_time,
+                   tag = excluded.tag, tag_checksum = excluded.tag_checksum""",
+                fileRows,
+            )
+            # A file's parents (or name) may have changed, so replace them all
+            self.connection.executemany("DELETE FROM drive_file_parents WHERE file_id = ?", [row[:1] for row in fileRows])
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO drive_file_parents (parent_id, name, file_id) VALUES (?, ?, ?)", parentRows
+            )
+
+    def removeFiles(self, fileIds: Iterable[FileId]) -> None:
+        with self.lock, self.connection:
+            self.removeRows([(fileId,) for fileId in fileIds])
+
+    def removeRows(self, fileIdRows: List[Tuple[FileId]]) -> None:
+        """Deletes files and their parents, the lock must be held."""
+        self.connection.executemany("DELETE FROM drive_files WHERE file_id = ?", fileIdRows)
+        self.connection.executemany("DELETE FROM drive_file_parents WHERE file_id = ?", fileIdRows)
+
+    def setTag(self, fileId: FileId, tagValue: TagValue, tagChecksum: Optional[str] = None) -> None:
+        """Records a tag written to Drive, without waiting for the change log to report it."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE drive_files SET tag = ?, tag_checksum = ? WHERE file_id = ?", (tagValue, tagChecksum, fileId)
+            )
+
+    def setOrganizeStatus(self, fileId: FileId, action: str, status: str, folderId: Optional[FolderId] = None) -> None:
+        """Records what organizeFiles() last did with a file, e.g. ("copy", "done", the tag folder's ID)."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE drive_files SET organize_status = ?, organized_folder_id = ? WHERE file_id = ?",
+                (f"{action}.{status}", folderId, fileId),
+            )
+
+    def getFile(self, fileId: FileId) -> Optional[FileMetadata]:
+        """The file's metadata, as Drive would list it, or None if the catalog doesn't know it (or it was trashed)."""
+        return next(self.queryFiles("f.file_id = ?", (fileId,)), None)
+
+    def queryFiles(
+        self, condition: str = "1", parameters: Tuple[Any, ...] = (), scopeFolderId: Optional[FolderId] = None
+    ) -> Iterator[FileMetadata]:
+        """
+        Yields the metadata of the files matching condition (SQL on drive_files, as f), like Drive would list them,
+        optionally only those below scopeFolderId (sub-folders included).
+        The files are read pageSize at a time, so other threads can update the catalog in between.
+        """
+        scopeFilter: str = ""
+        scopeParameters: Tuple[Any, ...] = ()
+        if scopeFolderId:
+            # Every folder below scopeFolderId, then every file in one of them
+            scopeFilter = f"""AND f.file_id IN (
+                WITH RECURSIVE scope (folder_id) AS (
+                    SELECT ?
+                    UNION
+                    SELECT p.file_id FROM drive_file_parents p
+                    JOIN scope ON p.parent_id = scope.folder_id
+                    JOIN drive_files folder ON folder.file_id = p.file_id AND folder.mime_type = '{folderMimeType}'
+                )
+                SELECT file_id FROM drive_file_parents WHERE parent_id IN scope
+            )"""
+            scopeParameters = (scopeFolderId,)
+
+        lastFileId: str = ""
+        while True:
+            with self.lock:
+                rows: List[Tuple[Any, ...]] = self.connection.execute(
+                    f"""SELECT f.file_id, f.name, f.mime_type, f.md5_checksum, f.size, f.created_time, f.modified_time,
+                               f.tag, f.tag_checksum,
+                               (SELECT GROUP_CONCAT(p.parent_id) FROM drive_file_parents p WHERE p.file_id = f.file_id)
+                        FROM drive_files f
+                        WHERE ({condition}) {scopeFilter} AND f.file_id > ?
+                        ORDER BY f.file_id LIMIT ?""",
+                    (*parameters, *scopeParameters, lastFileId, self.pageSize),
+                ).fetchall()
+
+            for row in rows:
+                yield self.toFileMetadata(row)
+            if len(rows) < self.pageSize:
+                return
+            lastFileId = rows[-1][0]
+
+    @staticmethod
+    def toFileMetadata(row: Tuple[Any, ...]) -> FileMetadata:
+        fileId, name, mimeType, md5Checksum, size, createdTime, modifiedTime, tagValue, tagChecksum, parentIds = row
+        item: FileMetadata = {
+            "id": fileId, "name": name, "mimeType": mimeType, "createdTime": createdTime, "modifiedTime": modifiedTime,
+            "parents": parentIds.split(",") if parentIds else [],
+        }
+        if md5Checksum is not None:
+            item["md5Checksum"] = md5Checksum
+        if size is not None:
+            item["size"] = size
+        if tagValue is not None:
+            item["properties"] = {"tag": tagValue, **({"tagChecksum": tagChecksum} if tagChecksum else {})}
+        return item
+
+    def untaggedFiles(self, scopeFolderId: Optional[FolderId] = None) -> Iterator[FileMetadata]:
+        return self.queryFiles(f"f.tag IS NULL AND f.mime_type != '{folderMimeType}'", (), scopeFolderId)
+
+    def taggedFiles(self, scopeFolderId: Optional[FolderId] = None) -> Iterator[FileMetadata]:
+        return self.queryFiles(f"f.tag IS NOT NULL AND f.mime_type != '{folderMimeType}'", (), scopeFolderId)
+
+    def filesToTag(self, scopeFolderId: Optional[FolderId] = None) -> Iterator[FileMetadata]:
+        """
+        Yields the files that need a tag: untagged ones, and ones whose content changed since they were tagged.
+        (Files tagged before checksums were saved are kept as they are. See getChangeMarker() for files without one.)
+        """
+        return self.queryFiles(
+            f"""f.mime_type != '{folderMimeType}'
+                AND (f.tag IS NULL OR (f.tag_checksum IS NOT NULL
+                                     AND f.tag_checksum != COALESCE(f.md5_checksum, f.modified_time, '')))""",
+            (),
+            scopeFolderId,
+        )
+
+    def folders(self) -> Iterator[FileMetadata]:
+        return self.queryFiles("f.mime_type = ?", (folderMimeType,))
+
+    def nameTaken(self, folderId: FolderId, name: str) -> bool:
+        """Whether folderId already holds a file called name."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT 1 FROM drive_file_parents WHERE parent_id = ? AND name = ? LIMIT 1", (folderId, name)
+            ).fetchone() is not None
+
+    def report(self) -> Dict[str, Any]:
+        """What the Drive holds, for the report command: files by tag, organize status and year, and duplicate content."""
+        with self.lock:
+            def countBy(expression: str) -> Dict[str, int]:
+                rows: List[Tuple[Optional[str], int]] = self.connection.execute(
+                    f"""SELECT {expression}, COUNT(*) FROM drive_files
+                        WHERE mime_type != ? GROUP BY 1 ORDER BY 1""",
+                    (folderMimeType,),
+                ).fetchall()
+                return {str(value): count for value, count in rows}
+
+            fileCount, folderCount = self.connection.execute(
+                "SELECT SUM(mime_type != ?), SUM(mime_type = ?) FROM drive_files", (folderMimeType, folderMimeType)
+            ).fetchone()
+            # Files with the same checksum and size have the same content
+            duplicateGroups, duplicateFiles = self.connection.execute(
+                """SELECT COUNT(*), COALESCE(SUM(copies), 0) FROM (
+                       SELECT COUNT(*) AS copies FROM drive_files WHERE md5_checksum IS NOT NULL
+                       GROUP BY md5_checksum, size HAVING COUNT(*) > 1
+                   )"""
+            ).fetchone()
+            return {
+                "files": fileCount or 0,
+                "folders": folderCount or 0,
+                "byTag": countBy("COALESCE(tag, 'untagged')"),
+                "byOrganizeStatus": countBy("COALESCE(organize_status, 'not organized')"),
+                "byYearCreated": countBy("COALESCE(SUBSTR(created_time, 1, 4), 'unknown')"),
+                "duplicateContent": {"groups": duplicateGroups, "files": duplicateFiles},
+            }
+
+
+class TaggingJob:
+    """A single file on its way through the tagging pipeline."""
+
+    def __init__(self, fileId: FileId, mimeType: MimeType, contentKey: Optional[ContentKey] = None,
+                 sizeBytes: Optional[int] = None) -> None:
+        self.fileId: FileId = fileId
+        self.mimeType: MimeType = mimeType
+        self.contentKey: Optional[ContentKey] = contentKey  # Used to add Gemini's answer to the TagCache
+        self.sizeBytes: Optional[int] = sizeBytes  # Size given by Drive, then the size of the downloaded file
+        self.strategy: FileStrategy = fileStrategies.get(mimeType, "skip")
+        self.tempFilePath: Optional[str] = None  # Set by the download stage for bigger files...
+        self.fileBytes: Optional[bytes] = None  # ...or this, for files small enough to send inline
+        self.reservedBytes: int = 0  # Held of downloadMemoryBudget while fileBytes are in memory
+        self.geminiFile: Optional[Any] = None  # Set by the upload stage
+        self.geminiFileName: Optional[str] = None  # Name of the file uploaded to Gemini, so it can be deleted
+        self.changeMarker: Optional[str] = None  # Written to the tagChecksum property, see getChangeMarker()
+        self.fileName: str = ""  # Used by the PreClassifier
+        self.folderPath: str = ""  # e.g. "Shared/Board Minutes", used by the PreClassifier
+        self.tagValue: Optional[ValidationResult] = None  # Once set, the remaining stages just pass the job on
+
+
+class OrganizeStep:
+    """A single tagged file in the plan made by planOrganization()."""
+
+    def __init__(self, fileItem: FileMetadata, folderPath: FolderPath) -> None:
+        self.fileItem: FileMetadata = fileItem  # Metadata from files().list(), with id, name, properties and parents
+        self.folderPath: FolderPath = folderPath
+        # ID of the Year/Month/Tag folder if it already exists, None if it still has to be created
+        self.destinationFolderId: Optional[FolderId] = None
+        self.status: OrganizeStepStatus = "place"
+
+
+class DriveTagger:
+    """
+    Everything that talks to Drive and Gemini: tagging files and organizing them into folders.
+    It has no GUI of its own. Progress messages go to onStatus (the Tk window shows them,
+    the command line prints them) and a record of what happened to each file goes to onResult.
+    """
+
+    def __init__(
+        self,
+        onStatus: Optional[Callable[[str], None]] = None,
+        onResult: Optional[Callable[[Dict[str, Any]], None]] = None,
+        onEvent: Optional[Callable[[MetricsEvent], None]] = None,
+    ) -> None:
+        self.onStatus: Optional[Callable[[str], None]] = onStatus
+        self.onResult: Optional[Callable[[Dict[str, Any]], None]] = onResult
+        self.onEvent: Optional[Callable[[MetricsEvent], None]] = onEvent
+        self.metrics: RunMetrics = RunMetrics()  # Started over by every tagging or organizing run, see startMetrics()
+
+        self.moveFiles: bool = False  # Used to determine if files should be MOVED or COPIED
+        self.dryRun: bool = False  # Report what would be changed without writing anything to Drive
+        self.scopeFolderId: Optional[FolderId] = None  # Only look at files below this folder (None means the whole Drive)
+
+        self.driveCredentials: Optional[Credentials] = None  # Used to build a Drive service for each thread
+        self.driveServicePool: Optional[DriveServicePool] = None  # Created once signed in to Drive
+        # Holds each thread's own Drive service and DriveRequestBatcher,
+        # since googleapiclient service objects aren't thread-safe
+        self.threadLocal: threading.local = threading.local()
+
+        # Used to run the stages of tagEachFile() concurrently
+        self.taggingWorkerCounts: Dict[str, int] = dict(taggingWorkerCounts)
+        self.taggingQueueSize: int = taggingQueueSize
+        self.taggingPipeline: Optional[TaggingPipeline] = None
+        self.geminiClient: Optional[genai.Client] = None  # Used to make calls to Gemini API
+        self.geminiApiKey: Optional[str] = None  # The key geminiClient was created with
+        # Keeps Gemini calls within the model's per-minute and per-day limits
+        self.geminiRateLimiter: GeminiRateLimiter = GeminiRateLimiter.forModel(geminiModel)
+        self.geminiBatchSize: int = geminiBatchSize  # See classifyFile()
+        self.geminiBatchFileBytes: int = geminiBatchFileBytes
+        self.geminiInlineFileBytes: int = geminiInlineFileBytes
+        # Files already uploaded to Gemini, so retries don't upload them again
+        self.geminiUploadCache: GeminiUploadCache = GeminiUploadCache()
+        # Files the keyword rules (see preClassifyFile()) are at least this sure about skip Gemini, above 1 turns them off
+        self.preClassifierMinConfidence: float = preClassifierMinConfidence
+        self.preClassifierPool: Optional[Executor] = None  # Created for each run of runTagging()
+        self.folderNames: Optional[Dict[FolderId, Tuple[str, List[FolderId]]]] = None  # See getFolderPath()
+        # Tags of file contents that were already classified, so duplicates skip Gemini
+        self.tagCache: TagCache = TagCache()
+        # What happened to each file in earlier runs, so interrupted runs can pick up where they stopped
+        self.runJournal: RunJournal = RunJournal()
+        self.retryFailed: bool = False  # Only work on the files the runJournal lists as failed
+        # Local copy of the Drive's file metadata, brought up to date by syncCatalog() at the start of each run
+        self.driveCatalog: DriveCatalog = DriveCatalog()
+        self.rebuildCatalog: bool = False  # Fill the driveCatalog from a new full listing instead of the change log
+        self.organizeWorkerCount: int = organizeWorkerCount  # Threads sending copies and moves, see executeOrganizePlan()
+        self.crawlWorkerCount: int = crawlWorkerCount  # Folder listings running at once, see crawlFiles()
+        self.traceFiles: bool = False  # Add up the API calls and time spent per file, see RunMetrics.costSummary()
+
+    def reportStatus(self, message: str) -> None:
+        self.emitEvent(MetricsEvent("status", message=message))
+        if self.onStatus:
+            self.onStatus(message)
+
+    def emitEvent(self, event: MetricsEvent) -> None:
+        """Counts event in self.metrics and passes it on to onEvent."""
+        self.metrics.handleEvent(event)
+        if self.onEvent:
+            self.onEvent(event)
+
+    def timeStage(self, stage: str, handler: Callable[[Any], Any]) -> Callable[[Any], Any]:
+        """Wraps a pipeline stage's handler so the time it takes for each file goes into the metrics."""
+
+        def timedHandler(item: Any) -> Any:
+            # Files that already have a tag only pass through the stages before the write stage
+            if stage != "write" and isinstance(item, TaggingJob) and item.tagValue:
+                return handler(item)
+            startTime: float = time.monotonic()
+            try:
+                return handler(item)
+            finally:
+                self.emitEvent(MetricsEvent(
+                    "latency", stage=stage, seconds=time.monotonic() - startTime,
+                    fileId=item.fileId if isinstance(item, TaggingJob) else None,
+                ))
+
+        return timedHandler
+
+    def startMetrics(self) -> None:
+        """Starts counting a new run's metrics from zero."""
+        self.metrics = RunMetrics(self.traceFiles)
+
+    def reportCosts(self) -> None:
+        """Reports the API calls, Gemini tokens and (with traceFiles on) costliest files of the run so far."""
+        for line in self.metrics.costSummary():
+            self.reportStatus(line)
+
+    def recordApiCall(
+        self,
+        endpoint: str,
+        seconds: float,
+        byteCount: int = 0,
+        error: Optional[Exception] = None,
+        fileId: Optional[FileId] = None,
+        tokenCounts: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """Counts one call to an API endpoint in the metrics."""
+        self.emitEvent(MetricsEvent(
+            "apiCall", endpoint=endpoint, seconds=seconds, count=byteCount,
+            status="failed" if error else "ok", fileId=fileId, tokenCounts=tokenCounts,
+        ))
+
+    def executeRequest(self, request: Any, fileId: Optional[FileId] = None) -> Any:
+        """Runs a single Drive API request (instead of request.execute()) and counts it in the metrics."""
+        startTime: float = time.monotonic()
+        try:
+            response: Any = request.execute()
+        except Exception as error:
+            self.recordApiCall(requestEndpoint(request), time.monotonic() - startTime, error=error, fileId=fileId)
+            raise
+        self.recordApiCall(requestEndpoint(request), time.monotonic() - startTime, responseSize(response), fileId=fileId)
+        return response
+
+    def reportResult(self, action: str, fileId: FileId, status: str, **details: Any) -> None:
+        """Passes on what happened to a single file, e.g. ("tag", fileId, "done", tag="Curation")."""
+        # Keep track of real outcomes (not dry runs) in the journal
+        if status in ("done", "skipped", "failed") and not self.dryRun:
+            self.runJournal.record(
+                action, fileId, status, details.get("name"),
+                details.get("destinationFolderId"), details.get("error"),
+            )
+            # The catalog remembers how each file was last organized (see DriveCatalog.report())
+            if action in ("copy", "move"):
+                self.driveCatalog.setOrganizeStatus(fileId, action, status, details.get("destinationFolderId"))
+        self.emitEvent(MetricsEvent("result", action=action, status=status))
+        if self.onResult:
+            self.onResult({"action": action, "fileId": fileId, "status": status, **details})
+
+    def authenticateDriveAPI(self) -> Optional[Any]:
+        if self.driveServicePool and self.driveCredentials and self.driveCredentials.refresh_token:
+            # Already signed in, so keep the services (and their open connections) of earlier runs
+            try:
+                self.driveServicePool.refreshCredentials()
+                return self.getDriveService()
+            except Exception as e:
+                self.reportStatus(f"Could not refresh the Drive credentials, signing in again: {e}")
+
+        if self.verifyJsonPresent():
+            # The following is copied from the Drive API documentation quickstart guide
+            creds: Optional[Credentials] = None
+            flow: Optional[InstalledAppFlow] = None
+
+            try:
+                if os.path.exists("token.json"):
+                    creds = googleCredentials.Credentials.from_authorized_user_file("token.json", SCOPES)
+                # If there are no (valid) credentials available, let the user log in.
+                if not creds or not creds.valid:
+                    if creds and creds.expired and creds.refresh_token:
+                        creds.refresh(googleAuthRequests.Request())
+                    else:
+                        flow = googleOAuthFlow.InstalledAppFlow.from_client_secrets_file(
+                            "credentials.json", SCOPES
+                        )
+                        creds = flow.run_local_server(port=0)
+                    # Save the credentials for the next run
+                    saveDriveToken(creds)
+
+                self.driveCredentials = creds
+                # Services built with old credentials are no longer wanted
+                self.driveServicePool = DriveServicePool(creds, onRefresh=saveDriveToken)
+                self.threadLocal = threading.local()
+                return self.getDriveService()
+            except Exception:
+                self.reportStatus(
+                    "An error occurred during Drive authentication"
+                )
+                return None
+
+    def getDriveService(self) -> Any:
+        """Returns the calling thread's own Drive service, leased from the driveServicePool the first time."""
+        service: Optional[Any] = getattr(self.threadLocal, "service", None)
+        if service is None:
+            if self.driveServicePool is None:
+                self.driveServicePool = DriveServicePool(self.driveCredentials, onRefresh=saveDriveToken)
+            service = self.driveServicePool.lease()
+            self.threadLocal.service = service
+        return service
+
+    def getDriveBatcher(self) -> DriveRequestBatcher:
+        """Returns the calling thread's DriveRequestBatcher (which uses that thread's Drive service)."""
+        batcher: Optional[DriveRequestBatcher] = getattr(self.threadLocal, "batcher", None)
+        if batcher is None:
+            batcher = DriveRequestBatcher(self.getDriveService(), onApiCall=self.recordApiCall)
+            self.threadLocal.batcher = batcher
+        return batcher
+
+    """
+  Checks if folder exists, returns True if it does.
+  Othwerise, creates the folder then returns True. 
+  Optionally, you can provide the parent folder ID to have nested folders.
+  This method WILL NOT copy a file if there is a file with the same name in the destination folder.
+  The idea is that if there already is a file with the same name, then this method has been run before on said file. 
+"""
+
+    def checkIfFolderExists(self, folderName: str, parentFolderId: Optional[FolderId] = None) -> Optional[FolderId]:
+
+        cacheKey: Tuple[Optional[FolderId], str] = (parentFolderId, folderName)
+        with folderIdCacheLock:
+            cachedFolderId: Optional[FolderId] = folderIdCache.get(cacheKey)
+            parentFullyCached: bool = parentFolderId in fullyCachedFolderIds
+        if cachedFolderId:
+            return cachedFolderId
+
+        # A folder that doesn't exist yet (see the dry run below) can't have sub-folders
+        if parentFolderId and parentFolderId.startswith(dryRunFolderPrefix):
+            return f"{parentFolderId}/{folderName}"
+
+        try:
+            items: List[FileMetadata] = []
+
+            # No need to ask Drive if the parent's sub-folders are already known
+            if not parentFullyCached:
+                # Note that the Drive API treats folders as a file with the MIME type of "application/vnd.google-apps.folder"
+                query: str = f"name='{escapeQueryValue(folderName)}' and mimeType='{folderMimeType}' and trashed=false"
+                if parentFolderId:
+                    query += f" and '{parentFolderId}' in parents"
+
+                # Check if folder already exists:
+                results: ApiResponse = self.executeRequest(
+                    self.getDriveService().files()
+                    .list(q=query, spaces="drive", fields="files(id, name)")
+                )
+                items = results.get("files", [])
+
+            if items:  # Folder exists
+                existingFolderId: FolderId = items[0].get("id")
+                with folderIdCacheLock:
+                    folderIdCache[cacheKey] = existingFolderId
+                return existingFolderId
+            elif self.dryRun:
+                # Don't create anything, just make up an ID that shows where the folder would go
+                return f"{dryRunFolderPrefix}{parentFolderId or ''}/{folderName}"
+            else:
+                # Folder doesn't exist, so construct it
+
+                # Define metadata for the new folder
+                fileMetadata: FileMetadata = {
+                    "name": folderName,
+                    "mimeType": folderMimeType,
+                }
+
+                # If parentFolderId is provided, set it as the parent in the metadata
+                if parentFolderId:
+                    fileMetadata["parents"] = [parentFolderId]
+
+                # Create the folder
+                file: ApiResponse = self.executeRequest(
+                    self.getDriveService().files()
+                    .create(body=fileMetadata, fields="id")
+                )
+                folderId: Optional[FolderId] = file.get("id")
+
+                if folderId:
+                    with folderIdCacheLock:
+                        folderIdCache[cacheKey] = folderId
+                        # A brand new folder has no sub-folders, so it is fully cached as well
+                        fullyCachedFolderIds.add(folderId)
+                    return folderId
+                else:
+                    self.reportStatus(
+                        "Problem with creating the folder (no ID returned)"
                     )
-                    .execute()
+                    return None
+
+        except googleApiErrors.HttpError:
+            self.reportStatus("Http error when checking or creating folder")
+        except Exception:
+            self.reportStatus(
+                "Error occurred when checking or creating folder"
+            )
+            return None
+
+    def warmFolderCache(self, baseFolderId: FolderId, folders: Iterable[FileMetadata]) -> None:
+        """
+        Loads every folder below baseFolderId into folderIdCache from folders (every folder, with id, name
+        and parents, e.g. from the driveCatalog), so checkIfFolderExists() doesn't need to query Drive for
+        folders that already exist.
+        """
+        # Drive can't query "everything below a folder", so go through every folder once
+        # and walk down from the base folder afterwards.
+        childFolders: Dict[FolderId, List[FileMetadata]] = {}
+
+        for folder in folders:
+            for parentId in folder.get("parents", []):
+                childFolders.setdefault(parentId, []).append(folder)
+
+        foundFolderCount: int = 0
+        with folderIdCacheLock:
+            pendingFolderIds: List[FolderId] = [baseFolderId]
+            while pendingFolderIds:
+                parentId: FolderId = pendingFolderIds.pop()
+                for folder in childFolders.get(parentId, []):
+                    cacheKey: Tuple[Optional[FolderId], str] = (parentId, folder["name"])
+                    # Like checkIfFolderExists(), the first folder with a given name wins
+                    if cacheKey not in folderIdCache:
+                        folderIdCache[cacheKey] = folder["id"]
+                        pendingFolderIds.append(folder["id"])
+                        foundFolderCount += 1
+                fullyCachedFolderIds.add(parentId)
+
+        self.reportStatus(
+            f"Found {foundFolderCount} existing folders in the organized folder."
+        )
+
+    def getCachedFolderId(self, baseFolderId: FolderId, folderPath: FolderPath) -> Optional[FolderId]:
+        """Returns the ID of the folder at folderPath below baseFolderId if folderIdCache knows it, without asking Drive."""
+        folderId: Optional[FolderId] = baseFolderId
+        with folderIdCacheLock:
+            for folderName in folderPath:
+                folderId = folderIdCache.get((folderId, folderName))
+                if not folderId:
+                    return None
+        return folderId
+
+    def buildFolderTree(self, baseFolderId: FolderId, folderPaths: Set[FolderPath]) -> Dict[FolderPath, FolderId]:
+        """
+        Makes sure every Year/Month/Tag folder in folderPaths exists below baseFolderId,
+        creating the missing ones, and returns the ID of the folder each path ends in.
+        If a tag folder can't be created, the month's 'Uncategorized' folder is used instead.
+        Paths whose folders couldn't be created are left out of the result.
+        """
+        destinationFolderIds: Dict[FolderPath, FolderId] = {}
+
+        for folderPath in sorted(folderPaths):
+            yearName, monthName, tagName = folderPath
+
+            yearFolderId: Optional[FolderId] = self.checkIfFolderExists(yearName, baseFolderId)
+            if not yearFolderId:
+                continue
+
+            monthFolderId: Optional[FolderId] = self.checkIfFolderExists(monthName, yearFolderId)
+            if not monthFolderId:
+                continue
+
+            tagFolderId: Optional[FolderId] = self.checkIfFolderExists(
+                tagName, monthFolderId
+            ) or self.checkIfFolderExists("Uncategorized", monthFolderId)
+            if tagFolderId:
+                destinationFolderIds[folderPath] = tagFolderId
+
+        self.reportStatus(
+            f"Organized folder tree ready ({len(destinationFolderIds)} tag folders)."
+        )
+        return destinationFolderIds
+
+    """
+  Queues a move of a file from its current location to a specified destination folder in Google Drive.
+  fileItem is the file's metadata from files().list() and must include its id, name and parents.
+  Duplicate names in the destination folder must already have been checked by the caller (see planOrganization()).
+
+  onDone (if given) is called with the ID of the moved file if successful, None otherwise.
+  """
+
+    def moveFileToFolder(self, fileItem: FileMetadata, destinationFolderId: FolderId, onDone: Optional[Callable[[Optional[FileId]], None]] = None) -> None:
+        fileId: FileId = fileItem.get("id", "")
+        originalFileName: str = fileItem.get("name", "")
+        # We need 'parents' to know which folder(s) to remove it from.
+        currentParents: List[FolderId] = fileItem.get("parents", [])
+
+        def handleResponse(movedFile: Optional[ApiResponse], error: Optional[Exception]) -> None:
+            movedFileId: Optional[FileId] = movedFile.get("id") if movedFile else None
+
+            if isinstance(error, googleApiErrors.HttpError):
+                self.reportStatus(f"HTTP Error: Could not move file: {error}")
+            elif error:
+                self.reportStatus(f"Error: Could not move file: {error}")
+            elif movedFileId:
+                self.reportStatus(
+                    f"Moved file {fileId} (name: '{originalFileName}') to folder {destinationFolderId}."
+                )
+            else:
+                self.reportStatus(
+                    "Problem with moving the file (no ID returned)"
+                )
+
+            self.reportResult(
+                "move", fileId, "done" if movedFileId else "failed",
+                name=originalFileName, destinationFolderId=destinationFolderId,
+                **({} if movedFileId else {"error": str(error or "No ID returned")}),
+            )
+            if onDone:
+                onDone(movedFileId)
+
+        # We need to specify the file ID in the update call, but no body is strictly
+        # necessary if only parents are changing via addParents/removeParents.
+        # However, for consistency and future expansion, an empty body is often used.
+        file_body: Dict[str, Any] = {}
+
+        # pylint: disable=maybe-no-member
+        self.getDriveBatcher().add(
+            self.getDriveService().files().update(
+                fileId=fileId,
+                body=file_body,  # Can be empty if only changing parents
+                addParents=destinationFolderId,
+                removeParents=",".join(
+                    currentParents
+                ),  # Comma-separated list of parent IDs to remove
+                fields="id, name, parents",  # Request parents back to confirm
+                supportsAllDrives=True,  # The file may be in a shared drive (see crawlFiles())
+            ),
+            handleResponse,
+            fileId,
+        )
+
+    """
+  Queues a copy of a file into a specified destination folder, keeping its name and 'tag' property.
+  fileItem is the file's metadata from files().list() and must include its id, name and properties.
+  Duplicate names in the destination folder must already have been checked by the caller (see planOrganization()).
+
+  onDone (if given) is called with the ID of the new copy if successful, None otherwise.
+  """
+
+    def copyFileToFolder(self, fileItem: FileMetadata, destinationFolderId: FolderId, onDone: Optional[Callable[[Optional[FileId]], None]] = None) -> None:
+        fileId: FileId = fileItem.get("id", "")
+        originalFileName: str = fileItem.get("name", "")
+        originalProperties: FileProperties = fileItem.get("properties", {})
+
+        # Extract the 'tag' value if it exists
+        tagValue: Optional[str] = originalProperties.get("tag")
+
+        # Prepare the metadata for the copied file.
+        # This includes the name, the parent folder, and the properties.
+        copiedFileMetadata: FileMetadata = {
+            "name": originalFileName,
+            "parents": [destinationFolderId],
+        }
+
+        # If the original file had a 'tag', include it in the new file's properties.
+        # We create a new dictionary for properties to ensure it's clean.
+        if tagValue:
+            copiedFileMetadata["properties"] = {"tag": tagValue}
+        else:
+            # If no tag, ensure properties are not explicitly set or are empty
+            # to avoid transferring other unwanted properties if they existed.
+            copiedFileMetadata["properties"] = {}
+
+        def handleResponse(copiedFile: Optional[ApiResponse], error: Optional[Exception]) -> None:
+            copiedFileId: Optional[FileId] = copiedFile.get("id") if copiedFile else None
+
+            if isinstance(error, googleApiErrors.HttpError):
+                self.reportStatus("An API error occurred during file copy")
+            elif error:
+                self.reportStatus(
+                    "An unexpected error occurred during file copy"
+                )
+            elif copiedFileId:
+                self.reportStatus(f"Copied {fileId} to {copiedFileId}")
+            else:
+                self.reportStatus(
+                    "Problem with copying the file (no ID returned)"
+                )
+
+            self.reportResult(
+                "copy", fileId, "done" if copiedFileId else "failed",
+                name=originalFileName, destinationFolderId=destinationFolderId, copiedFileId=copiedFileId,
+                **({} if copiedFileId else {"error": str(error or "No ID returned")}),
+            )
+            if onDone:
+                onDone(copiedFileId)
+
+        # pylint: disable=maybe-no-member
+        self.getDriveBatcher().add(
+            self.getDriveService().files().copy(
+                fileId=fileId,
+                body=copiedFileMetadata,
+                fields="id, name, parents, properties",  # Request properties back to confirm
+                supportsAllDrives=True,
+            ),
+            handleResponse,
+            fileId,
+        )
+
+    """
+  Queues the update of a file's 'tag' property. It is written the next time the batch is sent.
+  Returns True once the update is queued.
+  """
+
+    def updateTagMetadata(self, fileId: FileId, tagValue: TagValue, checksum: Optional[str] = None) -> bool:
+
+        new_properties: FileProperties = {"tag": tagValue}
+        # Remember which content the tag belongs to, so tagChangedFiles() can tell
+        # a real content change from a metadata change (like this very update)
+        if checksum:
+            new_properties["tagChecksum"] = checksum
+
+        file_metadata: FileMetadata = {"properties": new_properties}
+
+        def handleResponse(updatedFile: Optional[ApiResponse], error: Optional[Exception]) -> None:
+            if error:
+                self.reportStatus(
+                    "An error occurred while updating file metadata"
+                )
+                self.reportResult("tag", fileId, "failed", tag=tagValue, error=str(error))
+            else:
+                self.reportStatus(
+                    f"Successfully tagged file '{updatedFile.get('name')}'."
+                )
+                # Without waiting for the change log, so the next run already sees the file as tagged
+                self.driveCatalog.setTag(fileId, tagValue, checksum)
+                self.reportResult("tag", fileId, "done", tag=tagValue, name=updatedFile.get("name"))
+
+        self.getDriveBatcher().add(
+            self.getDriveService().files().update(
+                fileId=fileId,
+                body=file_metadata,
+                # Specify 'properties' in fields to get them back in the response
+                fields="id,name,properties",
+                supportsAllDrives=True,
+            ),
+            handleResponse,
+            fileId,
+        )
+        return True
+
+    """
+  The stages of tagging a file. Each one runs on its own worker threads (see tagEachFile()):
+  1) downloadFileForGemini() downloads a file from Google Drive
+     preClassifyDownloadedFile() then tags it right away if its text gives the category away
+  2) uploadFileToGemini() uploads it to Gemini
+  3) classifyFile() calls promptGemini() to analyze it (small files are analyzed in batches, see classifyPendingFiles())
+  4) writeTag() updates metadata with the tag (or 'Uncategorized' if there is an issue)
+  Once a job has a tagValue (e.g. from the TagCache), the stages just pass it on to writeTag().
+  """
+
+    def downloadFileForGemini(self, job: TaggingJob) -> Optional[TaggingJob]:
+        # Check the cache again, a copy of this file may have been classified while this job was queued
+        if job.tagValue or self.tagFromCache(job):
+            return job
+
+        # Incompatible files are normally already tagged 'Uncategorized' while listing (see runTagging())
+        if job.strategy == "skip":
+            job.tagValue = "Uncategorized"
+            return job
+
+        # Google Docs, Sheets and Slides are exported, from here on the job is about the exported file
+        exportMimeType: Optional[MimeType] = (
+            googleExportFormats[job.mimeType] if job.strategy == "export" else None
+        )
+        if exportMimeType:
+            job.mimeType = exportMimeType
+
+        try:
+            fileType: str = fileExtensions.get(job.mimeType, "")
+
+            # Gemini may still have this file from an earlier try, then there's no need to download it
+            if self.geminiFileFromCache(job):
+                return job
+
+            request: Any = (
+                self.getDriveService().files().export_media(fileId=job.fileId, mimeType=exportMimeType)
+                if exportMimeType
+                else self.getDriveService().files().get_media(fileId=job.fileId, supportsAllDrives=True)
+            )
+
+            # Small files are kept in memory and sent inline with the Gemini request (see uploadFileToGemini()).
+            # (Drive doesn't know the size of an export in advance, so those are checked once on disk.)
+            sendInline: bool = (
+                job.strategy == "inline" and job.sizeBytes is not None and job.sizeBytes <= self.geminiInlineFileBytes
+            )
+
+            # Each download holds at most one chunk in memory, so reserve that much
+            # of the download memory budget (waits while other downloads are using it).
+            # Inline files stay in memory whole until they are classified, so they hold their size
+            # instead, until releaseFileContent() drops them.
+            chunkSize: int = min(downloadChunkSize, downloadMemoryBudget.totalBytes)
+            if sendInline:
+                self.reserveFileContent(job)
+            else:
+                downloadMemoryBudget.reserve(chunkSize)
+            endpoint: str = "drive.files.export_media" if exportMimeType else "drive.files.get_media"
+            try:
+                if sendInline:
+                    with io.BytesIO() as fileBuffer:
+                        self.streamDownload(request, fileBuffer, chunkSize, endpoint=endpoint, fileId=job.fileId)
+                        job.fileBytes = fileBuffer.getvalue()
+                    job.sizeBytes = len(job.fileBytes)
+                else:
+                    # Stream the file straight into a temporary file (which Gemini needs anyway),
+                    # one chunk at a time, instead of holding all of it in memory
+                    with tempfile.NamedTemporaryFile(
+                        delete=False, suffix=fileType
+                    ) as temp_file:
+                        job.tempFilePath = temp_file.name
+                        self.streamDownload(
+                            request, temp_file, chunkSize, googleExportMaxBytes if exportMimeType else None,
+                            endpoint=endpoint, fileId=job.fileId,
+                        )
+                    job.sizeBytes = os.path.getsize(job.tempFilePath)
+            finally:
+                if not sendInline:
+                    downloadMemoryBudget.release(chunkSize)
+            self.emitEvent(MetricsEvent("bytes", count=job.sizeBytes))
+
+            # Small exports can go inline after all
+            if exportMimeType and job.sizeBytes <= self.geminiInlineFileBytes:
+                self.reserveFileContent(job)
+                with open(job.tempFilePath, "rb") as exportedFile:
+                    job.fileBytes = exportedFile.read()
+                self.removeTempFile(job)
+
+            return job
+
+        except FileTooLargeError as error:
+            self.reportStatus(f"{error}, setting it as 'Uncategorized'")
+            self.removeTempFile(job)
+            self.releaseFileContent(job)
+            job.tagValue = "Uncategorized"
+            return job
+        except googleApiErrors.HttpError as error:
+            self.removeTempFile(job)
+            self.releaseFileContent(job)
+            # Drive's own limit on exports, nothing will change on the next run either
+            if "exportSizeLimitExceeded" in str(error) or b"exportSizeLimitExceeded" in (error.content or b""):
+                self.reportStatus(f"File {job.fileId} is too large to export, setting it as 'Uncategorized'")
+                job.tagValue = "Uncategorized"
+                return job
+            self.reportStatus(f"An error occurred: {error}")
+            self.reportResult("tag", job.fileId, "failed", error=f"Download failed: {error}")
+            return None
+        except Exception as error:
+            self.reportStatus(f"An error occurred: {error}")
+            self.reportResult("tag", job.fileId, "failed", error=f"Download failed: {error}")
+            self.removeTempFile(job)
+            self.releaseFileContent(job)
+            return None  # Left untagged, so it will be picked up again on the next run
+
+    def streamDownload(
+        self,
+        request: Any,
+        target: Any,
+        chunkSize: int,
+        maxBytes: Optional[int] = None,
+        endpoint: str = "drive.files.get_media",
+        fileId: Optional[FileId] = None,
+    ) -> None:
+        """
+        Downloads a get_media() or export_media() request into target (a file or buffer), one chunk at a time.
+        Raises FileTooLargeError once more than maxBytes (if given) were downloaded.
+        The whole download is counted as one call to endpoint in the metrics.
+        """
+        downloader: MediaIoBaseDownload = googleApiHttp.MediaIoBaseDownload(
+            target, request, chunksize=chunkSize
+        )
+        startTime: float = time.monotonic()
+        startPosition: int = target.tell()
+        downloadError: Optional[Exception] = None
+        done: bool = False
+        try:
+            while done is False:
+                status, done = downloader.next_chunk()
+                if maxBytes is not None and target.tell() > maxBytes:
+                    raise FileTooLargeError(f"Download is larger than {maxBytes} bytes")
+                self.reportStatus(
+                    f"Downloaded: {int(status.progress() * 100)}%."
+                )
+        except Exception as error:
+            downloadError = error
+            raise
+        finally:
+            self.recordApiCall(
+                endpoint, time.monotonic() - startTime, target.tell() - startPosition, downloadError, fileId
+            )
+
+    def uploadFileToGemini(self, job: TaggingJob) -> Optional[TaggingJob]:
+        if job.tagValue or job.geminiFile:
+            return job
+
+        # Small files don't need an upload, they go along with the request itself
+        if job.fileBytes is not None:
+            job.geminiFile = geminiTypes.Part.from_bytes(data=job.fileBytes, mime_type=job.mimeType)
+            job.fileBytes = None
+            return job
+
+        try:
+            self.reportStatus(
+                f"Attempting to upload file to Gemini: {job.tempFilePath}"
+            )
+            # Give the MIME type too, Gemini's own guess from the file name can be wrong
+            uploadStartTime: float = time.monotonic()
+            try:
+                job.geminiFile = self.geminiClient.files.upload(
+                    file=job.tempFilePath, config={"mime_type": job.mimeType}
+                )
+            except Exception as error:
+                self.recordApiCall("gemini.files.upload", time.monotonic() - uploadStartTime, error=error, fileId=job.fileId)
+                raise
+            self.recordApiCall("gemini.files.upload", time.monotonic() - uploadStartTime, job.sizeBytes or 0, fileId=job.fileId)
+            job.geminiFileName = job.geminiFile.name
+            # Kept until the file is tagged, in case it has to be classified again later
+            self.geminiUploadCache.put(job.contentKey, job.geminiFile.name, job.geminiFile.uri)
+            self.reportStatus(
+                f"Successfully uploaded file to Gemini: {job.geminiFile.name}"
+            )
+        except Exception:
+            job.tagValue = "Uncategorized"  # If there is an error, it is likely because of an invalid file type, so return 'Uncategorized'
+        finally:
+            self.removeTempFile(job)  # Gemini has its own copy now
+
+        return job
+
+    def classifyFile(self, job: TaggingJob) -> Union[TaggingJob, List[TaggingJob], None]:
+        if job.tagValue or self.tagFromCache(job):
+            self.releaseFileContent(job)
+            return job
+
+        # Small files wait until there are enough of them to fill a batch (see classifyPendingFiles())
+        if (
+            self.geminiBatchSize > 1
+            and job.sizeBytes is not None
+            and job.sizeBytes <= self.geminiBatchFileBytes
+        ):
+            pendingJobs: List[TaggingJob] = self.getPendingClassifications()
+            pendingJobs.append(job)
+            if len(pendingJobs) < self.geminiBatchSize:
+                return None  # Handed on later, with the rest of the batch
+            return self.classifyPendingFiles()
+
+        return self.classifySingleFile(job)
+
+    def getPendingClassifications(self) -> List[TaggingJob]:
+        """The small files this classify worker is holding back for its next batch."""
+        if not hasattr(self.threadLocal, "pendingClassifications"):
+            self.threadLocal.pendingClassifications = []
+        return self.threadLocal.pendingClassifications
+
+    def classifyPendingFiles(self) -> List[TaggingJob]:
+        """
+        Classifies this worker's pending small files with a single Gemini request.
+        Files Gemini gave no usable answer for are classified again on their own.
+        Called when a batch is full and when the worker stops. Returns the jobs to hand on.
+        """
+        jobs: List[TaggingJob] = self.getPendingClassifications()
+        self.threadLocal.pendingClassifications = []
+        try:
+            return self.classifyBatch(jobs)
+        finally:
+            # Whatever became of them, the inline files of the batch aren't needed anymore
+            for job in jobs:
+                self.releaseFileContent(job)
+
+    def classifyBatch(self, jobs: List[TaggingJob]) -> List[TaggingJob]:
+        """Classifies jobs with a single Gemini request, see classifyPendingFiles()."""
+        if not jobs or self.taggingPipeline.isStopped():
+            return []  # Left untagged, so they will be picked up again on the next run
+
+        # Copies of these files may have been classified while they were waiting
+        classifiedJobs: List[TaggingJob] = [job for job in jobs if self.tagFromCache(job)]
+        jobs = [job for job in jobs if job.tagValue is None]
+
+        # Identical files (same ContentKey) only need to be sent to Gemini once
+        fileNumbers: Dict[Any, int] = {}
+        batchFiles: List[Any] = []
+        for job in jobs:
+            if (job.contentKey or job.fileId) not in fileNumbers:
+                batchFiles.append(job.geminiFile)
+                fileNumbers[job.contentKey or job.fileId] = len(batchFiles)
+
+        # A batch of one is simply classified on its own below
+        batchTags: Union[Dict[int, ValidationResult], Literal["DAILY_LIMIT_EXCEEDED"], None] = (
+            self.promptGeminiBatch(batchFiles) if len(batchFiles) > 1 else {}
+        )
+
+        if batchTags == "DAILY_LIMIT_EXCEEDED":
+            self.taggingPipeline.stop()
+            return classifiedJobs
+        batchTags = dict(batchTags or {})
+
+        for job in jobs:
+            fileNumber: int = fileNumbers[job.contentKey or job.fileId]
+            tagValue: Optional[ValidationResult] = batchTags.get(fileNumber)
+
+            if tagValue is None:
+                # No usable answer for this file in the batch, so ask about it on its own
+                if self.taggingPipeline.isStopped() or not self.classifySingleFile(job):
+                    continue
+                batchTags[fileNumber] = job.tagValue  # Copies of this file further on reuse the answer
+            else:
+                if tagValue in validTags:
+                    self.tagCache.put(job.contentKey, tagValue)
+                job.tagValue = tagValue
+
+            classifiedJobs.append(job)
+
+        return classifiedJobs
+
+    def classifySingleFile(self, job: TaggingJob) -> Optional[TaggingJob]:
+        tagValue: Optional[ValidationResult] = self.promptGemini(job.geminiFile, documentAnalyzerPrompt, job.fileId)
+        self.releaseFileContent(job)
+
+        if tagValue == "DAILY_LIMIT_EXCEEDED":
+            # Nothing else can be classified today, so stop the whole pipeline.
+            # Tags that were already assigned still get written.
+            self.taggingPipeline.stop()
+            return None
+
+        if tagValue is None:
+            # Gemini may have lost the upload, so don't reuse it next time
+            if job.geminiFileName:
+                self.geminiUploadCache.forget(job.geminiFileName)
+            self.reportResult("tag", job.fileId, "failed", error="Gemini did not answer")
+            return None  # Left untagged, so it will be picked up again on the next run
+
+        # Remember real answers from Gemini (not fallbacks after an error) for copies of this file
+        if tagValue in validTags:
+            self.tagCache.put(job.contentKey, tagValue)
+
+        job.tagValue = tagValue
+        return job
+
+    def preClassifyDownloadedFile(self, job: TaggingJob) -> TaggingJob:
+        if job.tagValue or (job.fileBytes is None and not job.tempFilePath):
+            return job
+
+        # Only text, Office documents and photos have anything the rules can read
+        if not (
+            job.mimeType.startswith(("text/", "image/", "application/vnd.openxmlformats-officedocument."))
+        ):
+            return job
+
+        if self.preClassify(job, job.folderPath, withContent=True):
+            # Gemini won't need the file after all
+            self.releaseFileContent(job)
+            self.removeTempFile(job)
+        return job
+
+    def preClassify(self, job: TaggingJob, folderPath: str, withContent: bool = False) -> bool:
+        """
+        Tags the job with the keyword rules (see preClassifyFile()) if they are sure enough,
+        looking at its name and folderPath, and also at its downloaded content if withContent.
+        Returns True if the job was tagged.
+        """
+        job.folderPath = folderPath
+        arguments: Tuple[Any, ...] = (
+            job.fileName, folderPath, job.mimeType,
+            *((job.fileBytes, job.tempFilePath) if withContent else ()),
+        )
+
+        tagValue: Optional[TagValue] = None
+        confidence: float = 0.0
+        try:
+            if withContent and self.preClassifierPool:
+                tagValue, confidence = self.preClassifierPool.submit(preClassifyFile, *arguments).result()
+            else:
+                tagValue, confidence = preClassifyFile(*arguments)
+        except Exception:
+            # The process pool isn't usable (e.g. it couldn't start), so do it in this thread
+            tagValue, confidence = preClassifyFile(*arguments)
+
+        if tagValue is None or confidence < self.preClassifierMinConfidence:
+            return False
+
+        self.reportStatus(
+            f"Tagging file {job.fileId} as '{tagValue}' from keyword rules (confidence {confidence:.2f})"
+        )
+        job.tagValue = tagValue
+        return True
+
+    def getFolderPath(self, parentIds: List[FolderId]) -> str:
+        """The names of the folders a file is in, e.g. "Shared/Board Minutes" (following the first parent)."""
+        if self.folderNames is None:
+            # Learn every folder's name once per run, rather than looking up each file's parents
+            try:
+                self.folderNames = {
+                    folder["id"]: (folder.get("name", ""), folder.get("parents", []))
+                    for folder in self.driveCatalog.folders()
+                }
+            except Exception as e:
+                self.reportStatus(f"Could not read folder names, the keyword rules only use file names: {e}")
+                self.folderNames = {}
+
+        folderNames: List[str] = []
+        folderId: Optional[FolderId] = parentIds[0] if parentIds else None
+        while folderId in self.folderNames and len(folderNames) < 50:  # A limit, in case of a loop
+            folderName, folderParentIds = self.folderNames[folderId]
+            folderNames.append(folderName)
+            folderId = folderParentIds[0] if folderParentIds else None
+
+        return "/".join(reversed(folderNames))
+
+    def geminiFileFromCache(self, job: TaggingJob) -> bool:
+        """Points the job at the copy of its content Gemini already has (see GeminiUploadCache), if any."""
+        cachedUpload: Optional[Tuple[str, str]] = self.geminiUploadCache.get(job.contentKey)
+        if cachedUpload is None:
+            return False
+
+        job.geminiFileName, fileUri = cachedUpload
+        job.geminiFile = geminiTypes.Part.from_uri(file_uri=fileUri, mime_type=job.mimeType)
+        self.reportStatus(f"Reusing file {job.geminiFileName} already uploaded to Gemini")
+        return True
+
+    def deleteGeminiUpload(self, job: TaggingJob) -> None:
+        """Deletes the job's upload from Gemini once the file has its tag, instead of leaving it for 48 hours."""
+        if not job.geminiFileName:
+            return
+
+        self.geminiUploadCache.forget(job.geminiFileName)
+        deleteStartTime: float = time.monotonic()
+        try:
+            self.geminiClient.files.delete(name=job.geminiFileName)
+        except Exception as e:
+            self.recordApiCall("gemini.files.delete", time.monotonic() - deleteStartTime, error=e, fileId=job.fileId)
+            self.reportStatus(f"Could not delete {job.geminiFileName} from Gemini: {e}")
+        else:
+            self.recordApiCall("gemini.files.delete", time.monotonic() - deleteStartTime, fileId=job.fileId)
+        job.geminiFileName = None
+
+    def tagFromCache(self, job: TaggingJob) -> bool:
+        """Sets the job's tag from the TagCache if a file with the same content was classified before."""
+        job.tagValue = self.tagCache.get(job.contentKey)
+        return job.tagValue is not None
+
+    def writeTag(self, job: TaggingJob) -> None:
+        # The file has its tag, so Gemini's copy (and the one in memory, if any) isn't needed anymore
+        self.deleteGeminiUpload(job)
+        self.releaseFileContent(job)
+
+        if self.dryRun:
+            self.reportStatus(f"Dry run: would tag file {job.fileId} as '{job.tagValue}'")
+            self.reportResult("tag", job.fileId, "dry-run", tag=job.tagValue)
+            return
+
+        self.updateTagMetadata(
+            job.fileId, job.tagValue, job.changeMarker
+        )
+
+    def reserveFileContent(self, job: TaggingJob) -> None:
+        """Reserves the job's size of downloadMemoryBudget before its content is kept in memory (waits until it's free)."""
+        job.reservedBytes = job.sizeBytes or 0
+        downloadMemoryBudget.reserve(job.reservedBytes)
+
+    def releaseFileContent(self, job: TaggingJob) -> None:
+        """Drops the job's content kept in memory (see reserveFileContent()) and gives its bytes back to the budget."""
+        job.fileBytes = None
+        if job.reservedBytes:
+            job.geminiFile = None  # The inline copy of the content made by uploadFileToGemini()
+            downloadMemoryBudget.release(job.reservedBytes)
+            job.reservedBytes = 0
+
+    def discardJob(self, job: TaggingJob) -> None:
+        """Cleans up after a job dropped because the pipeline was stopped."""
+        self.removeTempFile(job)
+        self.releaseFileContent(job)
+
+    def removeTempFile(self, job: TaggingJob) -> None:
+        if job.tempFilePath and os.path.exists(job.tempFilePath):
+            try:
+                os.remove(job.tempFilePath)  # Clean up the temporary file
+                self.reportStatus(
+                    f"Temporary file {job.tempFilePath} deleted successfully."
                 )
+            except Exception as e:
+                self.reportStatus(f"Error deleting temporary file: {e}")
+        job.tempFilePath = None
 
-                fileItems: List[FileMetadata] = retrievedFilesJson.get("files", [])
-                if not fileItems:
-                    # self.debugLabel.config(text="No files retrieved from Drive API.")
-                    self.updateDebugMessageQueue("No files retrieved from Drive API.")
-                    return
+    def promptGemini(self, geminiFile: Any, promptMessage: str, fileId: Optional[FileId] = None) -> Optional[ValidationResult]:
+        """
+        Rate limits are set in geminiModelLimits, e.g. gemini-2.0-flash-lite:
+        - 30 requests per minute
+        - 200 requests per day
+        Returns None if the file couldn't be classified right now and should be tried again on a later run.
+        """
+
+        try:
+            response: Any = self.requestGemini([promptMessage, geminiFile], fileId=fileId)
+            if response is None or response == "DAILY_LIMIT_EXCEEDED":
+                return response
+
+            cleanedResponse: str = response.text.strip()
+
+            if cleanedResponse in validTags:
+                self.reportStatus(
+                    f"Gemini returned valid tag: {cleanedResponse}"
+                )
+                return cleanedResponse
+            else:
+                self.reportStatus(
+                    "Invalid Gemini response. Setting tag as 'Uncategorized'"
+                )
+                return "Uncategorized"
+
+        except Exception:
+            return "Uncategorized"  # If there is an error, it is likely because of an invalid file type, so return 'Uncategorized'
+
+    def promptGeminiBatch(self, geminiFiles: List[Any]) -> Union[Dict[int, ValidationResult], Literal["DAILY_LIMIT_EXCEEDED"], None]:
+        """
+        Classifies several files with one request, asking Gemini for a JSON object of file number -> category.
+        Returns the valid categories by file number (starting at 1), files without one are left out.
+        Returns None if there was no usable answer at all.
+        """
+        contents: List[Any] = [batchedDocumentAnalyzerPrompt.format(fileCount=len(geminiFiles))]
+        for fileNumber, geminiFile in enumerate(geminiFiles, start=1):
+            contents += [f"File {fileNumber}:", geminiFile]
+
+        try:
+            response: Any = self.requestGemini(contents, {"response_mime_type": "application/json"})
+            if response is None or response == "DAILY_LIMIT_EXCEEDED":
+                return response
+            answer: Any = json.loads(response.text)
+        except Exception as e:
+            self.reportStatus(f"Could not read Gemini's answer for {len(geminiFiles)} files: {e}")
+            return None
+
+        # A plain list of categories is fine too, in the order of the files
+        if isinstance(answer, list):
+            answer = {fileNumber: tagValue for fileNumber, tagValue in enumerate(answer, start=1)}
+        if not isinstance(answer, dict):
+            self.reportStatus(f"Unexpected answer from Gemini for {len(geminiFiles)} files")
+            return None
+
+        batchTags: Dict[int, ValidationResult] = {}
+        for fileNumber, tagValue in answer.items():
+            try:
+                fileNumber = int(str(fileNumber).replace("File", "").strip())
+            except ValueError:
+                continue
+            if isinstance(tagValue, str) and tagValue.strip() in assignableTags:
+                batchTags[fileNumber] = tagValue.strip()
+
+        self.reportStatus(f"Gemini tagged {len(batchTags)} of {len(geminiFiles)} files in one request")
+        return batchTags
+
+    def requestGemini(self, contents: List[Any], config: Optional[Dict[str, Any]] = None, fileId: Optional[FileId] = None) -> Any:
+        """
+        Sends a generate_content request within the rate limits, retrying with backoff when the per-minute limit
+        is hit or Gemini has a server error (5xx).
+        Returns Gemini's response, "DAILY_LIMIT_EXCEEDED" once today's requests are used up,
+        or None if Gemini kept failing. Requests Gemini rejects (any other 4xx, e.g. a file it can't read)
+        are raised after one attempt, like errors that aren't from the Gemini API.
+        Each attempt is counted in the metrics (for fileId, if the request is about a single file).
+        """
 
-                for item in fileItems:
-                    nextFilesBatch.append((item["id"], item["mimeType"]))
+        # Attempt a finite number of times incase rate limit is exceeded
+        for attempt in range(8):
+
+            # Waits for the per-minute limit, and stops once the daily limit is used up
+            if not self.geminiRateLimiter.acquire():
+                self.reportStatus(
+                    "Daily Gemini rate limit exceeded. Please try again in 24 hours."
+                )
+                return "DAILY_LIMIT_EXCEEDED"
+            self.emitEvent(MetricsEvent("quota", count=self.geminiRateLimiter.remainingToday()))
 
-                # self.debugLabel.config(text=f"Successfully retrieved {len(nextFilesBatch)} files from Drive API.")
-                self.updateDebugMessageQueue(
-                    f"Successfully retrieved {len(nextFilesBatch)} files from Drive API."
+            requestStartTime: float = time.monotonic()
+            try:
+                response: Any = self.geminiClient.models.generate_content(
+                    model=self.geminiRateLimiter.model,
+                    contents=contents,
+                    **({"config": config} if config else {}),
+                )
+                self.recordApiCall(
+                    "gemini.models.generate_content", time.monotonic() - requestStartTime,
+                    len(getattr(response, "text", None) or ""), fileId=fileId, tokenCounts=geminiTokenCounts(response),
                 )
+                return response
 
-                for file in nextFilesBatch:
-                    fileId: FileId = file[0]
-                    mimeType: MimeType = file[1]
+            except (googleApiCoreExceptions.GoogleAPIError, geminiErrors.APIError) as error:
+                self.recordApiCall(
+                    "gemini.models.generate_content", time.monotonic() - requestStartTime, error=error, fileId=fileId
+                )
+                if getattr(error, "code", None) == 429:
+                    # Gemini names the quota that ran out, e.g. GenerateRequestsPerDayPerProjectPerModel
+                    if "PerDay" in str(error):
+                        self.geminiRateLimiter.dailyLimitReached()
+                        self.reportStatus(
+                            "Daily Gemini rate limit exceeded. Please try again in 24 hours."
+                        )
+                        return "DAILY_LIMIT_EXCEEDED"
 
-                    # CHECK IF FILE ALREADY HAS TAG
-                    fileMetadata: ApiResponse = (
-                        self.service.files()
-                        .get(fileId=fileId, fields="properties")
-                        .execute()
+                    self.geminiRateLimiter.minuteLimitReached()
+                    waitSeconds: float = backoffDelay(attempt)
+                    self.reportStatus(
+                        f"Gemini per-minute rate limit reached, retrying in {waitSeconds:.1f} seconds."
                     )
+                    time.sleep(waitSeconds)
+                elif isinstance(getattr(error, "code", None), int) and 400 <= error.code < 500:
+                    # The same request would be rejected again, so don't spend more of today's requests on it
+                    self.reportStatus(
+                        f"Gemini rejected the request: {error}"
+                    )
+                    raise
+                else:
+                    waitSeconds = backoffDelay(attempt)
+                    self.reportStatus(
+                        f"An unexpected error occurred: {error}, retrying in {waitSeconds:.1f} seconds."
+                    )
+                    time.sleep(waitSeconds)
 
-                    if ("properties" in fileMetadata) and (
-                        "tag" in fileMetadata["properties"]
-                    ):
-                        # self.debugLabel.config(text="File already has tag, skipping analysis")
-                        self.updateDebugMessageQueue(
-                            "File already has tag, skipping analysis"
+        return None
+
+    def connectGemini(self, geminiKey: Optional[str]) -> bool:
+        if not geminiKey or geminiKey.strip() == "":
+            self.reportStatus("Please enter a valid Gemini API key.")
+            return False
+
+        if self.geminiClient is not None and geminiKey.strip() == self.geminiApiKey:
+            return True  # Keep the client (and its open connections) from the last run
+
+        # Verify that the Gemini API key is valid by making a simple request
+        try:
+            self.geminiClient = genai.Client(
+                api_key=geminiKey.strip(),
+                # Every thread sends its requests through this client's pool of keep-alive connections
+                http_options=geminiTypes.HttpOptions(
+                    client_args={
+                        "limits": httpx.Limits(
+                            max_connections=geminiConnectionCount,
+                            max_keepalive_connections=geminiConnectionCount,
+                            keepalive_expiry=geminiKeepAliveSeconds,
                         )
-                    else:
-                        # File doesn't have tag, so analyze it
-                        # self.debugLabel.config(text=f"Analyzing file {fileId}")
-                        self.updateDebugMessageQueue(f"Analyzing file {fileId}")
-                        returnedValue: Optional[ValidationResult] = self.downloadFileAndUpdateMetadata(
-                            fileId, mimeType
+                    }
+                ),
+            )
+            self.geminiClient.models.list()  # This will raise an error if the key is invalid
+            self.geminiApiKey = geminiKey.strip()
+            self.reportStatus("Gemini API key is valid.")
+            return True
+        except Exception:
+            self.reportStatus("Invalid Gemini API key")
+            return False
+
+    # Checks if the Json file from the Google Cloud project is present.
+    def verifyJsonPresent(self) -> bool:
+        filename: str = "credentials.json"
+        if os.path.exists(filename):
+            self.reportStatus(f"'{filename}' found successfully")
+            return True
+        else:
+            self.reportStatus(
+                f"'{filename}' not present in the current directory"
+            )
+            return False
+
+    """
+    Crawls through the user's Google Drive and analyzes each file compatible with Gemini.
+    Designed to look at all files in the Drive (ignoring ones that already have a tag),
+    so that it can be run again if it previously crashed or failed. 
+    Returns True if every file was handled.
+  """
+
+    def tagEachFile(self) -> bool:
+        if not self.runTagging(self.listUntaggedFiles()):
+            return False
+
+        # The run is complete, so the next one starts from scratch rather than resuming this one
+        if not self.dryRun and not self.retryFailed:
+            self.runJournal.forget("tag", status="done")
+        return True
+
+    """
+    Only analyzes the files that were added or changed since they were last tagged: the catalog is brought up to date
+    from the Drive change log (see syncCatalog()), then every file in it without a tag, or whose content is not the
+    one its tag was given for, is analyzed. So changes another command (like organize) read from the log count too.
+    The first run has nothing to compare against, so it tags the whole Drive with tagEachFile().
+    Returns True if every file was handled.
+  """
+
+    def tagChangedFiles(self) -> bool:
+        if not self.driveCatalog.getPageToken() or self.rebuildCatalog or self.retryFailed:
+            self.reportStatus(
+                "No earlier run to compare against, tagging the whole Drive."
+            )
+            return self.tagEachFile()
+
+        changedFileIds: Optional[Set[FileId]] = self.syncCatalog()
+        if changedFileIds is None:
+            return False
+        self.reportStatus(f"{len(changedFileIds)} files were added or changed since the last sync.")
+        return self.runTagging(self.driveCatalog.filesToTag(self.scopeFolderId))
+
+    def listUntaggedFiles(self) -> Iterator[FileMetadata]:
+        # The files come from the driveCatalog, which knows every file's metadata (and tag) without asking Drive
+        if self.syncCatalog() is None:
+            raise RuntimeError("The local catalog of Drive files could not be brought up to date")
+
+        if self.retryFailed:
+            fileItems: Iterable[FileMetadata] = self.listFailedFiles("tag")
+        else:
+            fileItems = self.driveCatalog.untaggedFiles(self.scopeFolderId)
+
+        # Files tagged by an earlier run that didn't finish (the change log can take a while to report new tags)
+        alreadyTaggedFileIds: Dict[FileId, Optional[FolderId]] = self.runJournal.handledFiles("tag")
+
+        for item in fileItems:
+            if item.get("id") in alreadyTaggedFileIds:
+                continue
+
+            # CHECK IF FILE ALREADY HAS TAG
+            # (only possible when retrying failed files)
+            if "tag" in item.get("properties", {}):
+                # self.debugLabel.config(text="File already has tag, skipping analysis")
+                self.reportStatus(
+                    "File already has tag, skipping analysis"
+                )
+                continue
+
+            yield item
+
+    def listFailedFiles(self, action: str) -> Iterator[FileMetadata]:
+        """Yields the files whose last attempt at action failed, according to the runJournal, from the driveCatalog."""
+        failures: List[Dict[str, Any]] = self.runJournal.failures(action)
+        self.reportStatus(f"Retrying {len(failures)} files that failed to {action}.")
+
+        for failure in failures:
+            fileItem: Optional[FileMetadata] = self.driveCatalog.getFile(failure["fileId"])
+            if fileItem is None:
+                # The file is gone (or in the trash), so there is nothing left to retry
+                self.runJournal.forget(action, fileId=failure["fileId"])
+                continue
+            yield fileItem
+
+    def listSharedDriveIds(self) -> List[str]:
+        """Returns the IDs of the shared drives the user is a member of."""
+        sharedDriveIds: List[str] = []
+        pageToken: Optional[str] = None
+
+        while True:
+            retrievedDrivesJson: ApiResponse = self.executeRequest(
+                self.getDriveService().drives()
+                .list(pageSize=100, fields="nextPageToken, drives(id)", pageToken=pageToken)
+            )
+            sharedDriveIds.extend(sharedDrive["id"] for sharedDrive in retrievedDrivesJson.get("drives", []))
+            pageToken = retrievedDrivesJson.get("nextPageToken", None)
+            if not pageToken:
+                return sharedDriveIds
+
+    def crawlFiles(self, fileFields: str) -> Iterator[FileMetadata]:
+        """
+        Yields every file and folder in My Drive, in the shared drives and shared with the user, each once
+        (a file in several folders is found in each of them). fileFields must include id and mimeType.
+
+        Rather than following one chain of files.list pages, this lists folder by folder:
+        each listing asks for the files in up to crawlFoldersPerQuery folders, and the folders it finds are
+        listed next, by up to self.crawlWorkerCount threads at once. So listing a big Drive is limited by how
+        many requests Drive takes at once rather than by the time of one request after another.
+        Files shared with the user are listed on their own ("sharedWithMe"), wherever their folder is.
+        Files the user can't reach from any folder (orphaned files whose folder was deleted) aren't found:
+        Drive can't search for files without a parent, only a listing of every file would find them.
+        They join the catalog once they change, through the change log (see syncCatalog()).
+        """
+        workerCount: int = max(1, self.crawlWorkerCount)
+        # Fewer listings at once while Drive rate limits us, like executeOrganizePlan()'s batches
+        concurrencyLimit: AdaptiveConcurrencyLimit = AdaptiveConcurrencyLimit(workerCount)
+        # Pages of files from the listing threads, see PageQueue
+        pages: PageQueue = PageQueue(2 * workerCount)
+        listQuery: Callable[[str], None] = lambda query: self.listCrawlQuery(query, fileFields, concurrencyLimit, pages)
+
+        # Start from My Drive, every shared drive and what was shared with the user (which may be in other users' folders)
+        pendingFolderIds: deque[FolderId] = deque(["root", *self.listSharedDriveIds()])
+        pendingQueries: List[str] = ["sharedWithMe = true and trashed = false"]
+        seenFileIds: Set[FileId] = set()
+        runningCount: int = 0
+        throughput: ThroughputCounter = ThroughputCounter()
+
+        with ThreadPoolExecutor(max_workers=workerCount, thread_name_prefix="crawl") as pool:
+            try:
+                while True:
+                    while runningCount < workerCount and (pendingQueries or pendingFolderIds):
+                        pool.submit(
+                            listQuery,
+                            pendingQueries.pop() if pendingQueries
+                            else takeFolderQuery(pendingFolderIds, workerCount - runningCount),
                         )
-                        if returnedValue == "DAILY_LIMIT_EXCEEDED":
-                            return
+                        runningCount += 1
+
+                    if not runningCount:
+                        break
+                    kind, payload = pages.get()
+                    if kind == "error":
+                        raise payload
+                    if kind == "done":
+                        runningCount -= 1
+                        continue
+
+                    newItems: List[FileMetadata] = takeNewFiles(payload, seenFileIds, pendingFolderIds)
+                    yield from newItems
+                    self.reportCrawlProgress(throughput, len(newItems), len(pendingFolderIds), concurrencyLimit)
+            finally:
+                # Lets the listing threads end, also if the caller stopped reading early
+                pages.stop()
+
+        self.reportStatus(
+            f"Listed {throughput.count} files in {time.monotonic() - throughput.startTime:.1f}s "
+            f"({throughput.perSecond():.1f} files/s)."
+        )
 
-                # Update the pageToken for the next iteration
-                pageToken = retrievedFilesJson.get("nextPageToken", None)
+    def reportCrawlProgress(
+        self, throughput: ThroughputCounter, newCount: int, pendingCount: int, concurrencyLimit: AdaptiveConcurrencyLimit
+    ) -> None:
+        """Counts newCount more files listed by crawlFiles(), reporting its progress every progressReportSeconds."""
+        if throughput.add(newCount):
+            self.reportStatus(
+                f"Listed {throughput.count} files ({throughput.perSecond():.1f} files/s, "
+                f"{pendingCount} folders left to list, {int(concurrencyLimit.limit)} listings at a time)."
+            )
 
-                # If there's no nextPageToken, we've processed all files
+    def listCrawlQuery(
+        self, query: str, fileFields: str, concurrencyLimit: AdaptiveConcurrencyLimit, pages: PageQueue
+    ) -> None:
+        """Puts each page of files matching query on pages, for crawlFiles() (runs on one of its threads)."""
+        pageToken: Optional[str] = None
+        try:
+            while not pages.isStopped():
+                retrievedFilesJson: ApiResponse = self.listCrawlPage(query, pageToken, fileFields, concurrencyLimit)
+                pages.put("page", retrievedFilesJson.get("files", []))
+                pageToken = retrievedFilesJson.get("nextPageToken", None)
                 if not pageToken:
-                    # self.debugLabel.config(text="Done tagging Drive files")
-                    self.updateDebugMessageQueue("Done tagging Drive files")
-                    self.copySortButton.config(state=tk.NORMAL)
-                    self.moveSortButton.config(state=tk.NORMAL)
-                    return
+                    break
+        except Exception as error:
+            pages.put("error", error)
+            return
+        pages.put("done", None)
+
+    def listCrawlPage(
+        self, query: str, pageToken: Optional[str], fileFields: str, concurrencyLimit: AdaptiveConcurrencyLimit
+    ) -> ApiResponse:
+        """One page of files matching query, retried (up to 3 times, as in DriveRequestBatcher) when rate limited."""
+        maxRetries: int = 3
+        attempt: int = 0
+        while True:
+            concurrencyLimit.acquire()
+            rateLimited: bool = False
+            listStartTime: float = time.monotonic()
+            try:
+                retrievedFilesJson: ApiResponse = self.executeRequest(
+                    self.getDriveService().files()
+                    .list(
+                        q=query,
+                        corpora="allDrives",
+                        includeItemsFromAllDrives=True,
+                        supportsAllDrives=True,
+                        pageSize=1000,  # The most Drive returns at once
+                        fields=f"nextPageToken, files({fileFields})",
+                        pageToken=pageToken,
+                    )
+                )
+                self.emitEvent(MetricsEvent("latency", stage="list", seconds=time.monotonic() - listStartTime))
+                return retrievedFilesJson
+            except Exception as error:
+                rateLimited = isRateLimitError(error)
+                if not rateLimited or attempt >= maxRetries:
+                    raise
+            finally:
+                concurrencyLimit.release(rateLimited)
+            time.sleep(backoffDelay(attempt))
+            attempt += 1
+
+    def listChangePages(self, changesPageToken: str, fileFields: str, includeRemoved: bool = False) -> Iterator[ApiResponse]:
+        """
+        Yields each page of the Drive change log after changesPageToken, with fileFields of each changed file.
+        The last page has the newStartPageToken the next read of the log should start from.
+        The next page is requested while the caller works on this one (see prefetchPages()).
+        """
+        yield from prefetchPages(self.readChangePages(changesPageToken, fileFields, includeRemoved))
+
+    def readChangePages(self, changesPageToken: str, fileFields: str, includeRemoved: bool) -> Iterator[ApiResponse]:
+        """Yields each page of the Drive change log after changesPageToken, see listChangePages()."""
+        pageToken: Optional[str] = changesPageToken
+
+        while pageToken:
+            listStartTime: float = time.monotonic()
+            retrievedChangesJson: ApiResponse = self.executeRequest(
+                self.getDriveService().changes()
+                .list(
+                    pageToken=pageToken,
+                    spaces="drive",
+                    pageSize=1000,
+                    includeRemoved=includeRemoved,
+                    # Files in shared drives are in the catalog too (see crawlFiles())
+                    includeItemsFromAllDrives=True,
+                    supportsAllDrives=True,
+                    # changeType is "drive" for changes to a shared drive itself, those have a driveId but no fileId
+                    fields=f"nextPageToken, newStartPageToken, changes(changeType, fileId, driveId, removed, file({fileFields}))",
+                )
+            )
+
+            self.emitEvent(MetricsEvent("latency", stage="list", seconds=time.monotonic() - listStartTime))
+            self.reportStatus(
+                f"Successfully retrieved {len(retrievedChangesJson.get('changes', []))} changes from Drive API."
+            )
+
+            yield retrievedChangesJson
+            pageToken = retrievedChangesJson.get("nextPageToken", None)
+
+    def syncCatalog(self) -> Optional[Set[FileId]]:
+        """
+        Brings the driveCatalog up to date: the first time (or with rebuildCatalog) from a listing of the whole Drive,
+        after that from the changes in the Drive change log since the last sync.
+        Returns the IDs of the files that were added or changed (every file after a full listing, removed ones aside),
+        or None if Drive couldn't be read, the catalog is then left as it was.
+        """
+        changesPageToken: Optional[str] = self.driveCatalog.getPageToken()
+        changedFileIds: Set[FileId] = set()
+        try:
+            if changesPageToken and not self.rebuildCatalog:
+                for changesPage in self.listChangePages(changesPageToken, catalogFileFields, includeRemoved=True):
+                    changes: List[ApiResponse] = [
+                        change for change in changesPage.get("changes", []) if isFileChange(change)
+                    ]
+                    self.driveCatalog.removeFiles(
+                        change["fileId"] for change in changes if change.get("removed") or not change.get("file")
+                    )
+                    changedFiles: List[FileMetadata] = [
+                        change["file"] for change in changes if change.get("file") and not change.get("removed")
+                    ]
+                    self.driveCatalog.putFiles(changedFiles)
+                    changedFileIds.update(item["id"] for item in changedFiles if not item.get("trashed"))
+                    changedFileIds.difference_update(
+                        change["fileId"] for change in changes if change.get("removed") or not change.get("file")
+                    )
+                    changesPageToken = changesPage.get("newStartPageToken", changesPageToken)
+                self.driveCatalog.setPageToken(changesPageToken)
+                return changedFileIds
+
+            self.reportStatus("Listing the whole Drive into the local catalog, later runs only read what changed.")
+            # Read before listing, so changes made during the listing are picked up by the next sync
+            startPageToken: str = self.executeRequest(
+                self.getDriveService().changes().getStartPageToken(supportsAllDrives=True)
+            )["startPageToken"]
+            self.driveCatalog.clear()
+            fileItems: List[FileMetadata] = []
+            for item in self.crawlFiles(catalogFileFields):
+                fileItems.append(item)
+                changedFileIds.add(item["id"])
+                if len(fileItems) >= DriveCatalog.pageSize:
+                    self.driveCatalog.putFiles(fileItems)
+                    fileItems = []
+            self.driveCatalog.putFiles(fileItems)
+            self.driveCatalog.setPageToken(startPageToken)
+            self.rebuildCatalog = False
+            return changedFileIds
+
+        except Exception as e:
+            self.reportStatus(f"An error occurred while updating the local catalog of Drive files: {e}")
+            return None
+
+    """
+    Runs every file from fileItems through the tagging pipeline.
+    This thread only feeds the pipeline; downloading, uploading to Gemini, classifying and
+    writing the tag happen at the same time on the pipeline's worker threads
+    (see taggingWorkerCounts). Returns True if every file was handled.
+  """
 
-        except HttpError as error:
-            self.updateDebugMessageQueue(
+    def runTagging(self, fileItems: Iterable[FileMetadata]) -> bool:
+        # Tags are written in batches by the write stage, which sends them
+        # whenever it has nothing else to do and once it is finished
+        writeBatchedTags: Callable[[], None] = lambda: self.getDriveBatcher().flush()
+
+        # Folders may have been added or renamed since the last run
+        self.folderNames = None
+        self.startMetrics()
+        # The keyword rules for the content of downloaded files run in their own processes,
+        # so reading text doesn't hold up the pipeline's threads
+        if self.preClassifierMinConfidence <= 1:
+            self.preClassifierPool = ProcessPoolExecutor(max_workers=self.taggingWorkerCounts["preclassify"])
+
+        self.taggingPipeline = TaggingPipeline(
+            [
+                PipelineStage(
+                    "download",
+                    self.timeStage("download", self.downloadFileForGemini),
+                    self.taggingWorkerCounts["download"],
+                ),
+                PipelineStage(
+                    "preclassify",
+                    self.timeStage("preclassify", self.preClassifyDownloadedFile),
+                    self.taggingWorkerCounts["preclassify"],
+                    onDiscard=self.discardJob,
+                ),
+                PipelineStage(
+                    "upload",
+                    self.timeStage("upload", self.uploadFileToGemini),
+                    self.taggingWorkerCounts["upload"],
+                    onDiscard=self.discardJob,
+                ),
+                PipelineStage(
+                    "classify",
+                    self.timeStage("classify", self.classifyFile),
+                    self.taggingWorkerCounts["classify"],
+                    # Classify whatever small files are still waiting for a full batch
+                    onWorkerExit=self.classifyPendingFiles,
+                    # ...or before that, if their content in memory holds up the downloads
+                    onIdle=lambda: self.classifyPendingFiles() if downloadMemoryBudget.isExhausted() else None,
+                    onDiscard=self.discardJob,
+                ),
+                PipelineStage(
+                    "write",
+                    self.timeStage("write", self.writeTag),
+                    self.taggingWorkerCounts["write"],
+                    onIdle=writeBatchedTags,
+                    onWorkerExit=writeBatchedTags,
+                    finishAfterStop=True,
+                ),
+            ],
+            self.taggingQueueSize,
+        )
+        self.taggingPipeline.start()
+
+        try:
+            for item in fileItems:
+                job: TaggingJob = TaggingJob(
+                    item["id"], item["mimeType"], getContentKey(item),
+                    int(item["size"]) if item.get("size") else None,
+                )
+                job.changeMarker = getChangeMarker(item)
+                job.fileName = item.get("name", "")
+
+                # A file with the same content was classified before, so reuse its tag
+                # (the job goes straight through to the write stage)
+                if self.tagFromCache(job):
+                    self.reportStatus(
+                        f"Tagging file {item['id']} as '{job.tagValue}' from a previously classified copy"
+                    )
+                elif (
+                    self.preClassifierMinConfidence <= 1
+                    and item["mimeType"] != folderMimeType
+                    and self.preClassify(job, self.getFolderPath(item.get("parents", [])))
+                ):
+                    pass  # The name or folder gives the category away, so no need to download it either
+                elif job.strategy == "skip":
+                    # Gemini can't read this type of file, so it goes straight to the write stage
+                    self.reportStatus(
+                        "Setting incompatible file as 'Uncategorized'"
+                    )
+                    job.tagValue = "Uncategorized"
+                else:
+                    # File doesn't have tag, so analyze it
+                    # self.debugLabel.config(text=f"Analyzing file {fileId}")
+                    self.reportStatus(f"Analyzing file {item['id']}")
+
+                # Waits while the pipeline is full, and gives up once it was stopped
+                if not self.taggingPipeline.put(job):
+                    break
+
+        except googleApiErrors.HttpError:
+            self.reportStatus(
                 "An HTTP error occurred while retrieving files"
             )
-            return
+            self.taggingPipeline.stop()
         except Exception as e:
-            self.updateDebugMessageQueue(
+            self.reportStatus(
                 f"An error occurred while retrieving files: {e}"
             )
-            return
+            self.taggingPipeline.stop()
+        finally:
+            # Let the files already in the pipeline finish (and their tags get written)
+            self.taggingPipeline.finish()
+            if self.preClassifierPool:
+                self.preClassifierPool.shutdown()
+                self.preClassifierPool = None
+            self.reportCosts()
+
+        if self.taggingPipeline.isStopped():
+            return False
+
+        # self.debugLabel.config(text="Done tagging Drive files")
+        self.reportStatus("Done tagging Drive files")
+        return True
 
-    def organizeFiles(self) -> None:
+    def organizeFiles(self) -> bool:
         # All files, once tagged, will be COPIED into a folder by this name.
         # Copied and not moved in case something goes wrong.
         baseOrganizedFilesFolderName: str = "Organized-Drive-Files"
+        self.startMetrics()
+        # The folders may have changed since the last run in this process (e.g. in the GUI)
+        clearFolderIdCache()
 
         # Very similar to tagEachFile() in that it retrieves all file IDs from the Drive API
 
@@ -791,237 +3634,344 @@ class TaggerMenu:
 
         if baseFolderId:
             # self.debugLabel.config(text=f"Base folder '{baseOrganizedFilesFolderName}' exists, proceeding with organization.")
-            self.updateDebugMessageQueue(
+            self.reportStatus(
                 f"Base folder '{baseOrganizedFilesFolderName}' exists, proceeding with organization."
             )
 
-            pageToken: Optional[str] = (
-                None  # Used to request the next step of 1000 files from the Drive API
-            )
-            pageSize: int = 1000  # The number of files to retrieve (max allowed per request is 1000)
-
-            # This next part is pretty ugly, but does the following:
-            # 1 - Iteratively retrieves each file from the Drive
-            # 2 - Extracts the year and month from the file's creation date
-            # 3 - Checks if the year and month folders exist, creating them if they don't
-            # 4 - Checks if the tag folder exists, creating it if it doesn't
-            # 5 - Copies the file to the tag folder, preserving its name and properties
+            # This works in two steps:
+            # 1 - planOrganization() works out, from the local catalog of the Drive's files (see syncCatalog()),
+            #     the Year/Month/Tag folder of each tagged file and whether it can go there
+            # 2 - executeOrganizePlan() creates every Year/Month/Tag folder that doesn't exist yet, in one go,
+            #     then copies (or moves) each file to its tag folder, sending the requests to Drive in batches
             # Note that if a file has an issue being copied, it simply moves on to the next file.
             try:
-                while True:
-                    # Get the json file containing the list of files from the Drive API
-                    retrievedFilesJson: ApiResponse = (
-                        self.service.files()
-                        .list(
-                            pageSize=pageSize,
-                            fields="nextPageToken, files(id, name, createdTime, properties)",
-                            pageToken=pageToken,
-                        )
-                        .execute()
-                    )
+                if self.syncCatalog() is None:
+                    return False
+                action: str = "move" if self.moveFiles else "copy"
+                plan: List[OrganizeStep] = self.planOrganization(baseFolderId, action)
+                return self.executeOrganizePlan(baseFolderId, plan, action)
+
+            except googleApiErrors.HttpError:
+                self.reportStatus(
+                    "An HTTP error occurred while retrieving files for sorting"
+                )
+                return False
+            except Exception:
+                self.reportStatus(
+                    "An error occurred while retrieving files for sorting"
+                )
+                return False
+            finally:
+                self.reportCosts()
 
-                    fileItems: List[FileMetadata] = retrievedFilesJson.get("files", [])
-                    if not fileItems:
-                        # self.debugLabel.config(text="No more files retrieved from Drive API.")
-                        self.updateDebugMessageQueue(
-                            "No more files retrieved from Drive API."
-                        )
-                        return
-
-                    # Now process each retrieved file
-                    for item in fileItems:
-                        fileId: FileId = item.get("id", "")
-                        fileName: str = item.get("name", "")
-                        createdTimeStr: Optional[str] = item.get("createdTime")
-                        properties: FileProperties = item.get("properties", {})
-
-                        # Extract the year and month from the createdTime
-                        # This part is a bit ugly because createdTime is a RFC 3339 formatted string
-                        yearCreated: Optional[int] = None
-                        monthCreated: Optional[int] = None
-
-                        if createdTimeStr:
-                            if createdTimeStr.endswith("Z"):
-                                createdTimeStr = createdTimeStr[:-1]
-                            if "." in createdTimeStr:
-                                createdTimeStr = createdTimeStr.split(".")[0]
-
-                            created_dt: datetime = datetime.fromisoformat(createdTimeStr)
-                            yearCreated = created_dt.year
-                            monthCreated = created_dt.month
-
-                        if not yearCreated or not monthCreated:
-                            # self.debugLabel.config(text=f"Could not extract year or month from createdTime: {createdTimeStr}")
-                            self.updateDebugMessageQueue(
-                                f"Could not extract year or month from createdTime: {createdTimeStr}"
-                            )
-                            continue
-
-                        # Reminder that the series of folders these files will be stored in is:
-                        # Organized-Drive-Files/Year/Month/Tag/FileName
-
-                        yearFolderId: Optional[FolderId] = self.checkIfFolderExists(
-                            str(yearCreated), baseFolderId
-                        )
+        return False
 
-                        if yearFolderId:
-                            # self.debugLabel.config(text=f"Year folder for {yearCreated} exists, proceeding with month organization.")
-                            self.updateDebugMessageQueue(
-                                f"Year folder for {yearCreated} exists, proceeding with month organization."
-                            )
-
-                            # monthCreated is a number, so find the word (aka 7 -> July) for better folder naming
-                            monthCreatedWord: str = numberToMonth[monthCreated]
-
-                            monthFolderId: Optional[FolderId] = self.checkIfFolderExists(
-                                monthCreatedWord, yearFolderId
-                            )
-                            if monthFolderId:
-                                # self.debugLabel.config(text=f"Month folder for {monthCreatedWord} exists, proceeding with tag organization.")
-                                self.updateDebugMessageQueue(
-                                    f"Month folder for {monthCreatedWord} exists, proceeding with tag organization."
-                                )
-
-                                # Now check the tag
-                                tagValue: Optional[str] = properties.get(
-                                    "tag"
-                                )  # Default to 'Uncategorized' if no tag exists
-
-                                if tagValue:
-                                    tagFolderId: Optional[FolderId] = self.checkIfFolderExists(
-                                        tagValue, monthFolderId
-                                    )
-
-                                    if tagFolderId:
-
-                                        # Determine if file will be copied or moved
-                                        if self.moveFiles:
-                                            self.updateDebugMessageQueue(
-                                                f"Tag folder for '{tagValue}' exists, proceeding with file moving."
-                                            )
-
-                                            movedFileId: Optional[FileId] = self.moveFileToFolder(
-                                                fileId, tagFolderId
-                                            )
-
-                                            if movedFileId:
-                                                self.updateDebugMessageQueue(
-                                                    f"Successfully moved file to tag folder '{tagValue}' (ID: {movedFileId})"
-                                                )
-                                            else:
-                                                self.updateDebugMessageQueue(
-                                                    "Failed to move file to tag folder"
-                                                )
-                                        else:
-                                            self.updateDebugMessageQueue(
-                                                f"Tag folder for '{tagValue}' exists, proceeding with file copying."
-                                            )
-
-                                            copiedFileId: Optional[FileId] = self.copyFileToFolder(
-                                                fileId, tagFolderId
-                                            )
-
-                                            if copiedFileId:
-                                                self.updateDebugMessageQueue(
-                                                    f"Successfully copied file {fileId} to tag folder '{tagValue}' (ID: {copiedFileId})"
-                                                )
-                                            else:
-                                                self.updateDebugMessageQueue(
-                                                    "Failed to copy file to tag folder"
-                                                )
-
-                                    else:
-                                        uncategorizedFolderId: Optional[FolderId] = (
-                                            self.checkIfFolderExists(
-                                                "Uncategorized", monthFolderId
-                                            )
-                                        )
-
-                                        if uncategorizedFolderId:
-                                            self.updateDebugMessageQueue(
-                                                "No tag associated with file, so copying to 'Uncategorized' folder"
-                                            )
-
-                                            if self.moveFiles:
-                                                movedFileId: Optional[FileId] = self.moveFileToFolder(
-                                                    fileId, uncategorizedFolderId
-                                                )
-
-                                                if movedFileId:
-                                                    self.updateDebugMessageQueue(
-                                                        f"Successfully moved file {fileId} to 'Uncategorized' folder (ID: {movedFileId})"
-                                                    )
-                                                else:
-                                                    self.updateDebugMessageQueue(
-                                                        "Failed to move file to 'Uncategorized' folder"
-                                                    )
-                                            else:
-                                                copiedFileId: Optional[FileId] = self.copyFileToFolder(
-                                                    fileId, uncategorizedFolderId
-                                                )
-
-                                                if copiedFileId:
-                                                    self.updateDebugMessageQueue(
-                                                        f"Successfully copied file {fileId} to 'Uncategorized' folder (ID: {copiedFileId})"
-                                                    )
-                                                else:
-                                                    self.updateDebugMessageQueue(
-                                                        "Failed to copy file to 'Uncategorized' folder"
-                                                    )
-
-                    # Update the pageToken for the next iteration
-                    pageToken = retrievedFilesJson.get("nextPageToken", None)
-
-                    # If there's no nextPageToken, we've processed all files
-                    if not pageToken:
-                        self.updateDebugMessageQueue(
-                            "All files processed, exiting organizeFiles()."
-                        )
-                        return
+    def planOrganization(self, baseFolderId: FolderId, action: str) -> List[OrganizeStep]:
+        """
+        Works out what organizeFiles() should do with each tagged file, without changing anything in Drive.
+        The files, the organized folders and the names already in them all come from the driveCatalog
+        (see syncCatalog()), so planning is local queries rather than Drive API calls.
+        """
+        plan: List[OrganizeStep] = []
+        fileItems: Iterable[FileMetadata] = (
+            self.listFailedFiles(action) if self.retryFailed else self.driveCatalog.taggedFiles(self.scopeFolderId)
+        )
 
-            except HttpError as error:
-                self.updateDebugMessageQueue(
-                    f"An HTTP error occurred while retrieving files for sorting"
+        # Work out where each tagged file (in the scope) belongs
+        for item in fileItems:
+            # Only tagged files get organized
+            tagValue: Optional[str] = item.get("properties", {}).get("tag")
+            if not tagValue or item.get("mimeType") == folderMimeType:
+                continue
+
+            createdMonth: Optional[Tuple[int, int]] = parseCreatedMonth(item.get("createdTime"))
+            if not createdMonth:
+                # self.debugLabel.config(text=f"Could not extract year or month from createdTime: {createdTimeStr}")
+                self.reportStatus(
+                    f"Could not extract year or month from createdTime: {item.get('createdTime')}"
                 )
-                return
-            except Exception as e:
-                self.updateDebugMessageQueue(
-                    f"An error occurred while retrieving files for sorting"
+                continue
+
+            # Reminder that the series of folders these files will be stored in is:
+            # Organized-Drive-Files/Year/Month/Tag/FileName
+            # The month is a number, so find the word (aka 7 -> July) for better folder naming
+            yearCreated, monthCreated = createdMonth
+            plan.append(OrganizeStep(item, (str(yearCreated), numberToMonth[monthCreated], tagValue)))
+
+        # Learn about the existing organized folders so the tag folders can be found in memory
+        self.warmFolderCache(baseFolderId, self.driveCatalog.folders())
+        for step in plan:
+            step.destinationFolderId = self.getCachedFolderId(baseFolderId, step.folderPath)
+
+        # Files an earlier run already put in (or found in) the same folder
+        # don't need to be checked for duplicate names again
+        placedFiles: Dict[FileId, Optional[FolderId]] = self.runJournal.handledFiles(action)
+        plannedNames: Set[Tuple[FolderPath, str]] = set()
+
+        for step in plan:
+            fileId: FileId = step.fileItem.get("id", "")
+            fileName: str = step.fileItem.get("name", "")
+
+            if step.destinationFolderId and placedFiles.get(fileId) == step.destinationFolderId:
+                step.status = "done-before"
+            # Two files with the same name headed for the same folder: only the first one goes
+            elif (step.folderPath, fileName) in plannedNames or (
+                step.destinationFolderId and self.driveCatalog.nameTaken(step.destinationFolderId, fileName)
+            ):
+                step.status = "name-taken"
+            else:
+                plannedNames.add((step.folderPath, fileName))
+
+        self.reportStatus(
+            f"Planned {len(plan)} tagged files: "
+            f"{sum(step.status == 'place' for step in plan)} to {action}, "
+            f"{sum(step.status == 'name-taken' for step in plan)} with a name already taken, "
+            f"{sum(step.status == 'done-before' for step in plan)} already done by an earlier run."
+        )
+        return plan
+
+    def executeOrganizePlan(self, baseFolderId: FolderId, plan: List[OrganizeStep], action: str) -> bool:
+        """
+        Carries out a plan from planOrganization(): creates the missing folders, then copies
+        (or moves) the files in batches, from organizeWorkerCount threads at once (see placeFiles()).
+        In a dry run, it only reports what each file would do.
+        Returns False if any file failed.
+        """
+        destinationFolderIds: Dict[FolderPath, FolderId] = self.buildFolderTree(
+            baseFolderId, {step.folderPath for step in plan if step.status == "place"}
+        )
+        filesToPlace: List[Tuple[FileMetadata, FolderId]] = []
+        dryRunCount: int = 0
+
+        for step in plan:
+            item: FileMetadata = step.fileItem
+            fileId: FileId = item.get("id", "")
+            if step.status == "done-before":
+                continue
+
+            if step.status == "name-taken":
+                self.reportStatus(
+                    f"File '{item.get('name')}' already exists in folder {'/'.join(step.folderPath)}. Skipping to avoid duplicate names."
                 )
-                return
+                self.reportResult(
+                    action, fileId, "skipped", name=item.get("name"),
+                    destinationFolderId=step.destinationFolderId, destinationPath="/".join(step.folderPath),
+                )
+                continue
+
+            tagFolderId: Optional[FolderId] = destinationFolderIds.get(step.folderPath)
+            if not tagFolderId:
+                self.reportStatus(
+                    f"No folder available for '{'/'.join(step.folderPath)}', skipping file {fileId}"
+                )
+                continue
+
+            if self.dryRun:
+                self.reportStatus(
+                    f"Dry run: would {action} '{item.get('name')}' to {'/'.join(step.folderPath)}"
+                )
+                self.reportResult(
+                    action, fileId, "dry-run", name=item.get("name"),
+                    destinationFolderId=tagFolderId, destinationPath="/".join(step.folderPath),
+                )
+                dryRunCount += 1
+                continue
+
+            filesToPlace.append((item, tagFolderId))
+
+        failedFileIds: List[FileId] = self.placeFiles(filesToPlace)
+
+        self.reportStatus(
+            f"All files processed, exiting organizeFiles(). "
+            f"{dryRunCount + len(filesToPlace) - len(failedFileIds)} files "
+            f"{'would be ' if self.dryRun else ''}{'moved' if self.moveFiles else 'copied'}, "
+            f"{len(failedFileIds)} failed, "
+            f"{sum(step.status == 'name-taken' for step in plan)} skipped, "
+            f"{sum(step.status == 'done-before' for step in plan)} already done by an earlier run."
+        )
+        return not failedFileIds
+
+    def placeFiles(self, filesToPlace: List[Tuple[FileMetadata, FolderId]]) -> List[FileId]:
+        """
+        Copies (or moves) each file to its folder and returns the IDs of the files that failed.
+        The files are split into chunks of organizeChunkSize, each sent as one batch by a thread of a pool.
+        An AdaptiveConcurrencyLimit keeps fewer batches in flight while Drive rate limits us.
+        """
+        if not filesToPlace:
+            return []
+
+        # Determine if files will be copied or moved
+        placeFile: Callable[..., None] = (
+            self.moveFileToFolder if self.moveFiles else self.copyFileToFolder
+        )
+        failedFileIds: List[FileId] = []
+        concurrencyLimit: AdaptiveConcurrencyLimit = AdaptiveConcurrencyLimit(self.organizeWorkerCount)
+        throughput: ThroughputCounter = ThroughputCounter()
+
+        def placeChunk(chunk: List[Tuple[FileMetadata, FolderId]]) -> None:
+            # Each pool thread has its own Drive service and batcher
+            batcher: DriveRequestBatcher = self.getDriveBatcher()
+            concurrencyLimit.acquire()
+            rateLimitedBefore: int = batcher.rateLimitedCount
+            startTime: float = time.monotonic()
+            try:
+                for item, tagFolderId in chunk:
+                    def onDone(newFileId: Optional[FileId], fileId: FileId = item.get("id", "")) -> None:
+                        if not newFileId:
+                            failedFileIds.append(fileId)
+
+                    placeFile(item, tagFolderId, onDone)
+                batcher.flush()
+            finally:
+                concurrencyLimit.release(rateLimited=batcher.rateLimitedCount > rateLimitedBefore)
+                self.emitEvent(MetricsEvent("latency", stage="organize", seconds=time.monotonic() - startTime))
+
+            if throughput.add(len(chunk)):
+                self.reportStatus(
+                    f"{'Moved' if self.moveFiles else 'Copied'} {throughput.count}/{len(filesToPlace)} files "
+                    f"({throughput.perSecond():.1f} files/s, {int(concurrencyLimit.limit)} batches at a time)."
+                )
+
+        chunks: List[List[Tuple[FileMetadata, FolderId]]] = [
+            filesToPlace[start:start + organizeChunkSize] for start in range(0, len(filesToPlace), organizeChunkSize)
+        ]
+        with ThreadPoolExecutor(max_workers=max(1, self.organizeWorkerCount)) as pool:
+            # list() re-raises the first exception of a chunk, if any
+            list(pool.map(placeChunk, chunks))
+
+        self.reportStatus(
+            f"Sent {len(filesToPlace)} files in {time.monotonic() - throughput.startTime:.1f}s "
+            f"({throughput.perSecond():.1f} files/s)."
+        )
+        return failedFileIds
+
+
+class TaggerMenu:
+    """The Tk window around a DriveTagger. All the actual work is done by self.tagger."""
+
+    def __init__(self, rootWindow: tk.Tk) -> None:
+        self.root: tk.Tk = rootWindow
+        self.root.title("Google Drive Tagger")
+        self.root.geometry("750x450")
+
+        # The tagging thread can't update the GUI itself, so refreshProgress() shows
+        # the latest of self.tagger.metrics at a fixed rate instead
+        self.tagger: DriveTagger = DriveTagger()
+        self.shownProgress: str = ""
+
+        # ------- The widgets for the GUI -------
+        # self.debugLabel = tk.Label(self.root, justify=tk.LEFT, bg = "gray75") # Used to print what is happening as the program runs
+        # self.debugLabelName = tk.Label(self.root, justify=tk.LEFT, text="Debug Output: ", bg = "gray80") # Label for the debug label
+        self.debugFrame: tk.Frame = tk.Frame(self.root, bg="gray80")
+        self.debugLabelName: tk.Label = tk.Label(
+            self.debugFrame,
+            justify=tk.LEFT,
+            text="Debug Output: ",
+            bg="gray80",
+            wraplength=700,  # Wrap text at 700 pixels to prevent excessive width
+        )
+
+        self.geminiKeyLabel: tk.Label = tk.Label(
+            self.root, text="Enter your Gemini API Key:", justify=tk.LEFT
+        )  # Label for Gemini API key textbox
+        self.geminiApiEntry: tk.Entry = tk.Entry(self.root)  # Textbox for entering Gemini API key
+
+        self.tagButton: tk.Button = tk.Button(
+            self.root, text="Perform file tagging", command=self.tagButtonClicked
+        )  # Runs method to analyze each file w/ Gemini and add tag accordingly
+        self.tagChangesButton: tk.Button = tk.Button(
+            self.root,
+            text="Tag new and changed files only",
+            command=self.tagChangesButtonClicked,
+        )  # Same as tagButton, but only looks at files added or changed since the last run
+        self.copySortButton: tk.Button = tk.Button(
+            self.root,
+            text="COPY tagged files into organized folder",
+            command=self.copySortButtonClicked,
+            state=tk.DISABLED,
+        )  # Runs method to organize files based on tag and creation date
+        self.moveSortButton: tk.Button = tk.Button(
+            self.root,
+            text="MOVE tagged files into organized folder",
+            command=self.moveSortButtonClicked,
+            state=tk.DISABLED,
+        )  # Runs method to organize files based on tag and creation date
+
+        instructionString: str = "Please ensure credentials.json is in the same folder as this program.\n\nYou will need to click 'Perform file tagging' before files can be sorted.\n\nThe free tier of Google Gemini can only process 400 messages per day.\n\nIf you have more than 400 files then you will need to run this across multiple days."
+
+        self.instructionLabel: tk.Label = tk.Label(
+            self.root,
+            text=instructionString,
+            justify=tk.LEFT,
+            font=("Verdana", 10),
+            bg="gray75",
+        )
+
+        self.drawMainMenu()
+        self.refreshProgress()
+
+    def verifyGeminiKey(self) -> bool:
+        geminiKey: str = (
+            self.geminiApiEntry.get().strip()
+        )  # Get the key from the entry box
+        return self.tagger.connectGemini(geminiKey)
+
+    def refreshProgress(self) -> None:
+        """Shows the latest status message and totals in the debug label, however many came in since the last refresh."""
+        metrics: RunMetrics = self.tagger.metrics
+        progress: str = f"Debug Output: {metrics.lastStatus}\n{metrics.summary()}"
+        # Only redraw when something changed
+        if progress != self.shownProgress:
+            self.debugLabelName.config(text=progress)
+            self.shownProgress = progress
+
+        # Schedule this method to run again (the next frame)
+        self.after_id: str = self.root.after(guiRefreshMilliseconds, self.refreshProgress)
 
     def tagButtonClicked(self) -> None:
-        # 0. Verify Drive API is authenticated
-        self.service = self.authenticateDriveAPI()
+        self.startTaggingThread(self.tagger.tagEachFile)
+
+    def tagChangesButtonClicked(self) -> None:
+        self.startTaggingThread(self.tagger.tagChangedFiles)
 
-        if self.service:
+    def startTaggingThread(self, taggingMethod: Callable[[], bool]) -> None:
+        # 0. Verify Drive API is authenticated
+        if self.tagger.authenticateDriveAPI():
 
             # 1. Verify Gemini key is valid
             if self.verifyGeminiKey():
 
                 # 2. Verify credentials.json file is present
-                if self.verifyJsonPresent():
+                if self.tagger.verifyJsonPresent():
                     # self.debugLabel.config(text="Proceeding with tagging")
                     # self.tagEachFile()
-                    taggingThread: threading.Thread = threading.Thread(target=self.tagEachFile)
+                    taggingThread: threading.Thread = threading.Thread(
+                        target=self.runTagging, args=(taggingMethod,)
+                    )
                     taggingThread.daemon = True
                     taggingThread.start()
                 else:
                     return
 
+    def runTagging(self, taggingMethod: Callable[[], bool]) -> None:
+        # Files can only be sorted once they are all tagged
+        if taggingMethod():
+            self.copySortButton.config(state=tk.NORMAL)
+            self.moveSortButton.config(state=tk.NORMAL)
+
     def copySortButtonClicked(self) -> None:
-        self.moveFiles = False
+        self.tagger.moveFiles = False
         # Must run organizeFiles() in a thread otherwise the GUI will appear to freeze up
         # since no other components can be updated while the method is running
-        sortingThread: threading.Thread = threading.Thread(target=self.organizeFiles)
+        sortingThread: threading.Thread = threading.Thread(target=self.tagger.organizeFiles)
         sortingThread.daemon = True
         sortingThread.start()
 
     def moveSortButtonClicked(self) -> None:
-        self.moveFiles = True
+        self.tagger.moveFiles = True
         # Must run organizeFiles() in a thread otherwise the GUI will appear to freeze up
         # since no other components can be updated while the method is running
-        sortingThread: threading.Thread = threading.Thread(target=self.organizeFiles)
+        sortingThread: threading.Thread = threading.Thread(target=self.tagger.organizeFiles)
         sortingThread.daemon = True
         sortingThread.start()
 
@@ -1045,18 +3995,315 @@ class TaggerMenu:
         )
 
         self.tagButton.grid(row=3, column=0, padx=10, pady=10, sticky=tk.W)
+        self.tagChangesButton.grid(row=4, column=0, padx=10, pady=10, sticky=tk.W)
         self.copySortButton.grid(row=3, column=1, padx=10, pady=10, sticky=tk.W)
         self.moveSortButton.grid(row=4, column=1, padx=10, pady=10, sticky=tk.W)
 
 
-def main() -> None:
+def parseArguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Tag Google Drive files with Gemini and organize them into Year/Month/Tag folders."
+    )
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="gui",
+        choices=["gui", "tag", "tag-changes", "organize-copy", "organize-move", "failures", "report", "benchmark-rules"],
+        help="What to do (default: open the GUI). 'failures' lists the files that failed in earlier runs, "
+        "'report' summarizes the Drive from the local catalog, 'benchmark-rules' measures the keyword rules against --labels",
+    )
+    parser.add_argument(
+        "--gemini-key",
+        default=os.getenv("GEMINI_API_KEY"),
+        help="Gemini API key, only needed for tagging (default: $GEMINI_API_KEY)",
+    )
+    parser.add_argument(
+        "--folder",
+        metavar="FOLDER_ID",
+        help="Only work on files below this Drive folder (default: the whole Drive)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report what would be tagged, copied or moved without changing anything in Drive",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Only work on the files that failed in earlier runs (see the failures command)",
+    )
+    parser.add_argument(
+        "--rebuild-catalog",
+        action="store_true",
+        help="List the whole Drive into the local catalog again instead of reading only what changed",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="FILE",
+        help="Write one JSON line per processed file to FILE ('-' for stdout)",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help=f"Every {progressReportSeconds:g} seconds and at the end, write the run's metrics to FILE ('-' for stdout, jsonl only)",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        default="jsonl",
+        choices=["jsonl", "prometheus"],
+        help="jsonl appends one JSON line per report, prometheus rewrites FILE in the Prometheus text format (default: jsonl)",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="Write one JSON line per API call and stage of each file to FILE ('-' for stdout), "
+        f"and list the {costlyFileCount} costliest files at the end",
+    )
+    parser.add_argument(
+        "--model",
+        default=geminiModel,
+        choices=sorted(geminiModelLimits),
+        help=f"Gemini model used for tagging (default: {geminiModel})",
+    )
+    for stageName, workerCount in taggingWorkerCounts.items():
+        parser.add_argument(
+            f"--{stageName}-workers",
+            type=int,
+            default=workerCount,
+            metavar="N",
+            help=f"Number of threads for the {stageName} stage of tagging (default: {workerCount})",
+        )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=geminiBatchSize,
+        metavar="N",
+        help=f"Small files classified together in one Gemini request, 1 to turn batching off (default: {geminiBatchSize})",
+    )
+    parser.add_argument(
+        "--inline-bytes",
+        type=int,
+        default=geminiInlineFileBytes,
+        metavar="N",
+        help=f"Files up to this size are sent inline instead of uploaded to Gemini "
+        f"(default: {geminiInlineFileBytes}, at most {geminiInlineMaxFileBytes})",
+    )
+    parser.add_argument(
+        "--min-confidence",
+        type=float,
+        default=preClassifierMinConfidence,
+        metavar="X",
+        help=f"Files the keyword rules are this sure about (0 to 1) are tagged without Gemini, "
+        f"above 1 turns the rules off (default: {preClassifierMinConfidence})",
+    )
+    parser.add_argument(
+        "--labels",
+        metavar="CSV",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "raw", "preclassifier-sample.csv"),
+        help="Labeled sample for benchmark-rules, with the columns name, folder, tag and optionally mimeType and text",
+    )
+    parser.add_argument(
+        "--organize-workers",
+        type=int,
+        default=organizeWorkerCount,
+        metavar="N",
+        help=f"Most threads copying or moving files at once, fewer while Drive rate limits us (default: {organizeWorkerCount})",
+    )
+    parser.add_argument(
+        "--list-workers",
+        type=int,
+        default=crawlWorkerCount,
+        metavar="N",
+        help=f"Most folders listed at once when the whole Drive is read into the local catalog (default: {crawlWorkerCount})",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=taggingQueueSize,
+        metavar="N",
+        help=f"Files waiting between two tagging stages (default: {taggingQueueSize})",
+    )
+    arguments: argparse.Namespace = parser.parse_args(argv)
+    # The Prometheus file is replaced on every report, which stdout can't do
+    if arguments.metrics == "-" and arguments.metrics_format == "prometheus":
+        parser.error("--metrics - (stdout) only works with --metrics-format jsonl")
+    return arguments
+
+
+def writeMetrics(tagger: DriveTagger, path: str, metricsFormat: str) -> None:
+    """Writes tagger's metrics to path (see the --metrics option)."""
+    if metricsFormat == "prometheus":
+        # Write to a temporary file first, so a scrape never sees half a file
+        with open(f"{path}.tmp", "w", encoding="utf-8") as metricsFile:
+            metricsFile.write(tagger.metrics.prometheusText())
+        os.replace(f"{path}.tmp", path)
+    elif path == "-":
+        sys.stdout.write(json.dumps(tagger.metrics.snapshot()) + "\n")
+        sys.stdout.flush()
+    else:
+        with open(path, "a", encoding="utf-8") as metricsFile:
+            metricsFile.write(json.dumps(tagger.metrics.snapshot()) + "\n")
+
+
+class JsonLinesWriter:
+    """Writes one JSON object per line to a file, or to stdout for "-", from any thread (see --output and --trace)."""
+
+    def __init__(self, path: str, flushEachLine: bool = True) -> None:
+        self.file: Any = sys.stdout if path == "-" else open(path, "a", encoding="utf-8")
+        self.flushEachLine: bool = flushEachLine
+        self.lock: threading.Lock = threading.Lock()  # Results come from several threads
+
+    def write(self, record: Dict[str, Any]) -> None:
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            if self.flushEachLine:
+                self.file.flush()
+
+    def close(self) -> None:
+        self.file.flush()
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class PeriodicMetricsWriter:
+    """Writes a DriveTagger's metrics regularly while a command runs, and once more at the end (see --metrics)."""
+
+    def __init__(self, tagger: DriveTagger, path: str, metricsFormat: str) -> None:
+        self.tagger: DriveTagger = tagger
+        self.path: str = path
+        self.metricsFormat: str = metricsFormat
+        self.stopped: threading.Event = threading.Event()
+        self.thread: threading.Thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def run(self) -> None:
+        while not self.stopped.wait(progressReportSeconds):
+            writeMetrics(self.tagger, self.path, self.metricsFormat)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        writeMetrics(self.tagger, self.path, self.metricsFormat)
+
+
+def traceFileEvent(traceWriter: JsonLinesWriter, event: MetricsEvent) -> None:
+    # Only what was spent on a single file, the rest is in the summary at the end of the run
+    if event.kind in ("apiCall", "latency") and event.fileId:
+        traceWriter.write({"time": round(time.time(), 3), **event.toDict()})
+
+
+def runLocalCommand(arguments: argparse.Namespace, outputFile: Any) -> bool:
+    """Runs a command that needs neither Drive nor Gemini: failures or benchmark-rules."""
+    if arguments.command == "failures":
+        # Compact failure report from the run journal, one JSON line per file
+        for failure in RunJournal().failures():
+            outputFile.write(json.dumps(failure) + "\n")
+        return True
+
+    benchmark: Dict[str, Any] = benchmarkPreClassifier(
+        arguments.labels, arguments.min_confidence, arguments.preclassify_workers
+    )
+    outputFile.write(json.dumps(benchmark, indent=2) + "\n")
+    return True
+
+
+def makeCommandTagger(
+    arguments: argparse.Namespace, outputWriter: Optional[JsonLinesWriter], traceWriter: Optional[JsonLinesWriter]
+) -> DriveTagger:
+    """A DriveTagger set up from the command line's options, printing its progress to stderr."""
+    tagger: DriveTagger = DriveTagger(
+        onStatus=lambda message: print(message, file=sys.stderr, flush=True),
+        onResult=outputWriter.write if outputWriter else None,
+        onEvent=(lambda event: traceFileEvent(traceWriter, event)) if traceWriter else None,
+    )
+    tagger.traceFiles = bool(traceWriter)
+    tagger.dryRun = arguments.dry_run
+    tagger.retryFailed = arguments.retry_failed
+    tagger.scopeFolderId = arguments.folder
+    tagger.rebuildCatalog = arguments.rebuild_catalog
+    tagger.taggingQueueSize = arguments.queue_size
+    tagger.organizeWorkerCount = arguments.organize_workers
+    tagger.crawlWorkerCount = arguments.list_workers
+    tagger.geminiBatchSize = arguments.batch_size
+    tagger.geminiInlineFileBytes = max(0, min(arguments.inline_bytes, geminiInlineMaxFileBytes))
+    tagger.preClassifierMinConfidence = arguments.min_confidence
+    for stageName in tagger.taggingWorkerCounts:
+        tagger.taggingWorkerCounts[stageName] = getattr(arguments, f"{stageName}_workers")
+    if arguments.model != tagger.geminiRateLimiter.model:
+        tagger.geminiRateLimiter = GeminiRateLimiter.forModel(arguments.model)
+    return tagger
+
+
+def runTaggerCommand(tagger: DriveTagger, arguments: argparse.Namespace, outputFile: Any) -> bool:
+    """Runs report, tag, tag-changes, organize or organize-move with tagger."""
+    if not tagger.authenticateDriveAPI():
+        return False
+
+    if arguments.command == "report":
+        # Counts by tag, organize status and year, and files with the same content, without Drive calls per file
+        if tagger.syncCatalog() is None:
+            return False
+        outputFile.write(json.dumps(tagger.driveCatalog.report(), indent=2) + "\n")
+        return True
+
+    if arguments.command in ("tag", "tag-changes"):
+        if not tagger.connectGemini(arguments.gemini_key):
+            return False
+        if arguments.command == "tag":
+            return tagger.tagEachFile()
+        return tagger.tagChangedFiles()
+
+    tagger.moveFiles = arguments.command == "organize-move"
+    return tagger.organizeFiles()
+
+
+def runCommand(arguments: argparse.Namespace) -> bool:
+    """Runs a command from the command line with a DriveTagger, without any GUI."""
+    outputWriter: Optional[JsonLinesWriter] = JsonLinesWriter(arguments.output) if arguments.output else None
+    # Trace lines are many, they are flushed at the end
+    traceWriter: Optional[JsonLinesWriter] = (
+        JsonLinesWriter(arguments.trace, flushEachLine=False) if arguments.trace else None
+    )
+    outputFile: Any = outputWriter.file if outputWriter else sys.stdout
+    metricsWriter: Optional[PeriodicMetricsWriter] = None
+
+    try:
+        if arguments.command in ("failures", "benchmark-rules"):
+            return runLocalCommand(arguments, outputFile)
+
+        tagger: DriveTagger = makeCommandTagger(arguments, outputWriter, traceWriter)
+        if arguments.metrics:
+            metricsWriter = PeriodicMetricsWriter(tagger, arguments.metrics, arguments.metrics_format)
+            metricsWriter.start()
+        return runTaggerCommand(tagger, arguments, outputFile)
+    finally:
+        if metricsWriter:
+            metricsWriter.stop()
+        for writer in (outputWriter, traceWriter):
+            if writer:
+                writer.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arguments: argparse.Namespace = parseArguments(argv)
+
+    if arguments.command != "gui":
+        return 0 if runCommand(arguments) else 1
+
+    if tk is None:
+        print("tkinter is not available, use one of the command line commands instead (see --help)", file=sys.stderr)
+        return 1
+
     rootWindow: tk.Tk = tk.Tk()
-    app: TaggerMenu = TaggerMenu(rootWindow)
+    TaggerMenu(rootWindow)  # Keeps itself alive through the widgets it adds to rootWindow
     rootWindow.mainloop()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
     """
     TODO / NEXT STEPS:
@@ -1,2 +1,25 @@
+import pytest
+
+
 def pytest_configure(config):
     config.addinivalue_line("markers", "e2e: mark as end-to-end test")
+    config.addinivalue_line(
+        "markers", "benchmark: mark as offline benchmark (see tests/fake_google.py)"
+    )
+
+
+@pytest.fixture(scope="module")
+def drive_tagger():
+    """api/drive-tagger.py, loaded once per test module (skips the test without the Google libraries)."""
+    from tests.fake_google import load_drive_tagger
+
+    return load_drive_tagger()
+
+
+@pytest.fixture
+def make_tagger(drive_tagger, tmp_path, monkeypatch):
+    """Makes DriveTaggers using the fakes (see make_fake_tagger()), with their databases in tmp_path."""
+    from tests.fake_google import make_fake_tagger
+
+    monkeypatch.chdir(tmp_path)
+    return lambda drive=None, gemini=None: make_fake_tagger(drive_tagger, drive, gemini)
@@ -0,0 +1,917 @@
+"""In-memory stand-ins for Google Drive v3 and the Gemini client, for offline benchmarks.
+
+FakeDrive implements the part of the Drive v3 service api/drive-tagger.py uses:
+files().list (with paging and the queries the tagger sends), get, get_media,
+export_media, update, copy and create, changes().list, drives().list (see
+add_shared_drive()), plus new_batch_http_request(). FakeGemini
+implements genai.Client's files.upload/delete and models.generate_content.
+
+Both can add latency to every round trip and fail a share of the calls with
+rate limit (429) or server (5xx) errors. make_synthetic_drive() fills a FakeDrive
+with a made-up Drive of any size.
+"""
+
+import importlib.util
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Test modules importing the fakes are skipped where the tagger's libraries aren't installed
+pytest.importorskip("googleapiclient.discovery")
+pytest.importorskip("google.genai")
+pytest.importorskip("dotenv")
+
+import httplib2  # noqa: E402
+from google.genai import errors as gemini_errors  # noqa: E402
+from google.genai import types as gemini_types  # noqa: E402
+from googleapiclient.errors import HttpError  # noqa: E402
+
+DRIVE_TAGGER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "api", "drive-tagger.py"
+)
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+# Exported as text by Drive, see googleExportFormats in drive-tagger.py
+GOOGLE_EXPORTABLE_TYPES = (
+    "application/vnd.google-apps.document",
+    "application/vnd.google-apps.spreadsheet",
+    "application/vnd.google-apps.presentation",
+    "application/vnd.google-apps.drawing",
+)
+GOOGLE_EXPORT_LIMIT = 10 * 1024 * 1024
+BATCH_LIMIT = 100
+# Tokens FakeGemini counts for each file in a prompt, what Gemini charges for an image
+FILE_TOKENS = 258
+
+# Synthetic content starts with this line, so FakeGemini knows the right answer
+CATEGORY_PATTERN = re.compile(rb"category: ([^\n]+)")
+
+
+def load_drive_tagger():
+    """Imports api/drive-tagger.py (not a valid module name) as a fresh module."""
+    spec = importlib.util.spec_from_file_location("drive_tagger", DRIVE_TAGGER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_fake_tagger(drive_tagger, drive=None, gemini=None):
+    """A DriveTagger using the fakes, without Gemini's rate limits, keeping its databases in the working directory."""
+    tagger = drive_tagger.DriveTagger()
+    if drive is not None:
+        tagger.getDriveService = (
+            lambda: drive
+        )  # The fake is safe to share between threads
+    tagger.geminiClient = gemini if gemini is not None else FakeGemini()
+    tagger.geminiRateLimiter = drive_tagger.GeminiRateLimiter(
+        drive_tagger.geminiModel, 10**9, 10**9, "benchmark-gemini-usage.json"
+    )
+    return tagger
+
+
+def http_error(status, reason, uri=None):
+    """An HttpError like the ones googleapiclient raises for a Drive error response."""
+    content = json.dumps(
+        {
+            "error": {
+                "code": status,
+                "message": reason,
+                "errors": [{"domain": "usageLimits", "reason": reason}],
+            }
+        }
+    ).encode()
+    return HttpError(
+        httplib2.Response({"status": status, "reason": reason}), content, uri
+    )
+
+
+class FaultInjector:
+    """Adds latency to calls and fails a share of them, the same way for every fake."""
+
+    def __init__(
+        self,
+        latency=0.0,
+        rate_limit_rate=0.0,
+        server_error_rate=0.0,
+        faulty_calls=None,
+        seed=0,
+    ):
+        self.latency = latency  # Seconds per round trip
+        self.rate_limit_rate = rate_limit_rate  # Share of calls failing with a 429
+        self.server_error_rate = server_error_rate  # Share of calls failing with a 5xx
+        # Names of the calls that may fail (e.g. {"files.update"}), None for all of them
+        self.faulty_calls = faulty_calls
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def pick_fault(self, call_name):
+        """Returns None, "rate_limit" or "server_error" for a call."""
+        if self.faulty_calls is not None and call_name not in self.faulty_calls:
+            return None
+        with self.lock:
+            draw = self.random.random()
+        if draw < self.rate_limit_rate:
+            return "rate_limit"
+        if draw < self.rate_limit_rate + self.server_error_rate:
+            return "server_error"
+        return None
+
+
+class FakeFile:
+    """A file (or folder) in a FakeDrive. The content is only made up when downloaded."""
+
+    __slots__ = (
+        "id",
+        "name",
+        "mime_type",
+        "parents",
+        "created_time",
+        "modified_time",
+        "properties",
+        "content_seed",
+        "size",
+        "category",
+        "shared_with_me",
+    )
+
+    def __init__(
+        self,
+        file_id,
+        name,
+        mime_type,
+        parents,
+        created_time,
+        modified_time=None,
+        properties=None,
+        content_seed=0,
+        size=0,
+        category="Uncategorized",
+        shared_with_me=False,
+    ):
+        self.id = file_id
+        self.name = name
+        self.mime_type = mime_type
+        self.parents = list(parents)
+        self.created_time = created_time
+        # Set by hand when the content is edited, writing properties doesn't change it
+        self.modified_time = modified_time or created_time
+        self.properties = dict(properties or {})
+        self.content_seed = (
+            content_seed  # Files with the same seed and size have the same content
+        )
+        self.size = size
+        self.category = category  # What Gemini should answer for this content
+        # Shared by another user, found by "sharedWithMe = true" wherever it is
+        self.shared_with_me = shared_with_me
+
+    def content(self):
+        header = f"category: {self.category}\nseed: {self.content_seed}\n".encode()
+        return header + b"x" * max(0, self.size - len(header))
+
+    def metadata(self):
+        item = {
+            "id": self.id,
+            "name": self.name,
+            "mimeType": self.mime_type,
+            "parents": list(self.parents),
+            "createdTime": self.created_time,
+            "modifiedTime": self.modified_time,
+            "trashed": False,
+        }
+        if self.properties:
+            item["properties"] = dict(self.properties)
+        # Google Docs and folders have no checksum or size
+        if not self.mime_type.startswith("application/vnd.google-apps."):
+            item["md5Checksum"] = f"{self.content_seed:032x}"
+            item["size"] = str(self.size)
+        return item
+
+
+class FakeRequest:
+    """What FakeDrive's methods return, sent with execute() or in a batch."""
+
+    def __init__(self, drive, call_name, handler, uri=None):
+        self.drive = drive
+        self.call_name = call_name
+        self.handler = handler
+        # What googleapiclient calls the method, e.g. "drive.files.list"
+        self.methodId = f"drive.{call_name}"
+        # Used by googleapiclient's MediaIoBaseDownload for get_media and export_media
+        self.uri = uri or f"https://fake.googleapis.com/drive/v3/{call_name}"
+        self.headers = {}
+        self.http = FakeMediaHttp(drive, call_name, handler) if uri else None
+
+    def execute(self, num_retries=0, **kwargs):
+        self.drive.count_round_trip()
+        self.drive.faults.wait()
+        return self.drive.run_call(self.call_name, self.handler)
+
+
+class FakeMediaHttp:
+    """The httplib2.Http of a media request: answers MediaIoBaseDownload's ranged GETs."""
+
+    def __init__(self, drive, call_name, handler):
+        self.drive = drive
+        self.call_name = call_name
+        self.handler = handler
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        self.drive.count_round_trip()
+        self.drive.faults.wait()
+        try:
+            content = self.drive.run_call(self.call_name, self.handler)
+        except HttpError as error:
+            return error.resp, error.content
+
+        start, end = 0, len(content) - 1
+        match = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get("range", ""))
+        if match:
+            start, end = int(match[1]), min(int(match[2]), len(content) - 1)
+        chunk = content[start : end + 1]
+        content_range = f"bytes {start}-{max(start, end)}/{len(content)}"
+        return httplib2.Response({"status": 206, "content-range": content_range}), chunk
+
+
+class FakeBatch:
+    """A batch request: one round trip, however many requests are in it."""
+
+    def __init__(self, drive, callback=None):
+        self.drive = drive
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self.requests) >= BATCH_LIMIT:
+            raise ValueError(
+                f"Exceeded maximum calls ({BATCH_LIMIT}) in a batch request"
+            )
+        self.requests.append((str(request_id or len(self.requests)), request, callback))
+
+    def execute(self, http=None):
+        self.drive.count_round_trip()
+        self.drive.calls["batch"] += 1
+        self.drive.faults.wait()
+        for request_id, request, callback in self.requests:
+            try:
+                response, error = (
+                    self.drive.run_call(request.call_name, request.handler),
+                    None,
+                )
+            except HttpError as caught:
+                response, error = None, caught
+            (callback or self.callback)(request_id, response, error)
+
+
+class FakeDrive:
+    """An in-memory Drive: behaves like build("drive", "v3", ...) for the calls the tagger makes.
+
+    calls counts API calls by name (e.g. "files.list"), round_trips counts HTTP requests
+    (a batch of 100 updates is 100 calls but 1 round trip). It is safe to share between threads.
+    """
+
+    def __init__(self, faults=None):
+        self.faults = faults or FaultInjector()
+        self.files_by_id = {}
+        self.children = {}  # Folder ID -> IDs of the files in it
+        self.ids = itertools.count(1)
+        self.lock = threading.RLock()
+        self.calls = Counter()
+        self.round_trips = 0
+        self.listings = {}  # Page token -> (matching file IDs, offset)
+        # IDs of the files (and shared drives) added or changed, in order
+        self.change_log = []
+        self.shared_drives = (
+            {}
+        )  # Shared drive ID -> name, its files have it as their parent
+
+    # ------- Building the drive -------
+
+    def add_file(self, name, mime_type="text/plain", parents=("root",), **kwargs):
+        with self.lock:
+            file_id = f"file{next(self.ids)}"
+            kwargs.setdefault("created_time", "2020-05-01T12:00:00.000Z")
+            fake_file = FakeFile(file_id, name, mime_type, parents, **kwargs)
+            self.files_by_id[file_id] = fake_file
+            for parent_id in fake_file.parents:
+                self.children.setdefault(parent_id, []).append(file_id)
+            self.change_log.append(file_id)
+            return fake_file
+
+    def add_folder(self, name, parents=("root",)):
+        return self.add_file(name, FOLDER_MIME_TYPE, parents)
+
+    def add_shared_drive(self, name):
+        """Adds a shared drive and returns its ID, to use as the parent of its files."""
+        with self.lock:
+            drive_id = f"drive{next(self.ids)}"
+            self.shared_drives[drive_id] = name
+            self.change_log.append(drive_id)
+            return drive_id
+
+    # ------- Accounting and faults -------
+
+    def count_round_trip(self):
+        with self.lock:
+            self.round_trips += 1
+
+    def run_call(self, call_name, handler):
+        with self.lock:
+            self.calls[call_name] += 1
+        fault = self.faults.pick_fault(call_name)
+        if fault == "rate_limit":
+            raise http_error(429, "rateLimitExceeded")
+        if fault == "server_error":
+            raise http_error(503, "backendError")
+        return handler()
+
+    def get_file(self, file_id):
+        fake_file = self.files_by_id.get(file_id)
+        if fake_file is None:
+            raise http_error(404, "notFound")
+        return fake_file
+
+    # ------- The Drive v3 service -------
+
+    def files(self):
+        return self
+
+    def changes(self):
+        return FakeChanges(self)
+
+    def drives(self):
+        return FakeSharedDrives(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def list(self, q=None, pageSize=100, pageToken=None, fields=None, **kwargs):
+        return FakeRequest(
+            self,
+            "files.list",
+            lambda: self.list_page(q, min(pageSize, 1000), pageToken),
+        )
+
+    def list_page(self, query, page_size, page_token):
+        with self.lock:
+            if page_token:
+                file_ids, offset = self.listings.pop(page_token)
+            else:
+                file_ids, offset = self.search(query), 0
+            page = file_ids[offset : offset + page_size]
+            response = {
+                "files": [self.files_by_id[file_id].metadata() for file_id in page]
+            }
+            if offset + page_size < len(file_ids):
+                next_token = f"page{next(self.ids)}"
+                self.listings[next_token] = (file_ids, offset + page_size)
+                response["nextPageToken"] = next_token
+            return response
+
+    def get(self, fileId, fields=None, **kwargs):
+        return FakeRequest(self, "files.get", lambda: self.get_file(fileId).metadata())
+
+    def get_media(self, fileId, **kwargs):
+        def download():
+            fake_file = self.get_file(fileId)
+            if fake_file.mime_type.startswith("application/vnd.google-apps."):
+                raise http_error(403, "fileNotDownloadable")
+            return fake_file.content()
+
+        return FakeRequest(self, "files.get_media", download, uri=f"media/{fileId}")
+
+    def export_media(self, fileId, mimeType, **kwargs):
+        def export():
+            fake_file = self.get_file(fileId)
+            if fake_file.mime_type not in GOOGLE_EXPORTABLE_TYPES:
+                raise http_error(400, "fileNotExportable")
+            if fake_file.size > GOOGLE_EXPORT_LIMIT:
+                raise http_error(403, "exportSizeLimitExceeded")
+            return fake_file.content()
+
+        return FakeRequest(self, "files.export_media", export, uri=f"export/{fileId}")
+
+    def update(self, fileId, body=None, addParents=None, removeParents=None, **kwargs):
+        def update_file():
+            with self.lock:
+                fake_file = self.get_file(fileId)
+                for key, value in ((body or {}).get("properties") or {}).items():
+                    if value is None:
+                        fake_file.properties.pop(key, None)
+                    else:
+                        fake_file.properties[key] = value
+                if addParents or removeParents:
+                    removed = set((removeParents or "").split(","))
+                    for parent_id in removed & set(fake_file.parents):
+                        self.children[parent_id].remove(fileId)
+                    added = [p for p in (addParents or "").split(",") if p]
+                    for parent_id in added:
+                        self.children.setdefault(parent_id, []).append(fileId)
+                    fake_file.parents = [
+                        p for p in fake_file.parents if p not in removed
+                    ] + added
+                self.change_log.append(fileId)
+                return fake_file.metadata()
+
+        return FakeRequest(self, "files.update", update_file)
+
+    def copy(self, fileId, body=None, **kwargs):
+        def copy_file():
+            source = self.get_file(fileId)
+            body_ = body or {}
+            return self.add_file(
+                body_.get("name", source.name),
+                source.mime_type,
+                body_.get("parents", source.parents),
+                created_time=source.created_time,
+                properties=body_.get("properties"),
+                content_seed=source.content_seed,
+                size=source.size,
+                category=source.category,
+            ).metadata()
+
+        return FakeRequest(self, "files.copy", copy_file)
+
+    def create(self, body=None, **kwargs):
+        def create_file():
+            body_ = body or {}
+            return self.add_file(
+                body_["name"],
+                body_.get("mimeType", "application/octet-stream"),
+                body_.get("parents", ["root"]),
+                created_time=datetime.now(timezone.utc).isoformat(),
+            ).metadata()
+
+        return FakeRequest(self, "files.create", create_file)
+
+    # ------- Queries -------
+
+    def search(self, query):
+        """Returns the IDs of the files matching a Drive query, in creation order."""
+        clauses = split_query(query, " and ") if query else []
+        candidates = None
+        for clause in clauses:
+            parent_ids = parents_clause(clause)
+            if parent_ids is not None:
+                candidate_set = {
+                    c for p in parent_ids for c in self.children.get(p, [])
+                }
+                candidates = sorted(candidate_set, key=lambda i: int(i[4:]))
+                # Every candidate matches this clause already
+                clauses = [other for other in clauses if other is not clause]
+                break
+        if candidates is None:
+            candidates = list(self.files_by_id)
+
+        matchers = [compile_clause(clause) for clause in clauses]
+        return [
+            file_id
+            for file_id in candidates
+            if all(matches(self.files_by_id[file_id]) for matches in matchers)
+        ]
+
+
+class FakeChanges:
+    """The change log of a FakeDrive, a page token is a position in FakeDrive.change_log."""
+
+    def __init__(self, drive):
+        self.drive = drive
+
+    def getStartPageToken(self, **kwargs):
+        return FakeRequest(
+            self.drive,
+            "changes.getStartPageToken",
+            lambda: {"startPageToken": str(len(self.drive.change_log))},
+        )
+
+    def list(self, pageToken=None, pageSize=100, fields=None, **kwargs):
+        return FakeRequest(
+            self.drive,
+            "changes.list",
+            lambda: self.list_page(int(pageToken), min(pageSize, 1000)),
+        )
+
+    def list_page(self, start, page_size):
+        with self.drive.lock:
+            changed_ids = self.drive.change_log[start : start + page_size]
+            response = {
+                "changes": [self.change(changed_id) for changed_id in changed_ids]
+            }
+            if start + page_size < len(self.drive.change_log):
+                response["nextPageToken"] = str(start + page_size)
+            else:
+                response["newStartPageToken"] = str(len(self.drive.change_log))
+            return response
+
+    def change(self, changed_id):
+        if changed_id in self.drive.shared_drives:
+            # A change to the shared drive itself has no fileId
+            return {
+                "changeType": "drive",
+                "driveId": changed_id,
+                "removed": False,
+                "drive": {
+                    "id": changed_id,
+                    "name": self.drive.shared_drives[changed_id],
+                },
+            }
+        return {
+            "changeType": "file",
+            "fileId": changed_id,
+            "removed": False,
+            "file": self.drive.files_by_id[changed_id].metadata(),
+        }
+
+
+class FakeSharedDrives:
+    """drives().list of a FakeDrive, all shared drives fit on one page."""
+
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, pageSize=10, pageToken=None, fields=None, **kwargs):
+        def list_drives():
+            with self.drive.lock:
+                return {
+                    "drives": [
+                        {"id": drive_id, "name": name}
+                        for drive_id, name in self.drive.shared_drives.items()
+                    ]
+                }
+
+        return FakeRequest(self.drive, "drives.list", list_drives)
+
+
+def split_query(query, separator):
+    """Splits a query on separator, but not inside quotes, braces or brackets."""
+    parts, depth, quoted, start, index = [], 0, False, 0, 0
+    while index < len(query):
+        char = query[index]
+        if quoted:
+            if char == "\\":
+                index += 1
+            elif char == "'":
+                quoted = False
+        elif char == "'":
+            quoted = True
+        elif char in "({":
+            depth += 1
+        elif char in ")}":
+            depth -= 1
+        elif depth == 0 and query.startswith(separator, index):
+            parts.append(query[start:index].strip())
+            start = index + len(separator)
+            index = start
+            continue
+        index += 1
+    parts.append(query[start:].strip())
+    return parts
+
+
+def unquote(value):
+    return value.replace("\\'", "'").replace("\\\\", "\\")
+
+
+QUOTED = r"'((?:[^'\\]|\\.)*)'"
+
+
+def parents_clause(clause):
+    """The folder IDs of "'id' in parents" (or several of them joined with or), else None."""
+    if clause.startswith("(") and clause.endswith(")"):
+        parent_ids = [
+            parents_clause(part) for part in split_query(clause[1:-1], " or ")
+        ]
+        if all(parent_ids):
+            return [parent_id for ids in parent_ids for parent_id in ids]
+        return None
+    match = re.fullmatch(QUOTED + r"\s+in\s+parents", clause)
+    return [unquote(match[1])] if match else None
+
+
+def compile_clause(clause):
+    """Turns one clause of a Drive query into a function of a FakeFile."""
+    if clause.startswith("(") and clause.endswith(")"):
+        options = [compile_clause(part) for part in split_query(clause[1:-1], " or ")]
+        return lambda fake_file: any(option(fake_file) for option in options)
+
+    match = re.fullmatch(
+        r"not properties has \{ key=" + QUOTED + r" and value=" + QUOTED + r" \}",
+        clause,
+    )
+    if match:
+        key, value = unquote(match[1]), unquote(match[2])
+        return lambda fake_file: fake_file.properties.get(key) != value
+
+    match = re.fullmatch(r"(mimeType|name)\s*(=|!=)\s*" + QUOTED, clause)
+    if match:
+        field, equal, value = match[1], match[2] == "=", unquote(match[3])
+        attribute = "mime_type" if field == "mimeType" else "name"
+        return lambda fake_file: (getattr(fake_file, attribute) == value) == equal
+
+    match = re.fullmatch(QUOTED + r"\s+in\s+parents", clause)
+    if match:
+        parent_id = unquote(match[1])
+        return lambda fake_file: parent_id in fake_file.parents
+
+    if re.fullmatch(r"sharedWithMe\s*=\s*true", clause):
+        return lambda fake_file: fake_file.shared_with_me
+
+    if re.fullmatch(r"trashed\s*=\s*false", clause):
+        return lambda fake_file: True  # Nothing in a FakeDrive is trashed
+
+    raise ValueError(f"FakeDrive doesn't understand the query clause: {clause}")
+
+
+class FakeGemini:
+    """Stands in for genai.Client: client.files.upload/delete and client.models.generate_content.
+
+    Answers with the category written at the start of each synthetic file, as plain text
+    for a single file or as JSON ({"1": category, ...}) when asked for JSON.
+    """
+
+    def __init__(self, faults=None):
+        self.faults = faults or FaultInjector()
+        self.files = self
+        self.models = self
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.uploads = {}  # Uploaded file name -> content
+        self.upload_ids = itertools.count(1)
+
+    def count_call(self, call_name):
+        with self.lock:
+            self.calls[call_name] += 1
+        self.faults.wait()
+        fault = self.faults.pick_fault(call_name)
+        if fault == "rate_limit":
+            raise gemini_errors.ClientError(
+                429,
+                {
+                    "error": {
+                        "code": 429,
+                        "message": "Quota exceeded for GenerateRequestsPerMinutePerProjectPerModel",
+                        "status": "RESOURCE_EXHAUSTED",
+                    }
+                },
+            )
+        if fault == "server_error":
+            raise gemini_errors.ServerError(
+                503,
+                {
+                    "error": {
+                        "code": 503,
+                        "message": "The model is overloaded.",
+                        "status": "UNAVAILABLE",
+                    }
+                },
+            )
+
+    # ------- client.files -------
+
+    def upload(self, file=None, config=None, **kwargs):
+        self.count_call("files.upload")
+        with open(file, "rb") as uploaded_file:
+            content = uploaded_file.read()
+        name = f"files/{next(self.upload_ids)}"
+        with self.lock:
+            self.uploads[name] = content
+        return gemini_types.File(
+            name=name,
+            uri=f"https://fake.googleapis.com/v1beta/{name}",
+            mime_type=(config or {}).get("mime_type"),
+            size_bytes=len(content),
+            expiration_time=datetime.now(timezone.utc) + timedelta(hours=48),
+        )
+
+    def delete(self, name=None, **kwargs):
+        self.count_call("files.delete")
+        with self.lock:
+            self.uploads.pop(name, None)
+
+    # ------- client.models -------
+
+    def generate_content(self, model=None, contents=None, config=None, **kwargs):
+        self.count_call("models.generate_content")
+        categories = [
+            self.category_of(part) for part in contents if not isinstance(part, str)
+        ]
+        wants_json = (config or {}).get("response_mime_type") == "application/json"
+        text = (
+            json.dumps(
+                {str(number): tag for number, tag in enumerate(categories, start=1)}
+            )
+            if wants_json
+            else (categories[0] if categories else "Uncategorized") + "\n"
+        )
+        # Roughly what Gemini charges: 4 characters of text per token, 258 per file
+        prompt_tokens = sum(
+            len(part) // 4 if isinstance(part, str) else FILE_TOKENS
+            for part in contents
+        )
+        candidates_tokens = len(text) // 4 + 1
+        return gemini_types.GenerateContentResponse(
+            candidates=[
+                gemini_types.Candidate(
+                    content=gemini_types.Content(
+                        role="model", parts=[gemini_types.Part(text=text)]
+                    )
+                )
+            ],
+            usage_metadata=gemini_types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=candidates_tokens,
+                total_token_count=prompt_tokens + candidates_tokens,
+            ),
+        )
+
+    def category_of(self, part):
+        content = b""
+        if isinstance(part, gemini_types.Part) and part.inline_data:
+            content = part.inline_data.data
+        else:
+            name = getattr(part, "name", None)
+            if isinstance(part, gemini_types.Part) and part.file_data:
+                name = part.file_data.file_uri.rsplit("/v1beta/", 1)[-1]
+            with self.lock:
+                content = self.uploads.get(name, b"")
+        match = CATEGORY_PATTERN.search(content[:200])
+        return match[1].decode() if match else "Uncategorized"
+
+
+# ------- Synthetic drives -------
+
+# (category, folder, name templates) that the keyword rules can mostly recognize
+NAMED_FILES = (
+    (
+        "Accounting",
+        "Finance",
+        ("Invoice {n}", "Budget FY{yy}", "Payroll {month} {year}"),
+    ),
+    ("Curation", "Collections", ("Accession log {n}", "Condition report {n}")),
+    (
+        "Development (contributed revenue generation)",
+        "Development",
+        ("Donor list {year}", "Grant application {n}"),
+    ),
+    (
+        "Employee resources (HR)",
+        "HR",
+        ("Timesheet {month}", "Employee handbook {year}"),
+    ),
+    ("Board of Directors", "Board", ("Board minutes {month} {year}", "Bylaws {year}")),
+    ("Marketing", "Marketing", ("Newsletter {month} {year}", "Press release {n}")),
+    ("Operations", "Operations", ("Work order {n}", "Insurance certificate {year}")),
+    ("Programming", "Education", ("Lesson plan {n}", "Tour script {n}")),
+    ("Research (historic info)", "Research", ("Census excerpt {n}", "Obituary {n}")),
+)
+# Files whose names give nothing away, so they need Gemini
+GENERIC_NAMES = (
+    "Scan{n}",
+    "IMG_{n}",
+    "Untitled document {n}",
+    "notes {n}",
+    "Document {n}",
+)
+# (MIME type, extension, share of the files, typical size in bytes)
+FILE_TYPES = (
+    ("application/pdf", ".pdf", 0.35, 200_000),
+    (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        ".docx",
+        0.18,
+        60_000,
+    ),
+    (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        ".xlsx",
+        0.08,
+        40_000,
+    ),
+    ("image/jpeg", ".jpg", 0.15, 1_500_000),
+    ("text/plain", ".txt", 0.06, 4_000),
+    ("application/vnd.google-apps.document", "", 0.08, 20_000),
+    ("application/vnd.google-apps.spreadsheet", "", 0.03, 20_000),
+    ("application/zip", ".zip", 0.05, 3_000_000),
+    ("video/mp4", ".mp4", 0.02, 8_000_000),
+)
+MONTHS = (
+    "January",
+    "February",
+    "March",
+    "April",
+    "May",
+    "June",
+    "July",
+    "August",
+    "September",
+    "October",
+    "November",
+    "December",
+)
+
+
+def tags_by_file(drive):
+    """The tag property of each file (not folder) of a FakeDrive, None where it has none."""
+    return {
+        file_id: fake_file.properties.get("tag")
+        for file_id, fake_file in drive.files_by_id.items()
+        if fake_file.mime_type != FOLDER_MIME_TYPE
+    }
+
+
+def make_synthetic_drive(
+    file_count,
+    seed=0,
+    named_rate=0.5,
+    duplicate_rate=0.1,
+    tagged_rate=0.0,
+    max_size=None,
+    faults=None,
+):
+    """Fills a FakeDrive with file_count files (plus folders) looking like a small nonprofit's Drive.
+
+    Args:
+        file_count: Number of files, not counting folders.
+        seed: Same seed, same drive.
+        named_rate: Share of files with a telling name (in a telling folder).
+        duplicate_rate: Share of files with the same content as an earlier file.
+        tagged_rate: Share of files that already have a 'tag' property.
+        max_size: Upper limit on file sizes in bytes, if any.
+        faults: FaultInjector for the drive.
+
+    Returns:
+        The FakeDrive.
+    """
+    rng = random.Random(seed)
+    drive = FakeDrive(faults)
+    department_folders = {
+        folder: drive.add_folder(folder).id
+        for folder in sorted(
+            {folder for _, folder, _ in NAMED_FILES} | {"Shared", "Scans"}
+        )
+    }
+    # About 200 files per sub-folder
+    sub_folders = {
+        name: [
+            drive.add_folder(f"{name} {index + 1}", [folder_id]).id
+            for index in range(max(1, file_count // (200 * len(department_folders))))
+        ]
+        for name, folder_id in department_folders.items()
+    }
+    type_weights = [share for _, _, share, _ in FILE_TYPES]
+    seen_contents = []
+
+    for number in range(file_count):
+        mime_type, extension, _, typical_size = rng.choices(FILE_TYPES, type_weights)[0]
+        created = datetime(2010, 1, 1) + timedelta(days=rng.randrange(15 * 365))
+
+        if rng.random() < named_rate:
+            category, folder, templates = rng.choice(NAMED_FILES)
+            name = rng.choice(templates)
+        else:
+            category, folder, templates = rng.choice(NAMED_FILES)
+            folder = rng.choice(("Shared", "Scans"))
+            name = rng.choice(GENERIC_NAMES)
+        name = (
+            name.format(
+                n=number,
+                yy=created.year % 100,
+                year=created.year,
+                month=MONTHS[created.month - 1],
+            )
+            + extension
+        )
+
+        if seen_contents and rng.random() < duplicate_rate:
+            content_seed, size, category = rng.choice(seen_contents)
+        else:
+            size = int(rng.expovariate(1 / typical_size)) + 100
+            if max_size:
+                size = min(size, max_size)
+            content_seed = number + 1
+            if len(seen_contents) < 10_000:
+                seen_contents.append((content_seed, size, category))
+
+        drive.add_file(
+            name,
+            mime_type,
+            [rng.choice(sub_folders[folder])],
+            created_time=created.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            properties={"tag": category} if rng.random() < tagged_rate else None,
+            content_seed=content_seed,
+            size=size,
+            category=category,
+        )
+
+    drive.calls.clear()
+    return drive
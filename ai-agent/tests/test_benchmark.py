@@ -0,0 +1,314 @@
+"""Offline benchmarks of api/drive-tagger.py against the fakes in tests/fake_google.py.
+
+Under pytest, small drives are tagged and organized to catch regressions in the
+number of API calls per file. Run as a module for bigger drives and a throughput report:
+
+    python -m tests.test_benchmark --files 1000 100000 --drive-latency 0.05
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import pytest
+
+pytest.importorskip("google_auth_oauthlib")
+
+from tests.fake_google import (  # noqa: E402
+    FOLDER_MIME_TYPE,
+    FakeGemini,
+    FaultInjector,
+    load_drive_tagger,
+    make_fake_tagger,
+    make_synthetic_drive,
+    tags_by_file,
+)
+
+
+@contextmanager
+def working_directory(path):
+    """The tagger keeps its databases in the working directory, so give it its own."""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def peak_rss_megabytes():
+    """Highest memory use of this process so far (ru_maxrss is in KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_benchmark(drive_tagger, action, drive, gemini, trace_files=False):
+    """Runs one action ("tag" or "organize") and returns its measurements."""
+    tagger = make_fake_tagger(drive_tagger, drive, gemini)
+    tagger.traceFiles = trace_files
+    file_count = sum(
+        fake_file.mime_type != FOLDER_MIME_TYPE
+        for fake_file in drive.files_by_id.values()
+    )
+
+    start = time.perf_counter()
+    succeeded = tagger.tagEachFile() if action == "tag" else tagger.organizeFiles()
+    seconds = time.perf_counter() - start
+
+    drive_calls = sum(drive.calls.values()) - drive.calls["batch"]
+    snapshot = tagger.metrics.snapshot()
+    return {
+        "action": action,
+        "files": file_count,
+        "succeeded": succeeded,
+        "seconds": round(seconds, 3),
+        "filesPerSecond": round(file_count / seconds, 1),
+        "driveCallsPerFile": round(drive_calls / file_count, 3),
+        "driveRoundTripsPerFile": round(drive.round_trips / file_count, 3),
+        "geminiCallsPerFile": round(sum(gemini.calls.values()) / file_count, 3),
+        "peakRssMegabytes": peak_rss_megabytes(),
+        "driveCalls": dict(drive.calls),
+        "geminiCalls": dict(gemini.calls),
+        "results": dict(snapshot["files"]),
+        # What the tagger counted itself
+        "apiCalls": snapshot["apiCalls"],
+        "geminiTokens": snapshot["geminiTokens"],
+        "costlyFiles": tagger.metrics.costlyFiles(),
+    }
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path):
+    with working_directory(tmp_path):
+        yield
+
+
+@pytest.mark.benchmark
+def test_tag_each_file_tags_every_file(drive_tagger):
+    drive = make_synthetic_drive(1000, max_size=200_000)
+    gemini = FakeGemini()
+
+    result = run_benchmark(drive_tagger, "tag", drive, gemini)
+
+    assert result["succeeded"]
+    assert all(tags_by_file(drive).values())
+    # Listing, downloading and one batched update per file, at most
+    assert result["driveCallsPerFile"] <= 2.2
+    assert result["driveRoundTripsPerFile"] <= 1.5
+    # Keyword rules, the TagCache and batching keep Gemini well below one request per file
+    assert gemini.calls["models.generate_content"] < 0.5 * result["files"]
+
+
+@pytest.mark.benchmark
+def test_tag_each_file_gets_the_categories_right(drive_tagger):
+    drive = make_synthetic_drive(300, named_rate=0.0, max_size=200_000)
+
+    run_benchmark(drive_tagger, "tag", drive, FakeGemini())
+
+    readable = [
+        fake_file
+        for fake_file in drive.files_by_id.values()
+        if fake_file.mime_type not in (FOLDER_MIME_TYPE, "application/zip")
+    ]
+    correct = sum(
+        fake_file.properties.get("tag") == fake_file.category for fake_file in readable
+    )
+    assert correct == len(readable)
+
+
+@pytest.mark.benchmark
+def test_tag_each_file_survives_injected_errors(drive_tagger, monkeypatch):
+    drive_faults = FaultInjector(
+        rate_limit_rate=0.05, faulty_calls={"files.update"}, seed=1
+    )
+    drive = make_synthetic_drive(500, max_size=200_000, faults=drive_faults)
+    gemini = FakeGemini(
+        FaultInjector(rate_limit_rate=0.05, server_error_rate=0.05, seed=2)
+    )
+    monkeypatch.setattr(drive_tagger, "backoffDelay", lambda *args, **kwargs: 0.0)
+
+    result = run_benchmark(drive_tagger, "tag", drive, gemini)
+
+    # Rate limited updates are retried, and Gemini errors are retried or left for the next run
+    assert result["results"].get("tag.failed", 0) == 0
+    untagged = [tag for tag in tags_by_file(drive).values() if not tag]
+    assert len(untagged) < 0.05 * result["files"]
+
+
+class RecordingByteBudget:
+    """Wraps a ByteBudget, remembering the most bytes it had reserved at once."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.peak_bytes = 0
+
+    def __getattr__(self, name):
+        return getattr(self.budget, name)
+
+    def reserve(self, num_bytes):
+        self.budget.reserve(num_bytes)
+        self.peak_bytes = max(self.peak_bytes, self.budget.usedBytes)
+
+
+@pytest.mark.benchmark
+def test_inline_files_hold_their_memory_until_classified(drive_tagger, monkeypatch):
+    drive = make_synthetic_drive(300, max_size=200_000)
+    # Room for a few inline files only, so downloads have to wait for classification
+    budget = RecordingByteBudget(drive_tagger.ByteBudget(1024 * 1024))
+    monkeypatch.setattr(drive_tagger, "downloadMemoryBudget", budget)
+
+    result = run_benchmark(drive_tagger, "tag", drive, FakeGemini())
+
+    assert result["succeeded"]
+    assert all(tags_by_file(drive).values())
+    assert 0 < budget.peak_bytes <= budget.totalBytes
+    # Every reservation was given back
+    assert budget.usedBytes == 0
+
+
+@pytest.mark.benchmark
+def test_tag_each_file_counts_every_api_call(drive_tagger):
+    drive = make_synthetic_drive(300, max_size=200_000)
+    gemini = FakeGemini()
+
+    result = run_benchmark(drive_tagger, "tag", drive, gemini, trace_files=True)
+
+    api_calls = result["apiCalls"]
+    for call_name in ("files.list", "files.update"):
+        assert api_calls[f"drive.{call_name}"]["calls"] == drive.calls[call_name]
+    downloads = sum(
+        api_calls.get(f"drive.files.{name}", {}).get("calls", 0)
+        for name in ("get_media", "export_media")
+    )
+    assert (
+        downloads == drive.calls["files.get_media"] + drive.calls["files.export_media"]
+    )
+    assert (
+        api_calls["gemini.models.generate_content"]["calls"]
+        == gemini.calls["models.generate_content"]
+    )
+    tokens = result["geminiTokens"]
+    assert 0 < tokens["prompt"] < tokens["total"]
+    # The slowest files are listed, each with the calls made for it
+    assert result["costlyFiles"]
+    assert all(cost["calls"] >= 1 for _, cost in result["costlyFiles"])
+
+
+@pytest.mark.benchmark
+def test_second_run_reads_only_the_change_log(drive_tagger):
+    drive = make_synthetic_drive(300, max_size=200_000)
+    gemini = FakeGemini()
+    run_benchmark(drive_tagger, "tag", drive, gemini)
+    drive.calls.clear()
+
+    # Tagging again and organizing keep the catalog up to date from the change log
+    tagger = make_fake_tagger(drive_tagger, drive, gemini)
+    assert tagger.tagEachFile()
+    assert tagger.organizeFiles()
+
+    # Only the lookup of the Organized-Drive-Files folder lists files
+    assert drive.calls["files.list"] == 1
+    assert drive.calls["changes.list"] >= 2
+    # The copies made by organizing are picked up by the next sync
+    assert tagger.syncCatalog() is not None
+    report = tagger.driveCatalog.report()
+    tags = tags_by_file(drive)
+    assert report["files"] == len(tags)
+    assert report["byTag"].get("untagged", 0) == sum(not tag for tag in tags.values())
+
+
+@pytest.mark.benchmark
+def test_organize_files_places_every_tagged_file(drive_tagger):
+    drive = make_synthetic_drive(1000, tagged_rate=1.0)
+    file_count = len(tags_by_file(drive))
+
+    result = run_benchmark(drive_tagger, "organize", drive, FakeGemini())
+
+    assert result["succeeded"]
+    # Files with the same name in the same Year/Month/Tag folder are skipped
+    results = result["results"]
+    assert results["copy.done"] + results.get("copy.skipped", 0) == file_count
+    assert drive.calls["files.copy"] == results["copy.done"]
+    # A few listings per level of folders plus batched copies, no per-file lookups
+    # (each new folder is one create)
+    assert drive.calls["files.list"] < 0.02 * file_count
+    assert drive.round_trips - drive.calls["files.create"] < 0.2 * file_count
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument(
+        "--actions", nargs="+", choices=["tag", "organize"], default=["tag", "organize"]
+    )
+    parser.add_argument(
+        "--drive-latency", type=float, default=0.0, help="Seconds per Drive round trip"
+    )
+    parser.add_argument(
+        "--gemini-latency", type=float, default=0.0, help="Seconds per Gemini call"
+    )
+    parser.add_argument(
+        "--rate-limit-rate",
+        type=float,
+        default=0.0,
+        help="Share of calls failing with a 429",
+    )
+    parser.add_argument(
+        "--server-error-rate",
+        type=float,
+        default=0.0,
+        help="Share of calls failing with a 5xx",
+    )
+    parser.add_argument(
+        "--max-size", type=int, default=None, help="Upper limit on file sizes in bytes"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="Append the results to this file, one JSON line each"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    drive_tagger = load_drive_tagger()
+
+    for file_count in arguments.files:
+        for action in arguments.actions:
+
+            def faults(latency, seed):
+                return FaultInjector(
+                    latency,
+                    arguments.rate_limit_rate,
+                    arguments.server_error_rate,
+                    seed=seed,
+                )
+
+            with tempfile.TemporaryDirectory() as workdir, working_directory(workdir):
+                drive = make_synthetic_drive(
+                    file_count,
+                    seed=arguments.seed,
+                    # Organizing needs tagged files
+                    tagged_rate=1.0 if action == "organize" else 0.0,
+                    max_size=arguments.max_size,
+                    faults=faults(arguments.drive_latency, arguments.seed + 1),
+                )
+                gemini = FakeGemini(
+                    faults(arguments.gemini_latency, arguments.seed + 2)
+                )
+                result = run_benchmark(drive_tagger, action, drive, gemini)
+
+            line = json.dumps(result)
+            print(line, flush=True)
+            if arguments.output:
+                with open(arguments.output, "a", encoding="utf-8") as output_file:
+                    output_file.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
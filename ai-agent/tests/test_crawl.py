@@ -0,0 +1,52 @@
+"""Listing the Drive into the catalog of api/drive-tagger.py: crawlFiles and syncCatalog."""
+
+from tests.fake_google import FOLDER_MIME_TYPE, make_synthetic_drive
+
+
+def test_sync_catalog_skips_changes_to_shared_drives(make_tagger):
+    drive = make_synthetic_drive(100)
+    tagger = make_tagger(drive)
+    assert tagger.syncCatalog() is not None
+
+    shared_drive_id = drive.add_shared_drive("Board")
+    minutes = drive.add_file("2024 minutes.pdf", "application/pdf", [shared_drive_id])
+
+    assert tagger.syncCatalog() is not None
+    assert tagger.driveCatalog.getFile(minutes.id)
+    assert tagger.driveCatalog.getPageToken() == str(len(drive.change_log))
+
+
+def test_crawl_files_lists_every_file_once(make_tagger):
+    drive = make_synthetic_drive(2000)
+    folders = [
+        fake_file
+        for fake_file in drive.files_by_id.values()
+        if fake_file.mime_type == FOLDER_MIME_TYPE
+    ]
+    shared_drive_id = drive.add_shared_drive("Board")
+    minutes = drive.add_folder("Minutes", [shared_drive_id])
+    drive.add_file("2024 minutes.pdf", "application/pdf", [minutes.id])
+    drive.add_file("budget.xlsx", parents=[folders[0].id, folders[-1].id])
+    # Shared from a folder of another user
+    drive.add_file("notes.txt", parents=["elsewhere"], shared_with_me=True)
+
+    tagger = make_tagger(drive)
+    crawled = [item["id"] for item in tagger.crawlFiles("id, mimeType, parents")]
+
+    assert sorted(crawled) == sorted(drive.files_by_id)
+    # Folders are listed in groups, not one listing each
+    assert drive.calls["files.list"] < len(folders)
+
+
+def test_orphaned_files_join_the_catalog_once_they_change(make_tagger):
+    drive = make_synthetic_drive(100)
+    orphan = drive.add_file("Lost minutes.pdf", "application/pdf", parents=[])
+    tagger = make_tagger(drive)
+    assert tagger.syncCatalog() is not None
+    # In no folder, so the crawl can't find it
+    assert tagger.driveCatalog.getFile(orphan.id) is None
+
+    drive.change_log.append(orphan.id)
+
+    assert tagger.syncCatalog() == {orphan.id}
+    assert tagger.driveCatalog.getFile(orphan.id)
@@ -0,0 +1,59 @@
+"""Sending Drive requests with api/drive-tagger.py's DriveRequestBatcher."""
+
+
+class Request:
+    methodId = "drive.files.update"
+
+
+class InterruptedBatch:
+    """A batch whose connection drops after Drive answered the first answered_count requests."""
+
+    def __init__(self, answered_count):
+        self.answered_count = answered_count
+        self.callbacks = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.callbacks.append(callback)
+
+    def execute(self, http=None):
+        for number, callback in enumerate(self.callbacks[: self.answered_count]):
+            callback(str(number), {"id": f"file{number}"}, None)
+        raise ConnectionResetError("Connection reset by peer")
+
+
+class Service:
+    def __init__(self, batch):
+        self.batch = batch
+
+    def new_batch_http_request(self, callback=None):
+        return self.batch
+
+
+def test_batch_failing_midway_answers_each_request_once(drive_tagger):
+    answers = []
+    api_calls = []
+    batcher = drive_tagger.DriveRequestBatcher(
+        Service(InterruptedBatch(answered_count=2)),
+        onApiCall=lambda endpoint, seconds, size, error, file_id: api_calls.append(
+            (file_id, error is None)
+        ),
+    )
+    for number in range(5):
+        batcher.add(
+            Request(),
+            lambda response, error, number=number: answers.append(
+                (number, error is None)
+            ),
+            f"file{number}",
+        )
+
+    batcher.flush()
+
+    assert sorted(answers) == [(0, True), (1, True), (2, False), (3, False), (4, False)]
+    assert sorted(api_calls) == [
+        ("file0", True),
+        ("file1", True),
+        ("file2", False),
+        ("file3", False),
+        ("file4", False),
+    ]
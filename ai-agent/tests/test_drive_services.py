@@ -0,0 +1,46 @@
+"""DriveServicePool of api/drive-tagger.py: Drive services kept alive between threads and runs."""
+
+import threading
+import time
+
+from tests.fake_google import make_synthetic_drive
+
+
+def test_organize_files_reuses_drive_services_between_runs(drive_tagger, make_tagger):
+    drive = make_synthetic_drive(300, tagged_rate=1.0)
+    tagger = make_tagger(drive)
+    del tagger.getDriveService  # Lease services from the pool, as with real credentials
+    tagger.driveServicePool = drive_tagger.DriveServicePool(None)
+    tagger.driveServicePool.buildService = lambda: drive
+
+    for _ in range(3):
+        assert tagger.organizeFiles()
+
+    # New worker threads in each run take over the services of the last run's threads
+    assert tagger.driveServicePool.builtCount <= tagger.organizeWorkerCount + 1
+
+
+class ExpiredCredentials:
+    """Credentials that take a while to refresh, counting how often they were."""
+
+    def __init__(self):
+        self.valid = False
+        self.refresh_count = 0
+
+    def refresh(self, request):
+        time.sleep(0.05)
+        self.refresh_count += 1
+        self.valid = True
+
+
+def test_drive_service_pool_refreshes_credentials_once(drive_tagger):
+    credentials = ExpiredCredentials()
+    pool = drive_tagger.DriveServicePool(credentials)
+
+    threads = [threading.Thread(target=pool.refreshCredentials) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert credentials.refresh_count == 1
@@ -0,0 +1,95 @@
+"""Exporting Google Docs, Sheets, Slides and Drawings for Gemini in api/drive-tagger.py."""
+
+import pytest
+
+from tests.fake_google import GOOGLE_EXPORT_LIMIT, FakeDrive
+
+
+class ExportRecordingDrive(FakeDrive):
+    """A FakeDrive remembering the format each file was exported to."""
+
+    def __init__(self):
+        super().__init__()
+        self.export_formats = {}
+
+    def export_media(self, fileId, mimeType, **kwargs):
+        self.export_formats[fileId] = mimeType
+        return super().export_media(fileId, mimeType, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def download_memory_budget(drive_tagger, monkeypatch):
+    # Inline exports hold part of the budget until they are classified, which these tests don't get to
+    monkeypatch.setattr(
+        drive_tagger, "downloadMemoryBudget", drive_tagger.ByteBudget(10**6)
+    )
+
+
+def download(drive_tagger, tagger, fake_file):
+    job = drive_tagger.TaggingJob(fake_file.id, fake_file.mime_type)
+    return tagger.downloadFileForGemini(job)
+
+
+def test_every_export_format_is_one_gemini_reads(drive_tagger):
+    for native_type, export_type in drive_tagger.googleExportFormats.items():
+        assert drive_tagger.fileStrategies[native_type] == "export"
+        assert drive_tagger.fileStrategies[export_type] == "inline"
+        assert drive_tagger.fileExtensions[export_type]
+
+
+@pytest.mark.parametrize(
+    "native_type, export_type",
+    [
+        ("application/vnd.google-apps.document", "text/plain"),
+        ("application/vnd.google-apps.spreadsheet", "text/csv"),
+        ("application/vnd.google-apps.presentation", "application/pdf"),
+    ],
+)
+def test_small_exports_are_sent_inline(
+    drive_tagger, make_tagger, native_type, export_type
+):
+    drive = ExportRecordingDrive()
+    fake_file = drive.add_file("Minutes", native_type, size=2000)
+    tagger = make_tagger(drive)
+
+    job = download(drive_tagger, tagger, fake_file)
+
+    assert drive.export_formats == {fake_file.id: export_type}
+    assert job.tagValue is None
+    # From here on the job is about the exported file
+    assert job.mimeType == export_type
+    assert job.fileBytes == fake_file.content()
+    assert job.tempFilePath is None
+
+
+def test_exports_drive_refuses_are_uncategorized(drive_tagger, make_tagger):
+    drive = FakeDrive()
+    fake_file = drive.add_file(
+        "Scans",
+        "application/vnd.google-apps.presentation",
+        size=GOOGLE_EXPORT_LIMIT + 1,
+    )
+    tagger = make_tagger(drive)
+
+    job = download(drive_tagger, tagger, fake_file)
+
+    assert job.tagValue == "Uncategorized"
+    # Drive won't export it on the next run either, so it isn't journaled as failed
+    assert tagger.runJournal.failures("tag") == []
+
+
+def test_exports_over_the_size_limit_are_uncategorized(
+    drive_tagger, make_tagger, monkeypatch
+):
+    monkeypatch.setattr(drive_tagger, "googleExportMaxBytes", 1000)
+    drive = FakeDrive()
+    fake_file = drive.add_file(
+        "Budget", "application/vnd.google-apps.spreadsheet", size=5000
+    )
+    tagger = make_tagger(drive)
+
+    job = download(drive_tagger, tagger, fake_file)
+
+    assert job.tagValue == "Uncategorized"
+    assert job.tempFilePath is None
+    assert job.fileBytes is None
@@ -0,0 +1,33 @@
+"""The MIME type lookup tables of api/drive-tagger.py (fileStrategies and fileExtensions)."""
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "mime_type, strategy, extension",
+    [
+        ("application/pdf", "inline", ".pdf"),
+        # The mimetypes module maps these oddly (or not at all) on some systems
+        ("image/webp", "inline", ".webp"),
+        ("image/heic", "inline", ".heic"),
+        ("image/pjpeg", "inline", ".jpg"),
+        ("video/mp4", "upload", ".mp4"),
+        ("application/vnd.google-apps.document", "export", None),
+        ("application/vnd.google-apps.folder", "skip", None),
+        ("application/vnd.google-apps.shortcut", "skip", None),
+    ],
+)
+def test_strategy_and_extension(drive_tagger, mime_type, strategy, extension):
+    assert drive_tagger.fileStrategies[mime_type] == strategy
+    assert drive_tagger.fileExtensions.get(mime_type) == extension
+
+
+def test_unknown_types_are_skipped(drive_tagger):
+    job = drive_tagger.TaggingJob("file1", "application/x-unknown-format")
+
+    assert job.strategy == "skip"
+
+
+def test_tables_are_read_only(drive_tagger):
+    with pytest.raises(TypeError):
+        drive_tagger.fileStrategies["application/x-unknown-format"] = "inline"
@@ -0,0 +1,171 @@
+"""Gemini requests of api/drive-tagger.py: retries, the daily request budget and batches of files."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.fake_google import gemini_errors
+
+
+class FailingGemini:
+    """Stands in for genai.Client, failing with each of errors in turn, then answering "Curation"."""
+
+    def __init__(self, *errors):
+        self.models = self
+        self.errors = list(errors)
+        self.calls = 0
+
+    def generate_content(self, model=None, contents=None, config=None, **kwargs):
+        self.calls += 1
+        if self.errors:
+            status, reason = self.errors.pop(0)
+            error_class = (
+                gemini_errors.ClientError if status < 500 else gemini_errors.ServerError
+            )
+            raise error_class(
+                status, {"error": {"code": status, "message": reason, "status": reason}}
+            )
+        return type("Response", (), {"text": "Curation\n", "usage_metadata": None})()
+
+
+@pytest.fixture
+def make_limited_tagger(drive_tagger, make_tagger, monkeypatch):
+    """Like make_tagger, with 200 Gemini requests a day and retries that don't wait."""
+    monkeypatch.setattr(drive_tagger, "backoffDelay", lambda *args, **kwargs: 0.0)
+
+    def make(gemini):
+        tagger = make_tagger(gemini=gemini)
+        tagger.geminiRateLimiter = drive_tagger.GeminiRateLimiter(
+            drive_tagger.geminiModel, 1000, 200, "gemini-usage.json"
+        )
+        return tagger
+
+    return make
+
+
+def test_rejected_request_uses_one_daily_request(make_limited_tagger):
+    gemini = FailingGemini(*[(400, "INVALID_ARGUMENT")] * 8)
+    tagger = make_limited_tagger(gemini)
+
+    assert tagger.promptGemini("file", "prompt") == "Uncategorized"
+    assert gemini.calls == 1
+    assert tagger.geminiRateLimiter.remainingToday() == 199
+
+
+def test_server_errors_are_retried(make_limited_tagger):
+    gemini = FailingGemini((503, "UNAVAILABLE"), (500, "INTERNAL"))
+    tagger = make_limited_tagger(gemini)
+
+    assert tagger.promptGemini("file", "prompt") == "Curation"
+    assert gemini.calls == 3
+
+
+class Clock:
+    """A settable clock for GeminiRateLimiter."""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_rate_limiter(drive_tagger, tmp_path, clock):
+    return drive_tagger.GeminiRateLimiter(
+        drive_tagger.geminiModel,
+        1000,
+        5,
+        str(tmp_path / "gemini-usage.json"),
+        clock=clock,
+    )
+
+
+def test_daily_count_survives_a_restart(drive_tagger, tmp_path):
+    # 10:00 in California
+    clock = Clock(datetime(2026, 3, 2, 18, 0, tzinfo=timezone.utc))
+    rate_limiter = make_rate_limiter(drive_tagger, tmp_path, clock)
+    for _ in range(3):
+        assert rate_limiter.acquire()
+
+    clock.now += timedelta(hours=2)
+    restarted = make_rate_limiter(drive_tagger, tmp_path, clock)
+
+    assert restarted.remainingToday() == 2
+    assert restarted.acquire() and restarted.acquire()
+    assert not restarted.acquire()
+
+
+def test_daily_count_starts_over_at_midnight_pacific_time(drive_tagger, tmp_path):
+    # 23:59 in California, already the next day in UTC
+    clock = Clock(datetime(2026, 3, 3, 7, 59, tzinfo=timezone.utc))
+    rate_limiter = make_rate_limiter(drive_tagger, tmp_path, clock)
+    for _ in range(5):
+        assert rate_limiter.acquire()
+    assert not rate_limiter.acquire()
+
+    clock.now += timedelta(minutes=2)
+
+    assert rate_limiter.remainingToday() == 5
+    assert rate_limiter.acquire()
+    # A restart on the new day doesn't bring back yesterday's count
+    assert make_rate_limiter(drive_tagger, tmp_path, clock).remainingToday() == 4
+
+
+class ScriptedGemini:
+    """Stands in for genai.Client, answering batch (JSON) requests with batch_answer and single files with "Curation"."""
+
+    def __init__(self, batch_answer):
+        self.models = self
+        self.batch_answer = batch_answer
+        self.batch_calls = 0
+        self.single_calls = 0
+
+    def generate_content(self, model=None, contents=None, config=None, **kwargs):
+        if config and config.get("response_mime_type") == "application/json":
+            self.batch_calls += 1
+            text = self.batch_answer
+        else:
+            self.single_calls += 1
+            text = "Curation\n"
+        return type("Response", (), {"text": text, "usage_metadata": None})()
+
+
+def classify_batch(drive_tagger, tagger, file_count):
+    """Puts file_count small files through classifyFile(), one batch's worth."""
+    tagger.geminiBatchSize = file_count
+    tagger.taggingPipeline = drive_tagger.TaggingPipeline([])
+    classified = []
+    for number in range(1, file_count + 1):
+        job = drive_tagger.TaggingJob(
+            f"file{number}",
+            "text/plain",
+            (f"checksum{number}", "100", "text/plain"),
+            100,
+        )
+        job.geminiFile = f"content of file {number}"
+        classified = tagger.classifyFile(job) or []
+    return {job.fileId: job.tagValue for job in classified}
+
+
+def test_unreadable_batch_answer_falls_back_to_single_files(
+    drive_tagger, make_limited_tagger
+):
+    gemini = ScriptedGemini("Sure! Here are the categories: {1: Accounting")
+    tagger = make_limited_tagger(gemini)
+
+    tags = classify_batch(drive_tagger, tagger, 3)
+
+    assert tags == {"file1": "Curation", "file2": "Curation", "file3": "Curation"}
+    assert (gemini.batch_calls, gemini.single_calls) == (1, 3)
+
+
+def test_files_missing_from_the_batch_answer_are_asked_about_alone(
+    drive_tagger, make_limited_tagger
+):
+    gemini = ScriptedGemini('{"1": "Accounting", "2": "Not a category"}')
+    tagger = make_limited_tagger(gemini)
+
+    tags = classify_batch(drive_tagger, tagger, 3)
+
+    assert tags == {"file1": "Accounting", "file2": "Curation", "file3": "Curation"}
+    assert (gemini.batch_calls, gemini.single_calls) == (1, 2)
@@ -0,0 +1,29 @@
+"""Sending small files to Gemini inline in api/drive-tagger.py, within downloadMemoryBudget."""
+
+from tests.fake_google import FakeDrive
+
+
+def test_inline_file_holds_its_memory_until_classified(
+    drive_tagger, make_tagger, monkeypatch
+):
+    drive = FakeDrive()
+    fake_file = drive.add_file("scan.pdf", "application/pdf", size=100_000)
+    budget = drive_tagger.ByteBudget(1024 * 1024)
+    monkeypatch.setattr(drive_tagger, "downloadMemoryBudget", budget)
+    tagger = make_tagger(drive)
+    tagger.geminiBatchSize = 1
+    job = drive_tagger.TaggingJob(
+        fake_file.id, fake_file.mime_type, sizeBytes=fake_file.size
+    )
+
+    tagger.downloadFileForGemini(job)
+    assert job.fileBytes is not None
+    assert budget.usedBytes == fake_file.size
+    # Sent inline, so the request holds the content until Gemini answered
+    tagger.uploadFileToGemini(job)
+    assert budget.usedBytes == fake_file.size
+
+    tagger.classifyFile(job)
+    assert job.tagValue
+    assert job.geminiFile is None
+    assert budget.usedBytes == 0
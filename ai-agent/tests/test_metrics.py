@@ -0,0 +1,82 @@
+"""RunMetrics of api/drive-tagger.py and the --metrics output (JSON lines or Prometheus text)."""
+
+import json
+
+import pytest
+
+
+@pytest.fixture
+def tagger(drive_tagger, make_tagger):
+    """A DriveTagger whose metrics have seen a few events."""
+    tagger = make_tagger()
+    MetricsEvent = drive_tagger.MetricsEvent
+    for event in (
+        MetricsEvent("result", action="tag", status="done"),
+        MetricsEvent("result", action="tag", status="done"),
+        MetricsEvent("result", action="tag", status="failed"),
+        MetricsEvent("latency", stage="download", seconds=0.2),
+        MetricsEvent("bytes", count=2048),
+        MetricsEvent("quota", count=150),
+        MetricsEvent(
+            "apiCall", endpoint="drive.files.list", status="failed", seconds=0.5
+        ),
+    ):
+        tagger.metrics.handleEvent(event)
+    return tagger
+
+
+def test_snapshot_adds_up_the_events(tagger):
+    snapshot = tagger.metrics.snapshot()
+
+    assert snapshot["files"] == {"tag.done": 2, "tag.failed": 1}
+    assert snapshot["bytesDownloaded"] == 2048
+    assert snapshot["geminiRequestsLeft"] == 150
+    assert snapshot["stages"]["download"]["count"] == 1
+    assert snapshot["apiCalls"]["drive.files.list"]["failed"] == 1
+
+
+def test_jsonl_appends_one_line_per_report(drive_tagger, tagger, tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+
+    drive_tagger.writeMetrics(tagger, path, "jsonl")
+    drive_tagger.writeMetrics(tagger, path, "jsonl")
+
+    with open(path, encoding="utf-8") as metrics_file:
+        reports = [json.loads(line) for line in metrics_file]
+    assert len(reports) == 2
+    assert reports[-1]["files"] == {"tag.done": 2, "tag.failed": 1}
+
+
+def test_jsonl_to_stdout(drive_tagger, tagger, capsys):
+    drive_tagger.writeMetrics(tagger, "-", "jsonl")
+
+    assert json.loads(capsys.readouterr().out)["bytesDownloaded"] == 2048
+
+
+def test_prometheus_replaces_the_file(drive_tagger, tagger, tmp_path):
+    path = tmp_path / "drive_tagger.prom"
+
+    drive_tagger.writeMetrics(tagger, str(path), "prometheus")
+    drive_tagger.writeMetrics(tagger, str(path), "prometheus")
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines.count("# TYPE drive_tagger_files_total counter") == 1
+    assert 'drive_tagger_files_total{action="tag",status="done"} 2' in lines
+    assert 'drive_tagger_stage_seconds_count{stage="download"} 1' in lines
+    assert "drive_tagger_downloaded_bytes_total 2048" in lines
+    assert "drive_tagger_gemini_requests_left 150" in lines
+    assert (
+        'drive_tagger_api_calls_total{endpoint="drive.files.list",status="failed"} 1'
+        in lines
+    )
+    # Written to a temporary file first, then moved over the old one
+    assert not (tmp_path / "drive_tagger.prom.tmp").exists()
+
+
+def test_prometheus_to_stdout_is_rejected(drive_tagger, capsys):
+    with pytest.raises(SystemExit):
+        drive_tagger.parseArguments(
+            ["tag", "--metrics", "-", "--metrics-format", "prometheus"]
+        )
+
+    assert "--metrics-format jsonl" in capsys.readouterr().err
@@ -0,0 +1,38 @@
+"""organizeFiles of api/drive-tagger.py: copying tagged files into Year/Month/Tag folders."""
+
+from tests.fake_google import make_synthetic_drive
+
+
+def test_organize_files_sees_folders_renamed_since_the_last_run(make_tagger):
+    drive = make_synthetic_drive(100, tagged_rate=1.0)
+    tagger = make_tagger(drive)
+    assert tagger.organizeFiles()
+
+    # Someone renames a year folder between two runs in the same process (e.g. the GUI)
+    base_folder = next(
+        fake_file
+        for fake_file in drive.files_by_id.values()
+        if fake_file.name == "Organized-Drive-Files"
+    )
+    year_folder = next(
+        drive.files_by_id[file_id]
+        for file_id in drive.children[base_folder.id]
+        if drive.files_by_id[file_id].name == "2020"
+    )
+    year_folder.name = "2020 (old)"
+    drive.change_log.append(year_folder.id)
+    added = drive.add_file(
+        "New minutes.pdf", "application/pdf", properties={"tag": "Curation"}
+    )
+
+    assert tagger.organizeFiles()
+
+    copies = [
+        fake_file
+        for fake_file in drive.files_by_id.values()
+        if fake_file.name == added.name and fake_file.id != added.id
+    ]
+    assert len(copies) == 1
+    tag_folder = drive.files_by_id[copies[0].parents[0]]
+    month_folder = drive.files_by_id[tag_folder.parents[0]]
+    assert drive.files_by_id[month_folder.parents[0]].name == "2020"
@@ -0,0 +1,51 @@
+"""The keyword rules of api/drive-tagger.py (preClassifyFile), which tag files without Gemini."""
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "file_name, folder_path, expected_tag",
+    [
+        # Phrases count for every word in them, not as their first word
+        ("Board of Directors roster.xlsx", "", "Board of Directors"),
+        ("Board meeting minutes March.docx", "", "Board of Directors"),
+        (
+            "Capital Campaign 2024.docx",
+            "",
+            "Development (contributed revenue generation)",
+        ),
+        ("Summer camp schedule.pdf", "", "Programming"),
+        ("Docent tour script.docx", "", "Programming"),
+        ("Invoice 1042.pdf", "Finance", "Accounting"),
+        ("Oral history transcript.txt", "Research", "Research (historic info)"),
+    ],
+)
+def test_confident_tags(drive_tagger, file_name, folder_path, expected_tag):
+    tag, confidence = drive_tagger.preClassifyFile(file_name, folder_path, "text/plain")
+
+    assert tag == expected_tag
+    assert confidence >= drive_tagger.preClassifierMinConfidence
+
+
+@pytest.mark.parametrize(
+    "file_name, wrong_tag",
+    [
+        # Words that start with a (short) keyword aren't that keyword
+        ("Golf Tournament results.xlsx", "Programming"),
+        ("Campaign plan.docx", "Programming"),
+        ("Auditorium rental.pdf", "Accounting"),
+        ("Eventually.txt", "Programming"),
+        ("Granted permissions.txt", "Development (contributed revenue generation)"),
+    ],
+)
+def test_words_starting_with_a_keyword_dont_match(drive_tagger, file_name, wrong_tag):
+    tag, _ = drive_tagger.preClassifyFile(file_name, "", "text/plain")
+
+    assert tag != wrong_tag
+
+
+def test_no_keywords_leave_the_file_to_gemini(drive_tagger):
+    assert drive_tagger.preClassifyFile("IMG_2041.txt", "Scans", "text/plain") == (
+        None,
+        0.0,
+    )
@@ -0,0 +1,71 @@
+"""prefetchPages of api/drive-tagger.py, which reads the next page of a listing on a background thread."""
+
+import threading
+
+import pytest
+
+from tests.fake_google import FakeChanges, FakeDrive
+
+
+class PageRecordingDrive(FakeDrive):
+    """A FakeDrive setting an Event once each page of its change log was read."""
+
+    def __init__(self):
+        super().__init__()
+        self.pages_read = [threading.Event() for _ in range(10)]
+
+    def changes(self):
+        return PageRecordingChanges(self)
+
+
+class PageRecordingChanges(FakeChanges):
+    def list_page(self, start, page_size):
+        response = super().list_page(start, page_size)
+        self.drive.pages_read[start // page_size].set()
+        return response
+
+
+def test_list_change_pages_reads_the_next_page_during_work(make_tagger):
+    drive = PageRecordingDrive()
+    for number in range(3500):
+        drive.add_file(f"file{number}.txt", size=100)
+    tagger = make_tagger(drive)
+
+    page_count = 0
+    for page_number, _ in enumerate(tagger.listChangePages("0", "id")):
+        page_count += 1
+        if page_number + 1 < 4:
+            # Working on this page, which doesn't end before the next one was read
+            assert drive.pages_read[page_number + 1].wait(timeout=10)
+
+    assert page_count == 4
+
+
+def test_prefetch_pages_stops_reading_when_closed(drive_tagger):
+    read = []
+    closed = threading.Event()
+
+    def pages():
+        try:
+            for number in range(100):
+                read.append(number)
+                yield number
+        finally:
+            closed.set()
+
+    prefetched = drive_tagger.prefetchPages(pages(), lookAhead=2)
+    assert next(prefetched) == 0
+    prefetched.close()
+
+    # The page handed out, the ones waiting and the one being read, at most
+    assert len(read) <= 4
+    assert closed.is_set()
+
+
+def test_prefetch_pages_raises_errors_of_the_pages(drive_tagger):
+    def pages():
+        yield 1
+        raise ValueError("page 2 failed")
+
+    with pytest.raises(ValueError, match="page 2 failed"):
+        list(drive_tagger.prefetchPages(pages()))
@@ -0,0 +1,66 @@
+"""The RunJournal of api/drive-tagger.py, and retrying the files it lists as failed."""
+
+import pytest
+
+from tests.fake_google import FakeDrive
+
+
+@pytest.fixture
+def journal(drive_tagger, tmp_path):
+    return drive_tagger.RunJournal(str(tmp_path / "journal.db"))
+
+
+def test_failures_hold_the_reason_of_the_last_attempt(journal):
+    journal.record("tag", "file1", "failed", "a.pdf", reason="Download failed")
+    journal.record("tag", "file2", "done", "b.pdf")
+    journal.record("copy", "file3", "failed", "c.pdf", reason="Quota exceeded")
+
+    failures = journal.failures("tag")
+
+    assert [(f["fileId"], f["name"], f["reason"]) for f in failures] == [
+        ("file1", "a.pdf", "Download failed")
+    ]
+    assert {f["action"] for f in journal.failures()} == {"tag", "copy"}
+
+
+def test_a_later_success_replaces_the_failure(journal):
+    journal.record("tag", "file1", "failed", reason="Gemini did not answer")
+    assert "file1" not in journal.handledFiles("tag")
+
+    journal.record("tag", "file1", "done")
+
+    assert journal.failures("tag") == []
+    assert "file1" in journal.handledFiles("tag")
+
+
+def test_forget_only_removes_the_matching_entries(journal):
+    journal.record("tag", "file1", "done")
+    journal.record("tag", "file2", "failed")
+    journal.record("copy", "file1", "done", destinationFolderId="folder1")
+
+    journal.forget("tag", status="done")
+
+    assert journal.handledFiles("tag") == {}
+    assert [f["fileId"] for f in journal.failures("tag")] == ["file2"]
+    assert journal.handledFiles("copy") == {"file1": "folder1"}
+
+
+def test_retry_failed_only_lists_the_failed_files(make_tagger):
+    drive = FakeDrive()
+    failed, untagged, deleted = (
+        drive.add_file(name, "application/pdf", size=100)
+        for name in ("failed.pdf", "untagged.pdf", "deleted.pdf")
+    )
+    tagger = make_tagger(drive)
+    tagger.reportResult("tag", failed.id, "failed", error="Download failed")
+    tagger.reportResult("tag", deleted.id, "failed", error="Download failed")
+    assert tagger.syncCatalog() is not None
+    tagger.driveCatalog.removeFiles([deleted.id])
+
+    tagger.retryFailed = True
+    retried = [item["id"] for item in tagger.listUntaggedFiles()]
+
+    assert retried == [failed.id]
+    # Nothing is left to retry for a file that is gone
+    assert [f["fileId"] for f in tagger.runJournal.failures("tag")] == [failed.id]
+    assert untagged.id in {item["id"] for item in tagger.driveCatalog.untaggedFiles()}
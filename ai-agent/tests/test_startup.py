@@ -0,0 +1,93 @@
+"""Start-up of api/drive-tagger.py: which libraries loading the module imports, and how long it takes.
+
+The command line is launched many times a day from scripts, so loading the module must
+stay quick. Google's libraries take most of a second to import, so they are only imported
+once they are used (see LazyModule in api/drive-tagger.py).
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+API_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api")
+DRIVE_TAGGER_PATH = os.path.join(API_DIRECTORY, "drive-tagger.py")
+
+# About 0.03 seconds here, importing Google's libraries eagerly takes over 0.3 seconds more
+IMPORT_TIME_BUDGET_SECONDS = 0.25
+
+# Imported only when a command needs them
+LAZY_MODULES = (
+    "googleapiclient",
+    "google.genai",
+    "google_auth_oauthlib",
+    "google_auth_httplib2",
+    "google.auth",
+    "google.api_core",
+    "httpx",
+    "tkinter",
+    "PIL",
+)
+# Loads the module in a fresh interpreter (the tests' own one has imported everything already)
+LOAD_DRIVE_TAGGER = (
+    "import importlib.util, json, sys; "
+    f"spec = importlib.util.spec_from_file_location('drive_tagger', {DRIVE_TAGGER_PATH!r}); "
+    "spec.loader.exec_module(importlib.util.module_from_spec(spec)); "
+    "print(json.dumps(sorted(sys.modules)))"
+)
+
+
+def modules_after_loading():
+    """The names in sys.modules once the module was loaded."""
+    completed = subprocess.run(
+        [sys.executable, "-c", LOAD_DRIVE_TAGGER],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def test_loading_does_not_import_heavy_libraries():
+    modules = modules_after_loading()
+
+    eager = [
+        name
+        for name in modules
+        if any(name == lazy or name.startswith(lazy + ".") for lazy in LAZY_MODULES)
+    ]
+    assert eager == []
+
+
+def import_seconds():
+    """How long importing the module took in a fresh interpreter, Python's own imports included."""
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            # -X importtime only reports imports made with the import statement or __import__
+            f"import sys; sys.path.insert(0, {API_DIRECTORY!r}); __import__('drive-tagger')",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == "drive-tagger":
+            return int(fields[1]) / 1_000_000
+    raise AssertionError(
+        f"No import time reported for drive-tagger:\n{completed.stderr}"
+    )
+
+
+def test_loading_stays_within_the_time_budget():
+    # The quickest of a few runs, so a busy machine doesn't fail the test
+    assert min(import_seconds() for _ in range(3)) < IMPORT_TIME_BUDGET_SECONDS
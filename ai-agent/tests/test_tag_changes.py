@@ -0,0 +1,95 @@
+"""tag-changes in api/drive-tagger.py (tagChangedFiles): tagging what changed since the last run."""
+
+from tests.fake_google import (
+    FOLDER_MIME_TYPE,
+    FakeDrive,
+    FakeGemini,
+    make_synthetic_drive,
+    tags_by_file,
+)
+
+
+def test_tag_changes_tags_only_new_and_edited_files(make_tagger):
+    drive = make_synthetic_drive(200, max_size=200_000)
+    gemini = FakeGemini()
+    # The first run has no catalog to compare against, so it tags every file
+    assert make_tagger(drive, gemini).tagChangedFiles()
+    first_tags = tags_by_file(drive)
+    assert all(first_tags.values())
+
+    edited = next(
+        fake_file
+        for fake_file in drive.files_by_id.values()
+        # A generic name in a generic folder, so it was tagged by Gemini from its content
+        if fake_file.mime_type != FOLDER_MIME_TYPE
+        and drive.files_by_id[fake_file.parents[0]].name.startswith(("Shared", "Scans"))
+        and fake_file.category != "Curation"
+    )
+    edited.content_seed += 10**6
+    edited.modified_time = "2024-03-01T09:30:00.000Z"
+    edited.category = "Curation"
+    drive.change_log.append(edited.id)
+    folder = drive.add_folder("Scans 2024")
+    added = drive.add_file(
+        "Meeting minutes.pdf", "application/pdf", [folder.id], size=1000
+    )
+    # Renamed after the last run, the keyword rules must see the new name
+    folder.name = "Board of Directors"
+    drive.change_log.append(folder.id)
+    drive.calls.clear()
+
+    tagger = make_tagger(drive, gemini)
+    assert tagger.tagChangedFiles()
+
+    assert drive.calls["files.list"] == 0
+    assert drive.calls["files.update"] == 2
+    tags = tags_by_file(drive)
+    assert tags[edited.id] == "Curation"
+    assert tags[added.id] == "Board of Directors"
+    assert {file_id: tag for file_id, tag in tags.items() if file_id != added.id} == {
+        **first_tags,
+        edited.id: "Curation",
+    }
+    # Everything was handled, so there is nothing left to do
+    drive.calls.clear()
+    assert tagger.tagChangedFiles()
+    assert drive.calls["files.update"] == 0
+
+
+def test_tag_changes_tags_files_whose_changes_organize_read(make_tagger):
+    drive = make_synthetic_drive(100, tagged_rate=1.0)
+    gemini = FakeGemini()
+    tagger = make_tagger(drive, gemini)
+    assert tagger.tagChangedFiles()
+    added = drive.add_file("Scan.pdf", "application/pdf", size=1000)
+
+    # Organizing brings the catalog up to date, so the next sync doesn't see the new file
+    assert tagger.organizeFiles()
+    assert added.id not in tagger.syncCatalog()
+    assert tagger.tagChangedFiles()
+
+    assert drive.files_by_id[added.id].properties.get("tag")
+
+
+def test_tag_changes_tags_edited_google_docs_again(make_tagger):
+    drive = FakeDrive()
+    doc = drive.add_file(
+        "Notes",
+        "application/vnd.google-apps.document",
+        size=2000,
+        category="Accounting",
+    )
+    tagger = make_tagger(drive)
+    assert tagger.tagChangedFiles()
+    assert doc.properties == {"tag": "Accounting", "tagChecksum": doc.modified_time}
+
+    # Google Docs have no checksum, their modifiedTime tells the tagger they were edited
+    doc.category = "Curation"
+    doc.modified_time = "2024-03-01T09:30:00.000Z"
+    drive.change_log.append(doc.id)
+    assert tagger.tagChangedFiles()
+
+    assert doc.properties == {"tag": "Curation", "tagChecksum": doc.modified_time}
+    drive.calls.clear()
+    assert tagger.tagChangedFiles()
+    assert drive.calls["files.update"] == 0
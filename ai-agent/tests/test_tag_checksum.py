@@ -0,0 +1,50 @@
+"""The tagChecksum property of api/drive-tagger.py, which tells tag-changes what to tag again."""
+
+from tests.fake_google import FakeDrive
+
+
+def file_item(file_id, md5_checksum, properties=None, mime_type="application/pdf"):
+    item = {
+        "id": file_id,
+        "name": f"{file_id}.pdf",
+        "mimeType": mime_type,
+        "md5Checksum": md5_checksum,
+        "parents": ["root"],
+    }
+    if properties:
+        item["properties"] = properties
+    return item
+
+
+def test_only_untagged_and_changed_files_are_tagged_again(drive_tagger):
+    catalog = drive_tagger.DriveCatalog(":memory:")
+    catalog.putFiles(
+        [
+            file_item("untagged", "aaa"),
+            file_item("unchanged", "bbb", {"tag": "Curation", "tagChecksum": "bbb"}),
+            file_item("changed", "ccc", {"tag": "Curation", "tagChecksum": "old"}),
+            # Tagged before checksums were kept, so left as it is
+            file_item("no-checksum", "ddd", {"tag": "Curation"}),
+            file_item("folder", None, mime_type=drive_tagger.folderMimeType),
+        ]
+    )
+
+    to_tag = catalog.filesToTag()
+
+    assert sorted(item["id"] for item in to_tag) == ["changed", "untagged"]
+
+
+def test_tagging_remembers_the_checksum(make_tagger):
+    drive = FakeDrive()
+    fake_file = drive.add_file("scan.pdf", "application/pdf", size=100)
+    tagger = make_tagger(drive)
+    assert tagger.syncCatalog() is not None
+    checksum = fake_file.metadata()["md5Checksum"]
+
+    tagger.updateTagMetadata(fake_file.id, "Curation", checksum)
+    tagger.getDriveBatcher().flush()
+
+    assert fake_file.properties == {"tag": "Curation", "tagChecksum": checksum}
+    # The tag write itself is a change, but not to the content
+    assert tagger.syncCatalog() == {fake_file.id}
+    assert list(tagger.driveCatalog.filesToTag()) == []